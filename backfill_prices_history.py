@@ -0,0 +1,177 @@
+# 历史补数：按 ET 日期/小时范围补抓 /prices-history，写入 gen_hourly_price_graph.py 读取的 {symbol}/{date}/{hour}/ 目录
+# 用法：
+#   python3 backfill_prices_history.py --start 20251001 --end 20251003
+#   python3 backfill_prices_history.py --start 2025100108 --end 2025100115 --symbols btc eth --workers 8 --rate 5
+# --start/--end 为 ET 时间，YYYYMMDD（整天）或 YYYYMMDDHH（精确到小时），均包含端点；--end 缺省为上一个完整小时
+#
+# 每个 (币种, 小时) 完成且市场已结算（closed）后记入状态文件，中断后重新运行会跳过已完成的小时；
+# 尚未结算的小时不记入，下次运行重新抓取，markets.json 中的 outcomePrices（赢家）随之更新；--force 忽略状态文件全部重抓
+# 先解析 slug 拿到两个 token，再把两个 token 的历史请求并发提交到同一个线程池，clob 请求受 --rate 限速
+import os
+import json
+import argparse
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+import pytz
+import http_client
+import market_cache
+import catalog
+from clob_api import CLOB_HOST, GAMMA_HOST
+from fetch_midpoint_loop import symbol_slug_map, format_slug_and_output_dir
+
+ET = pytz.timezone("US/Eastern")
+STATE_FILE = os.path.join("cache", "backfill_prices_history.json")
+
+# === 时间范围 ===
+def parse_et_hour(value, end=False):
+    if len(value) == 8:
+        dt = datetime.strptime(value, "%Y%m%d") + (timedelta(hours=23) if end else timedelta())
+    elif len(value) == 10:
+        dt = datetime.strptime(value, "%Y%m%d%H")
+    else:
+        raise argparse.ArgumentTypeError(f"Expected YYYYMMDD or YYYYMMDDHH, got {value}")
+    return ET.localize(dt)
+
+def last_complete_hour():
+    return datetime.now(ET).replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+
+def iter_et_hours(start, end):
+    # 按 UTC 步进再转回 ET，跨夏令时切换时不会重复或漏掉小时
+    current = start.astimezone(pytz.utc)
+    end_utc = end.astimezone(pytz.utc)
+    while current <= end_utc:
+        yield current.astimezone(ET)
+        current += timedelta(hours=1)
+
+# === 进度状态 ===
+class BackfillState:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.done = set(json.load(f).get("done", []))
+        except (OSError, ValueError):
+            self.done = set()
+
+    def mark_done(self, key):
+        with self.lock:
+            self.done.add(key)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            market_cache.atomic_write_json(self.path, {"done": sorted(self.done)})
+
+# === 网络请求 ===
+def resolve_hour(symbol, et_time):
+    """返回 (输出目录, token 列表, 市场是否已结算)，市场不存在时 token 列表为空"""
+    # 与 midpoint 采集共用 slug 规则，目录名取其 midpoint 目录的 {date}/{hour} 部分
+    slug, midpoint_dir = format_slug_and_output_dir(symbol, et_time)
+    hour_str = os.path.basename(midpoint_dir)
+    dir_path = os.path.join(symbol, et_time.strftime("%Y%m%d"), hour_str)
+
+    data = market_cache.get_markets(slug)
+    if not data:
+        return dir_path, [], False
+    markets_path = market_cache.write_markets_json(dir_path, data)
+    catalog.safe_record(catalog.record_market, symbol, et_time.strftime("%Y%m%d"), et_time.hour, data,
+                        markets_path=markets_path, history_dir=dir_path)
+    return dir_path, json.loads(data[0]["clobTokenIds"]), data[0].get("closed") is True
+
+def fetch_price_history(token_id, et_time, dir_path):
+    start_ts = int(et_time.timestamp())
+    url = f"{CLOB_HOST}/prices-history?market={token_id}&startTs={start_ts}&endTs={start_ts + 3600}&fidelity=1"
+    resp = http_client.get(url)
+    resp.raise_for_status()
+    market_cache.atomic_write_json(os.path.join(dir_path, f"{token_id}.json"), resp.json(), indent=2)
+
+# === 补数调度 ===
+def backfill(symbols, start, end, workers, state, force=False):
+    hours = [(symbol, et_time) for et_time in iter_et_hours(start, end) for symbol in symbols]
+    pending_keys = {}
+    closed_keys = set()
+    unresolved = []
+    failed = []
+    missing = []
+    skipped = 0
+
+    def hour_key(symbol, et_time):
+        return f"{symbol}/{et_time.strftime('%Y%m%d')}/{et_time.strftime('%H')}"
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for symbol, et_time in hours:
+            key = hour_key(symbol, et_time)
+            if not force and key in state.done:
+                skipped += 1
+                continue
+            futures[executor.submit(resolve_hour, symbol, et_time)] = ("resolve", key, et_time, None)
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, key, et_time, token_id = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"[ERROR] {key} {stage} {token_id or ''}: {e}")
+                    if key not in failed:
+                        failed.append(key)
+                    pending_keys.pop(key, None)
+                    continue
+
+                if stage == "resolve":
+                    dir_path, token_ids, closed = result
+                    if not token_ids:
+                        print(f"[WARN] {key}: market not found")
+                        missing.append(key)
+                        continue
+                    pending_keys[key] = len(token_ids)
+                    if closed:
+                        closed_keys.add(key)
+                    for tid in token_ids:
+                        futures[executor.submit(fetch_price_history, tid, et_time, dir_path)] = ("history", key, et_time, tid)
+                elif key in pending_keys:
+                    pending_keys[key] -= 1
+                    if pending_keys[key] == 0:
+                        del pending_keys[key]
+                        if key in closed_keys:
+                            state.mark_done(key)
+                            print(f"[DONE] {key}")
+                        else:
+                            # 市场未结算，赢家可能还会变化，不记入状态文件，下次运行重抓
+                            unresolved.append(key)
+                            print(f"[DONE] {key} (market not closed yet, will refetch next run)")
+
+    print(f"[INFO] Backfill finished: {len(hours) - skipped - len(failed) - len(missing)} fetched, "
+          f"{skipped} already done, {len(unresolved)} not closed yet, {len(missing)} missing, {len(failed)} failed")
+    return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill prices-history for a range of ET hours")
+    parser.add_argument("--start", required=True, help="ET start, YYYYMMDD or YYYYMMDDHH (inclusive)")
+    parser.add_argument("--end", help="ET end, YYYYMMDD or YYYYMMDDHH (inclusive). Defaults to the last complete hour.")
+    parser.add_argument("--symbols", nargs="+", default=list(symbol_slug_map), choices=list(symbol_slug_map))
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent requests")
+    parser.add_argument("--rate", type=float, default=5.0, help="Max clob/gamma requests per second (0 = unlimited)")
+    parser.add_argument("--state", default=STATE_FILE, help="Progress file used to resume an interrupted run")
+    parser.add_argument("--force", action="store_true", help="Refetch hours already recorded as done")
+    args = parser.parse_args()
+
+    start = parse_et_hour(args.start)
+    end = min(parse_et_hour(args.end, end=True), last_complete_hour()) if args.end else last_complete_hour()
+    if start > end:
+        print(f"[ERROR] Empty range: {start} > {end}")
+        return
+
+    if args.rate > 0:
+        for host in {urlparse(CLOB_HOST).netloc, urlparse(GAMMA_HOST).netloc}:
+            http_client.set_rate_limit(host, args.rate)
+
+    print(f"[INFO] Backfilling {', '.join(args.symbols)} from {start:%Y-%m-%d %H:00} to {end:%Y-%m-%d %H:00} ET")
+    ok = backfill(args.symbols, start, end, args.workers, BackfillState(args.state), args.force)
+    if not ok:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
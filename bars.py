@@ -0,0 +1,245 @@
+# 1 分钟 OHLC K 线：midpoint 及买1/卖1 价格按分钟聚合，存入 catalog 数据库的 bars_1m 表，供周/月级别的长周期图表使用
+# - midpoint（kind=mid）来自 midpoint/{symbol}/{date}/{hour}/{token_id}.bin|.data
+# - 买1/卖1（kind=ask/bid）来自 price_data/{symbol}/{date}/{hour}.csv
+# side 为 token 在 clobTokenIds 中的下标（0=Up，1=Down），ts 为分钟起始时间戳（秒）
+# rollup.py run 汇总每个小时时同时生成该小时的 K 线；补算历史：python3 bars.py build --start 20250901 --end 20251130
+#
+# 读取时按时间范围选择精度（load_series）：不超过 RAW_MAX_SECONDS 的 midpoint 直接读原始采样点，
+# 否则从 1m/5m/15m/1h 中选最细且点数不超过 max_points * LOD_FACTOR 的一级，再用 LTTB 降采样到 max_points 个点
+import os
+import csv
+import json
+import time
+import argparse
+import datetime
+import numpy as np
+import pytz
+import catalog
+import midpoint_store
+
+ET = pytz.timezone("US/Eastern")
+KINDS = ("mid", "ask", "bid")
+STEPS = (60, 300, 900, 3600)
+RAW_MAX_SECONDS = 6 * 3600
+LOD_FACTOR = 4
+DEFAULT_POINTS = 1500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars_1m (
+    symbol TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    side INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (symbol, kind, side, ts)
+) WITHOUT ROWID;
+"""
+
+_initialized = set()
+
+def connect(db_path=None):
+    conn = catalog.connect(db_path)
+    if id(conn) not in _initialized:
+        conn.executescript(SCHEMA)
+        _initialized.add(id(conn))
+    return conn
+
+def hour_start_ts(date_str, hour):
+    day = datetime.datetime.strptime(date_str, "%Y%m%d")
+    return int(ET.localize(day.replace(hour=hour)).timestamp())
+
+# === 聚合 ===
+def aggregate(timestamps, values, step):
+    """按 step 秒分桶，返回 (桶起始时间, open, high, low, close, samples)；输入需按时间排序"""
+    keep = ~np.isnan(values)
+    timestamps, values = np.asarray(timestamps, dtype=np.int64)[keep], np.asarray(values, dtype=np.float64)[keep]
+    if len(values) == 0:
+        empty = np.empty(0)
+        return np.empty(0, dtype=np.int64), empty, empty, empty, empty, np.empty(0, dtype=np.int64)
+    buckets = timestamps // step * step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(values)]
+    return (buckets[starts], values[starts], np.maximum.reduceat(values, starts),
+            np.minimum.reduceat(values, starts), values[ends - 1], ends - starts)
+
+def merge_bars(ts, opens, highs, lows, closes, samples, step):
+    """把已有 K 线合并为更粗的 step"""
+    buckets = ts // step * step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)]
+    return (buckets[starts], opens[starts], np.maximum.reduceat(highs, starts),
+            np.minimum.reduceat(lows, starts), closes[ends - 1], np.add.reduceat(samples, starts))
+
+# === 写入 ===
+def load_top_of_book(symbol, date_str, hour, start_ts, end_ts):
+    """读取小时 csv，返回 (timestamps, {(kind, side): prices})"""
+    file_path = os.path.join("price_data", symbol, date_str, f"{catalog.hour_to_label(hour)}.csv")
+    columns = {("ask", 0): "up_ask_price", ("ask", 1): "down_ask_price",
+               ("bid", 0): "up_bid_price", ("bid", 1): "down_bid_price"}
+    timestamps, rows = [], []
+    try:
+        with open(file_path, newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    ts = int(ET.localize(datetime.datetime.strptime(row["time"], "%Y%m%d_%H:%M:%S")).timestamp())
+                except (KeyError, ValueError):
+                    continue
+                if not start_ts <= ts < end_ts:
+                    continue
+                values = []
+                for column in columns.values():
+                    try:
+                        values.append(float(row[column]))
+                    except (KeyError, ValueError):
+                        values.append(np.nan)
+                timestamps.append(ts)
+                rows.append(values)
+    except FileNotFoundError:
+        return None, {}
+    if not timestamps:
+        return None, {}
+    order = np.argsort(timestamps, kind="stable")
+    matrix = np.array(rows, dtype=np.float64)[order]
+    return np.array(timestamps, dtype=np.int64)[order], {key: matrix[:, i] for i, key in enumerate(columns)}
+
+def write_bars(symbol, kind, side, bars, db_path=None):
+    ts, opens, highs, lows, closes, samples = bars
+    conn = connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO bars_1m (symbol, kind, side, ts, open, high, low, close, samples) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(symbol, kind, side, int(t), float(o), float(h), float(l), float(c), int(n))
+             for t, o, h, l, c, n in zip(ts, opens, highs, lows, closes, samples)],
+        )
+    return len(ts)
+
+def build_hour(symbol, date_str, hour, token_ids=None, midpoint_dir=None, db_path=None):
+    """生成一个小时的全部 1 分钟 K 线，返回写入的行数；token_ids / midpoint_dir 缺省时查 catalog"""
+    if token_ids is None or midpoint_dir is None:
+        rows = [r for r in catalog.query_hours(symbol, date_str, db_path=db_path) if r["hour"] == hour]
+        if rows and token_ids is None and rows[0]["token_ids"]:
+            token_ids = json.loads(rows[0]["token_ids"])
+        if rows and midpoint_dir is None:
+            midpoint_dir = rows[0]["midpoint_dir"]
+    midpoint_dir = midpoint_dir or os.path.join("midpoint", symbol, date_str, catalog.hour_to_label(hour))
+    start_ts = hour_start_ts(date_str, hour)
+    end_ts = start_ts + 3600
+
+    count = 0
+    for side, token_id in enumerate(token_ids or []):
+        timestamps, mids = midpoint_store.load_token_range(midpoint_dir, token_id, start_ts, end_ts)
+        count += write_bars(symbol, "mid", side, aggregate(timestamps, mids, 60), db_path)
+    timestamps, book = load_top_of_book(symbol, date_str, hour, start_ts, end_ts)
+    for (kind, side), prices in book.items():
+        count += write_bars(symbol, kind, side, aggregate(timestamps, prices, 60), db_path)
+    return count
+
+# === 读取 ===
+def query_bars(symbol, kind, side, start_ts, end_ts, db_path=None):
+    """返回 [start_ts, end_ts) 内的 1 分钟 K 线 (ts, open, high, low, close, samples) numpy 数组"""
+    conn = connect(db_path)
+    rows = conn.execute(
+        "SELECT ts, open, high, low, close, samples FROM bars_1m "
+        "WHERE symbol = ? AND kind = ? AND side = ? AND ts >= ? AND ts < ? ORDER BY ts",
+        (symbol, kind, side, start_ts, end_ts),
+    ).fetchall()
+    if not rows:
+        empty = np.empty(0)
+        return np.empty(0, dtype=np.int64), empty, empty, empty, empty, np.empty(0, dtype=np.int64)
+    matrix = np.array([tuple(r) for r in rows], dtype=np.float64)
+    return (matrix[:, 0].astype(np.int64), matrix[:, 1], matrix[:, 2], matrix[:, 3], matrix[:, 4],
+            matrix[:, 5].astype(np.int64))
+
+def choose_step(start_ts, end_ts, max_points=DEFAULT_POINTS):
+    """最细且桶数不超过 max_points * LOD_FACTOR 的 K 线周期（秒）"""
+    for step in STEPS:
+        if (end_ts - start_ts) / step <= max_points * LOD_FACTOR:
+            return step
+    return STEPS[-1]
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets 降采样，返回保留点的下标"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # 下一个桶的平均点
+        next_lo, next_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        areas = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+def load_raw_midpoints(symbol, side, start_ts, end_ts, db_path=None):
+    timestamps, mids = [], []
+    for hour_ts in range(start_ts // 3600 * 3600, end_ts, 3600):
+        et_time = datetime.datetime.fromtimestamp(hour_ts, ET)
+        date_str = et_time.strftime("%Y%m%d")
+        rows = [r for r in catalog.query_hours(symbol, date_str, db_path=db_path) if r["hour"] == et_time.hour]
+        if not rows or not rows[0]["token_ids"]:
+            continue
+        token_ids = json.loads(rows[0]["token_ids"])
+        if side >= len(token_ids):
+            continue
+        base_dir = rows[0]["midpoint_dir"] or os.path.join("midpoint", symbol, date_str, catalog.hour_to_label(et_time.hour))
+        ts, values = midpoint_store.load_token_range(base_dir, token_ids[side], max(start_ts, hour_ts), min(end_ts, hour_ts + 3600))
+        timestamps.append(ts)
+        mids.append(values)
+    if not timestamps:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    return np.concatenate(timestamps), np.concatenate(mids)
+
+def load_series(symbol, kind, side, start_ts, end_ts, max_points=DEFAULT_POINTS, db_path=None):
+    """按时间范围选择精度并降采样，返回 dict：
+    ts / value：LTTB 后的折线（K 线取收盘价），low / high / band_ts：所选周期的最低/最高价带（原始点时为空），step：周期秒数（0 为原始点）"""
+    if kind == "mid" and end_ts - start_ts <= RAW_MAX_SECONDS:
+        ts, values = load_raw_midpoints(symbol, side, start_ts, end_ts, db_path)
+        keep = lttb(ts, values, max_points)
+        return {"ts": ts[keep], "value": values[keep], "band_ts": ts[:0], "low": values[:0], "high": values[:0], "step": 0}
+
+    step = choose_step(start_ts, end_ts, max_points)
+    bars = query_bars(symbol, kind, side, start_ts, end_ts, db_path)
+    if step > 60 and len(bars[0]):
+        bars = merge_bars(*bars, step)
+    ts, _, highs, lows, closes, _ = bars
+    keep = lttb(ts, closes, max_points)
+    return {"ts": ts[keep], "value": closes[keep], "band_ts": ts, "low": lows, "high": highs, "step": step}
+
+def main():
+    parser = argparse.ArgumentParser(description="Build 1-minute OHLC bars for midpoints and top of book")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="Build bars for every hour in a date range")
+    p_build.add_argument("--symbols", nargs="+", default=catalog.SYMBOLS, choices=catalog.SYMBOLS)
+    p_build.add_argument("--start", required=True, help="YYYYMMDD (ET)")
+    p_build.add_argument("--end", help="YYYYMMDD (ET), defaults to --start")
+    args = parser.parse_args()
+
+    start = time.time()
+    count = 0
+    day = datetime.datetime.strptime(args.start, "%Y%m%d")
+    last = datetime.datetime.strptime(args.end or args.start, "%Y%m%d")
+    while day <= last:
+        date_str = day.strftime("%Y%m%d")
+        for hour in range(24):
+            # 只处理已经结束的小时
+            if hour_start_ts(date_str, hour) + 3600 <= start:
+                for symbol in args.symbols:
+                    count += build_hour(symbol, date_str, hour)
+        day += datetime.timedelta(days=1)
+    print(f"[DONE] Wrote {count} bars in {time.time() - start:.2f}s: {catalog.CATALOG_DB}")
+
+if __name__ == "__main__":
+    main()
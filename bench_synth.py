@@ -0,0 +1,120 @@
+# 基准测试用的合成数据：按线上目录结构生成订单簿快照、midpoint 数据文件和 markets.json
+# 所有路径相对于传入的 root 目录，与各脚本在 /var/www/pm_stats 下看到的结构一致：
+#   price_data/{symbol}/{date}/row_data/{hour}/{side}/{timestamp}.json
+#   midpoint/{symbol}/{date}/{hour}/{token_id}.data|.bin、markets.json
+import os
+import json
+import random
+import hashlib
+import datetime
+import pytz
+import midpoint_store
+from catalog import hour_to_label
+
+ET = pytz.timezone("US/Eastern")
+BOOK_LEVELS = 40
+
+def hour_start_ts(date_str, hour):
+    return int(ET.localize(datetime.datetime.strptime(f"{date_str} {hour}", "%Y%m%d %H")).timestamp())
+
+def token_ids_for(symbol, date_str, hour):
+    digest = hashlib.sha256(f"{symbol}{date_str}{hour}".encode()).hexdigest()
+    return [str(int(digest[:16], 16)), str(int(digest[16:32], 16))]
+
+def random_walk(rng, count, start=0.5, step=0.01):
+    values = []
+    mid = start
+    for _ in range(count):
+        mid = min(0.98, max(0.02, mid + rng.uniform(-step, step)))
+        values.append(round(mid, 3))
+    return values
+
+def make_book(rng, token_id, ts_ms, mid, levels=BOOK_LEVELS):
+    # asks 价格降序、bids 价格升序，最优价在列表末尾，与线上 /book 返回一致
+    asks = [{"price": f"{min(mid + 0.01 * i, 0.99):.2f}", "size": f"{rng.uniform(5, 2000):.2f}"} for i in range(levels, 0, -1)]
+    bids = [{"price": f"{max(mid - 0.01 * i, 0.01):.2f}", "size": f"{rng.uniform(5, 2000):.2f}"} for i in range(levels, 0, -1)]
+    return {
+        "market": "0x" + hashlib.sha256(token_id.encode()).hexdigest(),
+        "asset_id": token_id,
+        "timestamp": str(ts_ms),
+        "hash": f"{rng.getrandbits(160):040x}",
+        "bids": bids,
+        "asks": asks,
+        "min_order_size": "5",
+        "tick_size": "0.01",
+        "neg_risk": False,
+    }
+
+def make_market(symbol, date_str, hour, rng):
+    token_ids = token_ids_for(symbol, date_str, hour)
+    up = rng.uniform(0.01, 0.99)
+    return {
+        "slug": f"{symbol}-up-or-down-{date_str}-{hour_to_label(hour)}-et",
+        "outcomes": json.dumps(["Up", "Down"]),
+        "outcomePrices": json.dumps([f"{up:.3f}", f"{1 - up:.3f}"]),
+        "clobTokenIds": json.dumps(token_ids),
+        "volume": f"{rng.uniform(2000, 80000):.4f}",
+        "closed": True,
+    }
+
+def write_book_snapshots(root, symbol, date_str, hour, count, seed=0, levels=BOOK_LEVELS):
+    """写入一个小时两个 side 各 count 个订单簿快照（每侧 levels 档），返回写入的文件列表"""
+    rng = random.Random(f"book:{seed}:{symbol}:{date_str}:{hour}")
+    start_ms = hour_start_ts(date_str, hour) * 1000
+    step_ms = 3600 * 1000 // max(count, 1)
+    paths = []
+    for side, token_id in enumerate(token_ids_for(symbol, date_str, hour)):
+        dir_path = os.path.join(root, "price_data", symbol, date_str, "row_data", hour_to_label(hour), str(side))
+        os.makedirs(dir_path, exist_ok=True)
+        for i, mid in enumerate(random_walk(rng, count)):
+            ts_ms = start_ms + i * step_ms + rng.randint(0, 999)
+            path = os.path.join(dir_path, f"{ts_ms}.json")
+            with open(path, "w") as f:
+                json.dump(make_book(rng, token_id, ts_ms, mid, levels), f, separators=(",", ":"))
+            paths.append(path)
+    return paths
+
+def write_midpoint_files(root, symbol, date_str, hour, count, fmt="text", seed=0):
+    """写入一个小时两个 token 各 count 个 midpoint，fmt 为 text（.data）或 bin（.bin）"""
+    rng = random.Random(f"mid:{seed}:{symbol}:{date_str}:{hour}")
+    start_ts = hour_start_ts(date_str, hour)
+    dir_path = os.path.join(root, "midpoint", symbol, date_str, hour_to_label(hour))
+    os.makedirs(dir_path, exist_ok=True)
+    step = 3600 / max(count, 1)
+    for token_id in token_ids_for(symbol, date_str, hour):
+        records = [(start_ts + int(i * step), mid) for i, mid in enumerate(random_walk(rng, count))]
+        if fmt == "bin":
+            import numpy as np
+            np.array(records, dtype=midpoint_store.RECORD_DTYPE).tofile(midpoint_store.bin_path(dir_path, token_id))
+        else:
+            with open(os.path.join(dir_path, f"{token_id}.data"), "w") as f:
+                f.writelines(f"{ts},{mid}\n" for ts, mid in records)
+    return dir_path
+
+def write_markets_tree(root, symbol, date_str, hours=range(24), seed=0):
+    """midpoint/{symbol}/{date}/{hour}/markets.json，每小时一个已结算市场"""
+    rng = random.Random(f"markets:{seed}:{symbol}:{date_str}")
+    for hour in hours:
+        dir_path = os.path.join(root, "midpoint", symbol, date_str, hour_to_label(hour))
+        os.makedirs(dir_path, exist_ok=True)
+        with open(os.path.join(dir_path, "markets.json"), "w") as f:
+            json.dump([make_market(symbol, date_str, hour, rng)], f, indent=2)
+
+def generate_day(root, symbol, date_str, snapshots_per_hour, midpoints_per_hour, seed=0):
+    """生成一整天：每小时的订单簿快照、midpoint 文本文件和 markets.json"""
+    write_markets_tree(root, symbol, date_str, seed=seed)
+    for hour in range(24):
+        write_book_snapshots(root, symbol, date_str, hour, snapshots_per_hour, seed)
+        write_midpoint_files(root, symbol, date_str, hour, midpoints_per_hour, "text", seed)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate a synthetic day of collector output")
+    parser.add_argument("root", help="Directory to write price_data/ and midpoint/ into")
+    parser.add_argument("--symbol", default="btc")
+    parser.add_argument("--date", default="20250101", help="YYYYMMDD (ET)")
+    parser.add_argument("--snapshots", type=int, default=240, help="Order book snapshots per hour per side")
+    parser.add_argument("--midpoints", type=int, default=400, help="Midpoints per hour per token")
+    args = parser.parse_args()
+    generate_day(args.root, args.symbol, args.date, args.snapshots, args.midpoints)
+    print(f"[DONE] Synthetic day written to {args.root}")
@@ -0,0 +1,278 @@
+# 流水线各阶段的基准测试：用 bench_synth 生成的合成数据，在不同数据规模下计时
+#   python3 benchmark.py                                  # 跑全部用例，结果写入 bench_results/
+#   python3 benchmark.py --sizes small --cases process_hour load_midpoint_data_bin
+#   python3 benchmark.py --save-baseline                  # 把本次结果保存为基线
+#   python3 benchmark.py --baseline bench_baseline.json   # 与基线比较，超过阈值的用例视为退化，退出码 1
+#   python3 benchmark.py --check                          # 只做输出一致性检查（与优化前的逐行实现逐字节比较），不一致时退出码 1
+#
+# 每个用例先预热一次再计时 --repeat 次，记录单次调用的 min / median（秒）；比较基线时使用 median
+# 耗时很短的用例每次计时内循环调用多次（至少 MIN_SAMPLE_TIME 秒），降低计时噪声
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import random
+import tempfile
+import datetime
+import contextlib
+import statistics
+import subprocess
+import bench_synth
+
+DATE = "20250101"
+SYMBOL = "btc"
+HOUR = 13
+
+# 规模：每小时每个 side 的订单簿快照数、每小时每个 token 的 midpoint 数、图表每条折线点数、
+#       单个订单簿每侧的档数、成交量汇总扫描的天数
+SIZES = {
+    "small": {"snapshots": 60, "midpoints": 400, "points": 400, "levels": 10, "days": 1},
+    "medium": {"snapshots": 240, "midpoints": 4000, "points": 4000, "levels": 40, "days": 7},
+    "large": {"snapshots": 1440, "midpoints": 40000, "points": 40000, "levels": 200, "days": 31},
+}
+
+DEFAULT_THRESHOLD = 0.20
+MIN_SAMPLE_TIME = 0.02
+RESULTS_DIR = "bench_results"
+BASELINE_FILE = "bench_baseline.json"
+
+# === 用例 ===
+# 每个用例接收 (工作目录, 规模参数)，做好准备后返回一个无参的计时函数
+def case_process_json_file(root, size):
+    import gen_market_ask_bid_history_csv
+    path = bench_synth.write_book_snapshots(root, SYMBOL, DATE, HOUR, 1, levels=size["levels"])[0]
+    return lambda: gen_market_ask_bid_history_csv.process_json_file(path)
+
+def case_process_hour(root, size):
+    import gen_market_ask_bid_history_csv
+    bench_synth.write_book_snapshots(root, SYMBOL, DATE, HOUR, size["snapshots"])
+    hour_label = bench_synth.hour_to_label(HOUR)
+    return lambda: gen_market_ask_bid_history_csv.process_hour(SYMBOL, "price_data", DATE, hour_label)
+
+def midpoint_case(fmt):
+    def case(root, size):
+        import gen_hourly_midpoint_graph
+        bench_synth.write_midpoint_files(root, SYMBOL, DATE, HOUR, size["midpoints"], fmt)
+        token_id = bench_synth.token_ids_for(SYMBOL, DATE, HOUR)[0]
+        start_ts = bench_synth.hour_start_ts(DATE, HOUR)
+        hour_label = bench_synth.hour_to_label(HOUR)
+        return lambda: gen_hourly_midpoint_graph.load_midpoint_data(SYMBOL, DATE, hour_label, token_id, start_ts, start_ts + 3600)
+    return case
+
+def case_plot_chart(root, size):
+    import matplotlib
+    matplotlib.use("Agg")
+    import gen_hourly_midpoint_graph
+    n = size["points"]
+    data_list = []
+    for hour in range(6):
+        values = bench_synth.random_walk(random.Random(hour), n)
+        data_list.append((bench_synth.hour_to_label(hour), [i * 60 / n for i in range(n)], [v * 100 for v in values]))
+    filename = os.path.join(root, "chart.png")
+    return lambda: gen_hourly_midpoint_graph.plot_chart(data_list, 0, 5, filename, "benchmark")
+
+def order_volume_case(use_catalog):
+    def case(root, size):
+        import catalog
+        import gen_order_vol_graph
+        first_day = datetime.datetime.strptime(DATE, "%Y%m%d")
+        dates = [(first_day + datetime.timedelta(days=i)).strftime("%Y%m%d") for i in range(size["days"])]
+        for date_str in dates:
+            bench_synth.write_markets_tree(root, SYMBOL, date_str)
+        # 显式传入临时目录下的数据库，不改动 catalog.CATALOG_DB
+        db_path = os.path.join(root, "cache", "catalog.db")
+        if use_catalog:
+            catalog.rebuild([SYMBOL], db_path=db_path)
+        return lambda: [gen_order_vol_graph.load_volume_per_hour(SYMBOL, date_str, db_path) for date_str in dates]
+    return case
+
+CASES = {
+    "process_json_file": case_process_json_file,
+    "process_hour": case_process_hour,
+    "load_midpoint_data_text": midpoint_case("text"),
+    "load_midpoint_data_bin": midpoint_case("bin"),
+    "plot_chart": case_plot_chart,
+    "order_volume_scan": order_volume_case(False),
+    "order_volume_catalog": order_volume_case(True),
+}
+
+# === 计时 ===
+@contextlib.contextmanager
+def quiet():
+    # 被测函数内部的 print 不计入输出；整个计时过程只重定向一次，不把打开 devnull 的开销算进每次调用
+    stdout = sys.stdout
+    with open(os.devnull, "w") as sys.stdout:
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+def time_case(func, repeat):
+    with quiet():
+        start = time.perf_counter()
+        func()
+        warm_up = time.perf_counter() - start
+        number = max(1, int(MIN_SAMPLE_TIME / warm_up)) if warm_up > 0 else 1000
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - start) / number)
+    return {"min": min(samples), "median": statistics.median(samples), "repeat": repeat, "number": number}
+
+def run_case(name, size_name, repeat):
+    # 每个用例在独立的临时目录下运行，脚本中的相对路径都落在这里
+    cwd = os.getcwd()
+    root = tempfile.mkdtemp(prefix=f"pm_bench_{name}_")
+    try:
+        os.chdir(root)
+        func = CASES[name](root, SIZES[size_name])
+        return time_case(func, repeat)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(cases, sizes, repeat):
+    results = {}
+    for name in cases:
+        for size_name in sizes:
+            key = f"{name}[{size_name}]"
+            results[key] = run_case(name, size_name, repeat)
+            print(f"[INFO] {key:40s} median {results[key]['median'] * 1000:10.3f} ms  min {results[key]['min'] * 1000:10.3f} ms")
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+# === 基线比较 ===
+def compare(report, baseline, threshold):
+    """返回退化的用例列表 [(key, 基线 median, 本次 median)]"""
+    regressions = []
+    for key, result in report["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            print(f"[INFO] {key}: no baseline")
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else float("inf")
+        status = "REGRESSION" if ratio > 1 + threshold else "ok"
+        print(f"[{status}] {key:40s} {base['median'] * 1000:10.3f} ms -> {result['median'] * 1000:10.3f} ms ({ratio - 1:+.1%})")
+        if status == "REGRESSION":
+            regressions.append((key, base["median"], result["median"]))
+    return regressions
+
+# === 输出一致性检查 ===
+def legacy_book_row(data, depth=9):
+    # 优化前 process_json_file 的逐行实现，作为 csv 输出的参照
+    import gen_market_ask_bid_history_csv
+    bids = data.get('bids', [])
+    asks = data.get('asks', [])
+
+    asks_reversed = list(reversed(asks))[:depth]
+    ask_prices = [float(a.get('price', 0)) for a in asks_reversed]
+    ask_sizes = [float(a.get('size', 0)) for a in asks_reversed]
+    ask_prices += [0] * (depth - len(ask_prices))
+    ask_sizes += [0] * (depth - len(ask_sizes))
+
+    bid_reversed = list(reversed(bids))[:depth]
+    bid_prices = [float(a.get('price', 0)) for a in bid_reversed]
+    bid_sizes = [float(a.get('size', 0)) for a in bid_reversed]
+    bid_prices += [0] * (depth - len(bid_prices))
+    bid_sizes += [0] * (depth - len(bid_sizes))
+
+    spread = round(float(asks[-1]['price']) - float(bids[-1]['price']), 2) if asks and bids else 0
+
+    row = [gen_market_ask_bid_history_csv.format_time(data['timestamp']), spread]
+    for p, s in zip(ask_prices, ask_sizes):
+        row.extend([p, s])
+    for p, s in zip(bid_prices, bid_sizes):
+        row.extend([p, s])
+    return row
+
+def tick_books(tick=0.001, max_price=0.06):
+    """0.001 价位（接近 0 / 1 时的最小变动单位）的全部 ask > bid 组合，另加档位不足和单边盘口的订单簿"""
+    prices = [f"{i * tick:.3f}" for i in range(1, round(max_price / tick) + 1)]
+    books = []
+    for bid_index, bid in enumerate(prices):
+        for ask in prices[bid_index + 1:]:
+            books.append({"timestamp": str(1735754400123 + len(books)),
+                          "asks": [{"price": "0.990", "size": "5"}, {"price": ask, "size": "12.5"}],
+                          "bids": [{"price": "0.001", "size": "7"}, {"price": bid, "size": "3"}]})
+    books.append({"timestamp": "1735754400000", "asks": [{"price": "0.006", "size": "1"}], "bids": []})
+    books.append({"timestamp": "1735754400001", "asks": [], "bids": [{"price": "0.001", "size": "1"}]})
+    books.append({"timestamp": "1735754400002", "asks": [], "bids": []})
+    return books
+
+def check_csv_output():
+    """新旧实现对同一批订单簿生成的 csv 行逐字节比较，返回不一致的数量"""
+    import io
+    import csv
+    import gen_market_ask_bid_history_csv
+    mismatches = 0
+    for book in tick_books():
+        old, new = io.StringIO(), io.StringIO()
+        csv.writer(old).writerow(legacy_book_row(book))
+        csv.writer(new).writerow(gen_market_ask_bid_history_csv.process_book(book))
+        if old.getvalue() != new.getvalue():
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"[ERROR] csv row differs:\n  old {old.getvalue().strip()}\n  new {new.getvalue().strip()}")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic data")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case after one warm-up run")
+    parser.add_argument("--output", help=f"Results file (default: {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed median slowdown before a case counts as a regression (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Also write the results to {BASELINE_FILE}")
+    parser.add_argument("--check", action="store_true", help="Only compare csv output against the row-by-row implementation")
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check_csv_output()
+        if mismatches:
+            print(f"[ERROR] {mismatches} order book csv row(s) differ from the row-by-row implementation")
+            sys.exit(1)
+        print("[DONE] Order book csv output matches the row-by-row implementation")
+        return
+
+    report = run(args.cases, args.sizes, args.repeat)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d_%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[DONE] Results saved: {output}")
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[DONE] Baseline saved: {BASELINE_FILE}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"[ERROR] {len(regressions)} case(s) regressed more than {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
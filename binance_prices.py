@@ -0,0 +1,101 @@
+# Binance 价格的本地缓存，供各采集脚本共用
+# - 每小时开盘价在该小时内不会变化：按 (交易对, 小时) 缓存在 cache/binance/open_prices.json，每个交易对每小时只请求一次 klines
+# - 当前价格用一次 ticker/price?symbols=[...] 批量取回所有跟踪交易对，缓存 TICKER_TTL 秒；
+#   多个 cron / 常驻进程同一时刻采样时，只有第一个进程发请求，其余读缓存
+# 读写缓存时对 cache/binance/.lock 加 flock 排它锁，请求期间持锁，避免多个进程同时发同一个请求
+import os
+import json
+import time
+import fcntl
+from urllib.parse import quote
+import http_client
+from market_cache import atomic_write_json
+
+BINANCE_HOST = os.environ.get("BINANCE_HOST", "https://api.binance.com")
+CACHE_DIR = os.path.join("cache", "binance")
+TICKER_TTL = 2.0
+
+# 所有采集脚本跟踪的币种，当前价格一次全部取回
+TRACKED_SYMBOLS = ("BTC", "ETH", "SOL", "XRP")
+
+_open_prices = {}
+
+def pair(symbol_upper):
+    return f"{symbol_upper}USDT"
+
+def hour_start(ts=None):
+    return int(ts if ts is not None else time.time()) // 3600 * 3600
+
+class locked_cache:
+    """with locked_cache("ticker.json") as cache: ... 持锁读写 cache/binance 下的一个 json 文件"""
+    def __init__(self, name):
+        self.path = os.path.join(CACHE_DIR, name)
+
+    def __enter__(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.lock_file = open(os.path.join(CACHE_DIR, ".lock"), "a")
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            with open(self.path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+        return self
+
+    def save(self):
+        atomic_write_json(self.path, self.data)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.lock_file.close()
+
+# === 开盘价 ===
+def fetch_open_price(symbol_upper, hour_ts):
+    url = f"{BINANCE_HOST}/api/v3/klines?symbol={pair(symbol_upper)}&interval=1h&startTime={hour_ts * 1000}&limit=1"
+    response = http_client.get(url)
+    response.raise_for_status()
+    kline = response.json()[0]
+    if int(kline[0]) // 1000 != hour_ts:
+        raise ValueError(f"{pair(symbol_upper)} kline for {hour_ts} not available yet")
+    return kline[1]  # 开盘价
+
+def get_open_price(symbol_upper, ts=None):
+    """返回 ts 所在小时（默认当前小时）的开盘价，字符串"""
+    hour_ts = hour_start(ts)
+    key = (pair(symbol_upper), hour_ts)
+    if key in _open_prices:
+        return _open_prices[key]
+
+    with locked_cache("open_prices.json") as cache:
+        entry = cache.data.get(pair(symbol_upper))
+        if entry and entry["hour"] == hour_ts:
+            price = entry["price"]
+        else:
+            price = fetch_open_price(symbol_upper, hour_ts)
+            cache.data[pair(symbol_upper)] = {"hour": hour_ts, "price": price}
+            cache.save()
+    _open_prices[key] = price
+    return price
+
+# === 当前价格 ===
+def fetch_current_prices(symbols):
+    names = json.dumps([pair(s) for s in symbols], separators=(",", ":"))
+    response = http_client.get(f"{BINANCE_HOST}/api/v3/ticker/price?symbols={quote(names)}")
+    response.raise_for_status()
+    return {item["symbol"]: item["price"] for item in response.json()}
+
+def get_current_prices(max_age=TICKER_TTL):
+    """返回 {交易对: 当前价格}，覆盖 TRACKED_SYMBOLS；缓存不超过 max_age 秒时不发请求"""
+    with locked_cache("ticker.json") as cache:
+        if cache.data and time.time() - cache.data["fetched_at"] < max_age:
+            return cache.data["prices"]
+        prices = fetch_current_prices(TRACKED_SYMBOLS)
+        cache.data = {"fetched_at": time.time(), "prices": prices}
+        cache.save()
+    return prices
+
+def get_current_price(symbol_upper, max_age=TICKER_TTL):
+    prices = get_current_prices(max_age)
+    if pair(symbol_upper) not in prices:
+        # 不在跟踪列表里的币种单独请求
+        return fetch_current_prices([symbol_upper])[pair(symbol_upper)]
+    return prices[pair(symbol_upper)]
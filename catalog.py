@@ -0,0 +1,215 @@
+# 市场与数据文件目录（SQLite），每个 (symbol, date, hour) 一行，替代按目录 listdir + 逐个读取 markets.json
+# - 采集脚本拿到 gamma-api 市场数据或写入新目录时更新对应行
+# - 出图、报表脚本按日期范围查询，没有记录时退回原来的目录扫描
+# - 已有数据目录可用 rebuild 重新生成：python3 catalog.py rebuild
+# 查询示例：python3 catalog.py query btc --start 20251001 --end 20251014
+#
+# 表结构（hours）：
+#   symbol, date(YYYYMMDD, ET), hour(0-23, ET), hour_label(如 1pm), slug
+#   token_ids / outcome_prices：gamma-api 原样的 JSON 字符串
+#   winner_index / winner_token：outcomePrices 最大的一侧（按 Decimal 比较）
+#   volume：gamma-api 原样字符串，closed：市场是否已结算
+#   markets_path：最近一次写入的 markets.json
+#   midpoint_dir / book_dir / history_dir：midpoint/、price_data/、{symbol}/ 下对应小时的数据目录
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from decimal import Decimal
+
+CATALOG_DB = os.environ.get("PM_CATALOG_DB", os.path.join("cache", "catalog.db"))
+
+SYMBOLS = ["btc", "eth", "sol", "xrp"]
+PATH_COLUMNS = ("markets_path", "midpoint_dir", "book_dir", "history_dir")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hours (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    hour_label TEXT NOT NULL,
+    slug TEXT,
+    token_ids TEXT,
+    outcome_prices TEXT,
+    winner_index INTEGER,
+    winner_token TEXT,
+    volume TEXT,
+    closed INTEGER,
+    markets_path TEXT,
+    midpoint_dir TEXT,
+    book_dir TEXT,
+    history_dir TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (symbol, date, hour)
+);
+CREATE INDEX IF NOT EXISTS hours_date ON hours (date, symbol);
+"""
+
+_local = threading.local()
+
+def hour_to_label(hour):
+    return f"{hour % 12 or 12}{'am' if hour < 12 else 'pm'}"
+
+def label_to_hour(label):
+    """'12am' -> 0, '1pm' -> 13，不是小时目录名时返回 None"""
+    label = label.lower()
+    if not label.endswith(("am", "pm")) or not label[:-2].isdigit():
+        return None
+    hour = int(label[:-2])
+    if not 1 <= hour <= 12:
+        return None
+    return hour % 12 + (12 if label.endswith("pm") else 0)
+
+# === 连接 ===
+def connect(db_path=None):
+    """每个线程、每个数据库文件复用一个连接；WAL 模式下多个采集进程可同时写入"""
+    db_path = db_path or CATALOG_DB
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        connections[db_path] = conn
+    return conn
+
+# === 写入 ===
+def market_fields(market):
+    prices = json.loads(market.get("outcomePrices") or "[]")
+    token_ids = json.loads(market.get("clobTokenIds") or "[]")
+    winner_index = winner_token = None
+    if prices and len(prices) == len(token_ids):
+        price_list = [Decimal(x) for x in prices]
+        winner_index = price_list.index(max(price_list))
+        winner_token = token_ids[winner_index]
+    return {
+        "slug": market.get("slug"),
+        "token_ids": market.get("clobTokenIds"),
+        "outcome_prices": market.get("outcomePrices"),
+        "winner_index": winner_index,
+        "winner_token": winner_token,
+        "volume": str(market["volume"]) if market.get("volume") is not None else None,
+        "closed": int(bool(market.get("closed"))),
+    }
+
+def upsert(symbol, date_str, hour, fields, db_path=None):
+    # 只覆盖本次给出的列，其它采集脚本写入的路径保留
+    fields = {k: v for k, v in fields.items() if v is not None}
+    columns = ["symbol", "date", "hour", "hour_label", "updated_at"] + list(fields)
+    values = [symbol, date_str, hour, hour_to_label(hour), time.time()] + list(fields.values())
+    updates = ", ".join(f"{c} = excluded.{c}" for c in ["updated_at"] + list(fields))
+    conn = connect(db_path)
+    with conn:
+        conn.execute(
+            f"INSERT INTO hours ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (symbol, date, hour) DO UPDATE SET {updates}",
+            values,
+        )
+
+def record_market(symbol, date_str, hour, markets, db_path=None, **paths):
+    """记录 gamma-api /markets 返回的市场信息，paths 为 PATH_COLUMNS 中的目录/文件路径"""
+    fields = market_fields(markets[0]) if markets else {}
+    fields.update(paths)
+    upsert(symbol, date_str, hour, fields, db_path)
+
+def record_paths(symbol, date_str, hour, db_path=None, **paths):
+    upsert(symbol, date_str, hour, paths, db_path)
+
+def safe_record(func, *args, **kwargs):
+    # 采集脚本调用：目录更新失败只打印警告，不影响数据采集
+    try:
+        func(*args, **kwargs)
+    except Exception as e:
+        print(f"[WARN] Catalog update failed: {e}")
+
+# === 查询 ===
+def query_hours(symbol, start_date, end_date=None, db_path=None):
+    """返回 [start_date, end_date] 内 symbol 的全部小时行（sqlite3.Row），按日期、小时排序"""
+    conn = connect(db_path)
+    return conn.execute(
+        "SELECT * FROM hours WHERE symbol = ? AND date BETWEEN ? AND ? ORDER BY date, hour",
+        (symbol, start_date, end_date or start_date),
+    ).fetchall()
+
+# === 从已有目录重建 ===
+def iter_hour_dirs(root):
+    """遍历 root/{date}/{hour}/，返回 (date, hour, 目录)"""
+    if not os.path.isdir(root):
+        return
+    for date_str in sorted(os.listdir(root)):
+        date_dir = os.path.join(root, date_str)
+        if len(date_str) != 8 or not date_str.isdigit() or not os.path.isdir(date_dir):
+            continue
+        for hour_dir in os.listdir(date_dir):
+            hour = label_to_hour(hour_dir)
+            if hour is not None and os.path.isdir(os.path.join(date_dir, hour_dir)):
+                yield date_str, hour, os.path.normpath(os.path.join(date_dir, hour_dir))
+
+def load_markets(dir_path):
+    try:
+        with open(os.path.join(dir_path, "markets.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def rebuild(symbols=SYMBOLS, base_dir=".", db_path=None):
+    count = 0
+    for symbol in symbols:
+        sources = [
+            (os.path.join(base_dir, symbol), "history_dir"),
+            (os.path.join(base_dir, "midpoint", symbol), "midpoint_dir"),
+        ]
+        for root, column in sources:
+            for date_str, hour, dir_path in iter_hour_dirs(root):
+                markets = load_markets(dir_path)
+                paths = {column: dir_path}
+                if markets:
+                    paths["markets_path"] = os.path.join(dir_path, "markets.json")
+                record_market(symbol, date_str, hour, markets, db_path, **paths)
+                count += 1
+
+        # 订单簿：json 快照在 row_data/{hour}/，分段文件在 segments/{hour}/
+        price_root = os.path.join(base_dir, "price_data", symbol)
+        if os.path.isdir(price_root):
+            for date_str in sorted(os.listdir(price_root)):
+                for sub in ("row_data", "segments"):
+                    sub_dir = os.path.join(price_root, date_str, sub)
+                    if not os.path.isdir(sub_dir):
+                        continue
+                    for hour_dir in os.listdir(sub_dir):
+                        hour = label_to_hour(hour_dir)
+                        if hour is not None:
+                            record_paths(symbol, date_str, hour, db_path, book_dir=os.path.normpath(os.path.join(sub_dir, hour_dir)))
+                            count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite catalog of markets and data directories")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_rebuild = sub.add_parser("rebuild", help="Scan existing data directories into the catalog")
+    p_rebuild.add_argument("--symbols", nargs="+", default=SYMBOLS, choices=SYMBOLS)
+
+    p_query = sub.add_parser("query", help="Print catalog rows for a date range")
+    p_query.add_argument("symbol", choices=SYMBOLS)
+    p_query.add_argument("--start", required=True, help="YYYYMMDD (ET)")
+    p_query.add_argument("--end", help="YYYYMMDD (ET), defaults to --start")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        start = time.time()
+        count = rebuild(args.symbols)
+        print(f"[DONE] Catalog rebuilt from {count} directories in {time.time() - start:.2f}s: {CATALOG_DB}")
+    else:
+        for row in query_hours(args.symbol, args.start, args.end):
+            print(json.dumps(dict(row), ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# clob.polymarket.com / gamma-api.polymarket.com 接口封装
+# 单 token 接口：GET /midpoint、GET /book
+# 批量接口：POST /midpoints、POST /books，一次请求拿到多个 token 的数据，失败时不重试、直接退回逐个请求
+# （逐个请求仍按 http_client 的默认次数重试），避免退避等待挤占采样周期
+# （请求预算耗尽时直接抛出，不再逐个请求放大请求量）
+#
+# 主机地址可通过环境变量覆盖，便于对接本地替身服务（mock_polymarket_server.py）离线测试：
+#   PM_CLOB_HOST=http://127.0.0.1:8765 PM_GAMMA_HOST=http://127.0.0.1:8765 python3 fetch_midpoint_loop.py --all
+import os
+from decimal import Decimal
+import http_client
+from request_budget import BudgetExhausted
+
+CLOB_HOST = os.environ.get("PM_CLOB_HOST", "https://clob.polymarket.com")
+GAMMA_HOST = os.environ.get("PM_GAMMA_HOST", "https://gamma-api.polymarket.com")
+
+# === 单 token 接口 ===
+def fetch_midpoint(token_id):
+    url = f"{CLOB_HOST}/midpoint?token_id={token_id}"
+    response = http_client.get(url)
+    if response.status_code != 200:
+        print(f"Warning: Failed to fetch midpoint for {token_id}, status: {response.status_code}")
+        return None
+    return response.json()
+
+def fetch_book(token_id):
+    url = f"{CLOB_HOST}/book?token_id={token_id}"
+    response = http_client.get(url)
+    response.raise_for_status()
+    return response.json()
+
+def book_midpoint(best_ask, best_bid):
+    """由订单簿最优卖价、买价（{"price", "size"}）计算 midpoint，按 Decimal 计算避免浮点误差；任一侧为空时返回 None"""
+    if not best_ask or not best_bid:
+        return None
+    return ((Decimal(best_ask["price"]) + Decimal(best_bid["price"])) / 2).normalize()
+
+# === 批量接口 ===
+def fetch_midpoints(token_ids):
+    """批量获取 midpoint，返回 {token_id: mid}；取不到的 token 不在结果中"""
+    result = {}
+    try:
+        response = http_client.post(f"{CLOB_HOST}/midpoints", retries=0, json=[{"token_id": t} for t in token_ids])
+        response.raise_for_status()
+        data = response.json()
+        for token_id in token_ids:
+            if data.get(token_id) is not None:
+                result[token_id] = data[token_id]
+    except BudgetExhausted:
+        raise
+    except Exception as e:
+        print(f"Warning: batch midpoints failed, falling back to per-token requests: {e}")
+
+    for token_id in token_ids:
+        if token_id in result:
+            continue
+        try:
+            data = fetch_midpoint(token_id)
+        except Exception as e:
+            print(f"Warning: Failed to fetch midpoint for {token_id}: {e}")
+            continue
+        if data and 'mid' in data:
+            result[token_id] = data['mid']
+    return result
+
+def fetch_books(token_ids):
+    """批量获取订单簿，返回 {token_id: book}；取不到的 token 不在结果中"""
+    result = {}
+    try:
+        response = http_client.post(f"{CLOB_HOST}/books", retries=0, json=[{"token_id": t} for t in token_ids])
+        response.raise_for_status()
+        for book in response.json():
+            if book.get("asset_id") in token_ids:
+                result[book["asset_id"]] = book
+    except BudgetExhausted:
+        raise
+    except Exception as e:
+        print(f"Warning: batch books failed, falling back to per-token requests: {e}")
+
+    for token_id in token_ids:
+        if token_id in result:
+            continue
+        try:
+            result[token_id] = fetch_book(token_id)
+        except Exception as e:
+            print(f"[Error] token_id={token_id} fetch failed: {e}")
+    return result
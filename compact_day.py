@@ -0,0 +1,256 @@
+# 日终压缩：把一天的原始数据按 symbol/日期/数据集 合并成一个列式 Parquet 文件，便于跨周分析
+# 5 0 * * * cd /var/www/pm_stats && /usr/bin/python3 compact_day.py compact > /dev/null 2>&1
+#
+# 输出 compacted/{symbol}/{date}/{dataset}.parquet，数据集：
+#   top_of_book  price_data/{symbol}/{date}/{hour}.csv 的买1/卖1 行
+#   midpoint     midpoint/{symbol}/{date}/{hour}/{token_id}.bin|.data 的逐条 midpoint
+#   book_depth   row_data / 分段文件中的订单簿，按 (时间, side, 档位) 展开成长表
+# 所有数据集都有 ts_ms（毫秒时间戳）和 hour（ET 0-23）列，文件按 ts_ms 排序并写入行组统计信息，
+# 读取时按时间范围过滤只会打开 min/max 有交集的行组
+#
+# 读取示例：
+#   python3 compact_day.py read btc midpoint --start 20251001 --end 20251014 --columns ts_ms mid
+import os
+import csv
+import json
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import pytz
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+import midpoint_store
+from catalog import label_to_hour
+from gen_market_ask_bid_history_csv import DEFAULT_DEPTH, extract_depth_arrays, iter_hour_books
+
+ET = pytz.timezone("US/Eastern")
+OUTPUT_ROOT = "compacted"
+SYMBOLS = ["btc", "eth", "sol", "xrp"]
+DATASETS = ["top_of_book", "midpoint", "book_depth"]
+ROW_GROUP_ROWS = 64 * 1024
+
+TOP_OF_BOOK_FIELDS = [
+    "open_price", "current_price", "diff",
+    "up_ask_price", "up_ask_size", "down_ask_price", "down_ask_size",
+    "up_bid_price", "up_bid_size", "down_bid_price", "down_bid_size",
+]
+
+def hour_dirs(root):
+    """返回 root 下的 [(hour, 小时目录名)]，按小时排序"""
+    if not os.path.isdir(root):
+        return []
+    hours = [(label_to_hour(name), name) for name in os.listdir(root)]
+    return sorted((h, name) for h, name in hours if h is not None)
+
+def to_float(value):
+    return float(value) if value not in ("", None) else None
+
+# === 各数据集读取 ===
+def load_top_of_book(symbol, date_str):
+    day_dir = os.path.join("price_data", symbol, date_str)
+    if not os.path.isdir(day_dir):
+        return None
+    columns = {"ts_ms": [], "hour": []}
+    columns.update({name: [] for name in TOP_OF_BOOK_FIELDS})
+
+    for filename in sorted(os.listdir(day_dir)):
+        hour = label_to_hour(filename[:-len(".csv")]) if filename.endswith(".csv") else None
+        if hour is None:
+            continue
+        with open(os.path.join(day_dir, filename), newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    et_time = ET.localize(datetime.strptime(row["time"], "%Y%m%d_%H:%M:%S"))
+                    values = [to_float(row.get(name)) for name in TOP_OF_BOOK_FIELDS]
+                except (KeyError, ValueError) as e:
+                    print(f"[WARN] Skipping row in {filename}: {e}")
+                    continue
+                columns["ts_ms"].append(int(et_time.timestamp() * 1000))
+                columns["hour"].append(hour)
+                for name, value in zip(TOP_OF_BOOK_FIELDS, values):
+                    columns[name].append(value)
+
+    if not columns["ts_ms"]:
+        return None
+    schema = pa.schema([("ts_ms", pa.int64()), ("hour", pa.int8())] + [(name, pa.float64()) for name in TOP_OF_BOOK_FIELDS])
+    return pa.table(columns, schema=schema)
+
+def token_sides(hour_dir):
+    # markets.json 中 clobTokenIds 的顺序即 side：0 = Up，1 = Down
+    try:
+        with open(os.path.join(hour_dir, "markets.json")) as f:
+            return {tid: i for i, tid in enumerate(json.loads(json.load(f)[0]["clobTokenIds"]))}
+    except (OSError, ValueError, KeyError, IndexError):
+        return {}
+
+def load_midpoint(symbol, date_str):
+    day_dir = os.path.join("midpoint", symbol, date_str)
+    parts = []
+    for hour, name in hour_dirs(day_dir):
+        hour_dir = os.path.join(day_dir, name)
+        sides = token_sides(hour_dir)
+        tokens = {os.path.splitext(f)[0] for f in os.listdir(hour_dir) if f.endswith((".bin", ".data"))}
+        for token_id in sorted(tokens):
+            bin_file = midpoint_store.bin_path(hour_dir, token_id)
+            data_file = os.path.join(hour_dir, f"{token_id}.data")
+            try:
+                if midpoint_store.bin_is_current(hour_dir, token_id):
+                    series = np.sort(np.array(midpoint_store.open_series(bin_file)), kind="stable", order="ts")
+                    timestamps, mids = series["ts"], series["mid"]
+                else:
+                    # 逐行解析，格式错误的行单独跳过，不丢弃整个 token 的数据
+                    timestamps, mids, bad_lines = [], [], 0
+                    with open(data_file) as f:
+                        for line in f:
+                            line = line.strip()
+                            if not line:
+                                continue
+                            try:
+                                ts_str, mid_str = line.split(",")
+                                ts, mid = int(ts_str), float(mid_str)
+                            except ValueError:
+                                bad_lines += 1
+                                continue
+                            timestamps.append(ts)
+                            mids.append(mid)
+                    if bad_lines:
+                        print(f"[WARN] Skipped {bad_lines} malformed line(s) in {data_file}")
+                    order = np.argsort(timestamps, kind="stable")
+                    timestamps = np.array(timestamps, dtype=np.int64)[order]
+                    mids = np.array(mids, dtype=np.float64)[order]
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Skipping {token_id} in {hour_dir}: {e}")
+                continue
+            n = len(timestamps)
+            side = sides.get(token_id)
+            parts.append(pa.table({
+                "ts_ms": pa.array(timestamps * 1000, pa.int64()),
+                "hour": pa.array(np.full(n, hour, dtype=np.int8)),
+                "token_id": pa.array([token_id] * n, pa.string()).dictionary_encode(),
+                "side": pa.array([side] * n, pa.int8()),
+                "mid": pa.array(mids, pa.float64()),
+            }))
+    return pa.concat_tables(parts) if parts else None
+
+def load_book_depth(symbol, date_str, depth=DEFAULT_DEPTH):
+    day_dir = os.path.join("price_data", symbol, date_str)
+    labels = {name for sub in ("row_data", "segments") for _, name in hour_dirs(os.path.join(day_dir, sub))}
+    parts = []
+    for label in sorted(labels, key=label_to_hour):
+        hour = label_to_hour(label)
+        for side in ("0", "1"):
+            books = iter_hour_books("price_data", symbol, date_str, label, side)
+            if not books:
+                continue
+            arrays = extract_depth_arrays(books, depth)
+            # (N, depth) 矩阵按行展开，每档一行；补 0 的空档位不写入
+            present = (arrays["ask_price"] > 0) | (arrays["bid_price"] > 0)
+            rows, levels = np.nonzero(present)
+            parts.append(pa.table({
+                "ts_ms": pa.array(arrays["timestamp"][rows], pa.int64()),
+                "hour": pa.array(np.full(len(rows), hour, dtype=np.int8)),
+                "side": pa.array(np.full(len(rows), int(side), dtype=np.int8)),
+                "level": pa.array((levels + 1).astype(np.int8)),
+                "ask_price": pa.array(arrays["ask_price"][rows, levels]),
+                "ask_size": pa.array(arrays["ask_size"][rows, levels]),
+                "bid_price": pa.array(arrays["bid_price"][rows, levels]),
+                "bid_size": pa.array(arrays["bid_size"][rows, levels]),
+            }))
+    return pa.concat_tables(parts) if parts else None
+
+LOADERS = {
+    "top_of_book": load_top_of_book,
+    "midpoint": load_midpoint,
+    "book_depth": load_book_depth,
+}
+
+# === 写入 ===
+def output_path(symbol, date_str, dataset, root=OUTPUT_ROOT):
+    return os.path.join(root, symbol, date_str, f"{dataset}.parquet")
+
+def write_sorted(table, path):
+    sort_keys = [("ts_ms", "ascending")] + [(c, "ascending") for c in ("side", "level") if c in table.column_names]
+    table = table.sort_by(sort_keys)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_ROWS, compression="zstd", write_statistics=True)
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+def compact_day(symbol, date_str, datasets=DATASETS, overwrite=False, root=OUTPUT_ROOT):
+    for dataset in datasets:
+        path = output_path(symbol, date_str, dataset, root)
+        if os.path.exists(path) and not overwrite:
+            print(f"[INFO] Exists, skipping: {path}")
+            continue
+        table = LOADERS[dataset](symbol, date_str)
+        if table is None:
+            continue
+        rows = write_sorted(table, path)
+        print(f"[DONE] {path} ({rows} rows, {os.path.getsize(path)} bytes)")
+
+# === 读取 ===
+def date_range(start_date, end_date):
+    current = datetime.strptime(start_date, "%Y%m%d")
+    end = datetime.strptime(end_date, "%Y%m%d")
+    while current <= end:
+        yield current.strftime("%Y%m%d")
+        current += timedelta(days=1)
+
+def read_dataset(symbol, dataset, start_date, end_date=None, columns=None, start_ts_ms=None, end_ts_ms=None, root=OUTPUT_ROOT):
+    """读取 [start_date, end_date] 的压缩文件，只解码 columns 中的列；
+    ts_ms 范围 [start_ts_ms, end_ts_ms) 下推到扫描，按行组统计跳过无关行组"""
+    paths = [output_path(symbol, d, dataset, root) for d in date_range(start_date, end_date or start_date)]
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return None
+
+    expr = None
+    if start_ts_ms is not None:
+        expr = ds.field("ts_ms") >= start_ts_ms
+    if end_ts_ms is not None:
+        upper = ds.field("ts_ms") < end_ts_ms
+        expr = upper if expr is None else expr & upper
+    return ds.dataset(paths, format="parquet").to_table(columns=columns, filter=expr)
+
+def default_date():
+    # 压缩已经结束的那一天（ET 昨天）
+    return (datetime.now(ET) - timedelta(days=1)).strftime("%Y%m%d")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact a day of raw data into per-dataset Parquet files")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_compact = sub.add_parser("compact", help="Write compacted files for one ET day")
+    p_compact.add_argument("--date", help="YYYYMMDD (ET), defaults to yesterday")
+    p_compact.add_argument("--symbols", nargs="+", default=SYMBOLS, choices=SYMBOLS)
+    p_compact.add_argument("--datasets", nargs="+", default=DATASETS, choices=DATASETS)
+    p_compact.add_argument("--overwrite", action="store_true", help="Rewrite files that already exist")
+
+    p_read = sub.add_parser("read", help="Print a summary of compacted rows for a date range")
+    p_read.add_argument("symbol", choices=SYMBOLS)
+    p_read.add_argument("dataset", choices=DATASETS)
+    p_read.add_argument("--start", required=True, help="YYYYMMDD (ET)")
+    p_read.add_argument("--end", help="YYYYMMDD (ET), defaults to --start")
+    p_read.add_argument("--columns", nargs="+", help="Columns to read (default: all)")
+    p_read.add_argument("--from-ts", type=int, help="Inclusive lower bound on ts_ms")
+    p_read.add_argument("--to-ts", type=int, help="Exclusive upper bound on ts_ms")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        date_str = args.date or default_date()
+        if date_str >= datetime.now(ET).strftime("%Y%m%d"):
+            print(f"[WARN] {date_str} has not closed yet (ET), compacted files will be partial")
+        for symbol in args.symbols:
+            compact_day(symbol, date_str, args.datasets, args.overwrite)
+    else:
+        table = read_dataset(args.symbol, args.dataset, args.start, args.end, args.columns, args.from_ts, args.to_ts)
+        if table is None:
+            print("[INFO] No compacted files in range")
+            return
+        print(f"[INFO] {table.num_rows} rows, columns: {', '.join(table.column_names)}")
+        print(table.slice(0, 10))
+
+if __name__ == "__main__":
+    main()
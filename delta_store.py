@@ -0,0 +1,145 @@
+# 基于分段文件的订单簿关键帧 + 增量存储
+# 连续两次 /book 返回往往只有一两档数量变化，逐条保存完整快照浪费磁盘和写 IO：
+# - 盘口（asks/bids）与上一条相同的快照直接跳过
+# - 每 KEYFRAME_INTERVAL 条写一次完整快照（关键帧），其余只写逐档差异
+# 读取时从不晚于目标时间的最近关键帧开始回放增量，得到任意时刻的完整订单簿
+#
+# 文件：price_data/{symbol}/{date}/segments/{hour}/{side}.delta.seg（及 .delta.idx）
+# 增量记录 payload：{"asks": {price: size}, "bids": {price: size}, "set": {其它变化字段}}，size 为 "0" 表示该档被移除
+import os
+import bisect
+import segment_store
+from segment_store import SegmentReader, SegmentWriter, decode_payload
+
+FLAG_DELTA = 0x02
+KEYFRAME_INTERVAL = 60
+
+def delta_path(base_dir, symbol, date_str, hour_str, side):
+    return os.path.join(base_dir, symbol, date_str, "segments", hour_str, f"{side}.delta.seg")
+
+def levels_to_map(levels):
+    return {level["price"]: level["size"] for level in levels}
+
+def map_to_levels(level_map, descending):
+    # 与接口一致：asks 价格降序、bids 价格升序，最优价在末尾
+    prices = sorted(level_map, key=float, reverse=descending)
+    return [{"price": price, "size": level_map[price]} for price in prices]
+
+def diff_levels(old, new):
+    old_map, new_map = levels_to_map(old), levels_to_map(new)
+    changes = {price: size for price, size in new_map.items() if old_map.get(price) != size}
+    changes.update({price: "0" for price in old_map if price not in new_map})
+    return changes
+
+def diff_books(old, new):
+    """返回 new 相对 old 的增量；顶层字段有增删时返回 None，由调用方写关键帧"""
+    if set(old) != set(new):
+        return None
+    return {
+        "asks": diff_levels(old.get("asks", []), new.get("asks", [])),
+        "bids": diff_levels(old.get("bids", []), new.get("bids", [])),
+        "set": {k: v for k, v in new.items() if k not in ("asks", "bids") and old[k] != v},
+    }
+
+def apply_delta(book, delta):
+    book = dict(book)
+    book.update(delta["set"])
+    for side, descending in (("asks", True), ("bids", False)):
+        level_map = levels_to_map(book.get(side, []))
+        for price, size in delta[side].items():
+            if size == "0":
+                level_map.pop(price, None)
+            else:
+                level_map[price] = size
+        book[side] = map_to_levels(level_map, descending)
+    return book
+
+def same_book(old, new):
+    if old is None:
+        return False
+    if old.get("hash") and old.get("hash") == new.get("hash"):
+        return True
+    return old.get("asks") == new.get("asks") and old.get("bids") == new.get("bids")
+
+class BookDeltaWriter:
+    def __init__(self, path, compress=True, keyframe_interval=KEYFRAME_INTERVAL):
+        self.segment = SegmentWriter(path, compress)
+        self.keyframe_interval = keyframe_interval
+        self.last_book, self.since_keyframe = load_tail_state(path)
+
+    def append(self, timestamp, book):
+        """写入一条快照，盘口未变化时跳过；返回是否写入"""
+        if same_book(self.last_book, book):
+            return False
+
+        delta = None
+        if self.last_book is not None and self.since_keyframe < self.keyframe_interval:
+            delta = diff_books(self.last_book, book)
+
+        if delta is None:
+            self.segment.append(timestamp, book)
+            self.since_keyframe = 0
+        else:
+            self.segment.append(timestamp, delta, FLAG_DELTA)
+            self.since_keyframe += 1
+        self.last_book = book
+        return True
+
+    def close(self):
+        self.segment.close()
+
+def load_tail_state(path):
+    """重新打开已有文件时恢复最后一条完整订单簿及其距上一关键帧的条数"""
+    book, since_keyframe = None, 0
+    reader = SegmentReader(path)
+    if not reader.index:
+        return book, since_keyframe
+    for timestamp, flags, payload in reader.iter_raw(start_ts=keyframe_ts_before(reader, len(reader.index) - 1)):
+        if flags & FLAG_DELTA:
+            if book is None:
+                continue
+            book = apply_delta(book, decode_payload(payload, flags))
+            since_keyframe += 1
+        else:
+            book = decode_payload(payload, flags)
+            since_keyframe = 0
+    return book, since_keyframe
+
+def keyframe_ts_before(reader, pos):
+    # 从索引位置 pos 往前找最近的关键帧
+    while pos > 0 and reader.index[pos][2] & FLAG_DELTA:
+        pos -= 1
+    return reader.index[pos][0] if reader.index else None
+
+def iter_books(path, start_ts=None, end_ts=None):
+    """按时间顺序返回 (timestamp, 完整订单簿)，时间窗口为 [start_ts, end_ts)"""
+    reader = SegmentReader(path)
+    replay_from = None
+    if start_ts is not None and reader.index:
+        pos = bisect.bisect_right(reader.timestamps, start_ts) - 1
+        replay_from = keyframe_ts_before(reader, max(pos, 0))
+
+    book = None
+    for timestamp, flags, payload in reader.iter_raw(replay_from, end_ts):
+        if flags & FLAG_DELTA:
+            if book is None:
+                continue
+            book = apply_delta(book, decode_payload(payload, flags))
+        else:
+            book = decode_payload(payload, flags)
+        if start_ts is None or timestamp >= start_ts:
+            yield timestamp, book
+
+def reconstruct_at(path, timestamp):
+    """返回 timestamp 时刻（含）最新的完整订单簿，没有数据时返回 None"""
+    reader = SegmentReader(path)
+    pos = bisect.bisect_right(reader.timestamps, timestamp) - 1
+    if pos < 0:
+        return None
+    result = None
+    for ts, book in iter_books(path, reader.timestamps[pos], timestamp + 1):
+        result = book
+    return result
+
+def append_book(path, timestamp, book, compress=True):
+    segment_store.get_writer(path, compress, BookDeltaWriter).append(timestamp, book)
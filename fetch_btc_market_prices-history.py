@@ -1,4 +1,7 @@
-import requests
+import http_client
+import market_cache
+import catalog
+from clob_api import CLOB_HOST
 from datetime import datetime, timedelta
 import pytz
 import os
@@ -26,23 +29,19 @@ def get_et_hour_slug():
 
     return slug, date_str, hour_str, et_hour_start
 
-def fetch_clob_token_ids(slug, date_str, hour_str):
-    url = f"https://gamma-api.polymarket.com/markets?slug={slug}"
-    resp = requests.get(url)
-    resp.raise_for_status()
-    data = resp.json()
+def fetch_clob_token_ids(slug, date_str, hour_str, et_hour_start):
+    data = market_cache.get_markets(slug)
 
     dir_path = os.path.join('btc', date_str, hour_str)
-    os.makedirs(dir_path, exist_ok=True)
-    file_path = os.path.join(dir_path, "markets.json")
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=2)
+    markets_path = market_cache.write_markets_json(dir_path, data)
+    catalog.safe_record(catalog.record_market, "btc", date_str, et_hour_start.hour, data,
+                        markets_path=markets_path, history_dir=dir_path)
 
     return data[0]["clobTokenIds"]
 
 def fetch_and_save_price_history(token_id, date_str, hour_str):
-    url = f"https://clob.polymarket.com/prices-history?market={token_id}&interval=1h&fidelity=1"
-    resp = requests.get(url)
+    url = f"{CLOB_HOST}/prices-history?market={token_id}&interval=1h&fidelity=1"
+    resp = http_client.get(url)
     resp.raise_for_status()
     data = resp.json()
 
@@ -59,7 +58,7 @@ def main():
     #print(f"Slug: {slug}")
 
     try:
-        clob_token_ids = fetch_clob_token_ids(slug, date_str, hour_str)
+        clob_token_ids = fetch_clob_token_ids(slug, date_str, hour_str, et_hour_start)
         #print(f"clobTokenIds: {clob_token_ids}")
     except Exception as e:
         print(f"Error fetching clobTokenIds: {e}")
@@ -3,10 +3,26 @@
 # 然后开始执行loop:
 # 遍历token_ids，通过 clob.polymarket.com/midpoint 获取传入 tokenId 的midpoint，并写入对应tokenId.data 的文件
 # sleep 9s，重复上一步
+#
+# 多币种模式：单进程 asyncio 并发采集 symbol_slug_map 中的全部币种
+# 0 * * * * cd /var/www/pm_stats && /usr/bin/python3 fetch_midpoint_loop.py --all > /dev/null 2>&1
+#
+# 采样节奏：--profile "起始分钟:间隔秒,..."，按小时内的分钟选择采样间隔，缺省全程 INTERVAL 秒
+# --profile adaptive 使用 ADAPTIVE_PROFILE：前半小时稀疏采样，临近结算（图中 46/50 分钟辅助线之后）密集采样
+# 请求数受 http_client 中跨进程共享的请求预算约束，预算耗尽时该采样点放弃，不会积压
 import os, json
 import time
-import requests
+import bisect
+import asyncio
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+import clob_api
+import http_client
+import market_cache
+import midpoint_store
+import writer_pool
+import catalog
+import metrics
 from datetime import datetime, timedelta, timezone
 import pytz
 
@@ -17,6 +33,43 @@ symbol_slug_map = {
     "xrp": "xrp"
 }
 
+INTERVAL = 9
+DURATION = 60 * 60
+
+# [(起始分钟, 间隔秒)]
+ADAPTIVE_PROFILE = "0:30,30:9,45:2"
+
+# === 采样节奏 ===
+def parse_profile(spec):
+    """'0:30,30:9,45:2' -> [(0, 30.0), (30, 9.0), (45, 2.0)]"""
+    if spec == "adaptive":
+        spec = ADAPTIVE_PROFILE
+    try:
+        profile = sorted((int(minute), float(seconds)) for minute, seconds in (part.split(":") for part in spec.split(",")))
+    except ValueError:
+        raise ValueError(f"Invalid sampling profile: {spec}")
+    if not profile or profile[0][0] != 0 or profile[-1][0] >= 60 or any(seconds <= 0 for _, seconds in profile):
+        raise ValueError(f"Sampling profile must start at minute 0, stay below 60 and use positive intervals: {spec}")
+    return profile
+
+def interval_at(profile, timestamp):
+    # ET 与 UTC 相差整小时，直接用时间戳取小时内的分钟
+    minute = (timestamp % 3600) / 60
+    interval = profile[0][1]
+    for start_minute, seconds in profile:
+        if minute >= start_minute:
+            interval = seconds
+    return interval
+
+def schedule_offsets(start_wall, duration, profile):
+    """返回相对 start_wall 的全部采样时刻（秒）"""
+    offsets = []
+    offset = 0.0
+    while offset < duration:
+        offsets.append(offset)
+        offset += interval_at(profile, start_wall + offset)
+    return offsets
+
 # === 时间处理 ===
 def get_et_now_rounded_to_hour():
     local_now = datetime.now()
@@ -46,11 +99,10 @@ def format_slug_and_output_dir(symbol, et_time):
 
 # === 网络请求 ===
 def get_token_ids_from_slug(slug):
-    url = f"https://gamma-api.polymarket.com/markets?slug={slug}"
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch market data: {response.status_code}")
-    data = response.json()
+    try:
+        data = market_cache.get_markets(slug)
+    except Exception as e:
+        raise Exception(f"Failed to fetch market data: {e}")
     if not isinstance(data, list) or len(data) == 0:
         raise Exception(f"No market found for slug: {slug}")
     market = data[0]
@@ -62,31 +114,125 @@ def get_token_ids_from_slug(slug):
         raise Exception(f"Invalid clobTokenIds format: {clob_token_ids_str}")
 
 def fetch_midpoint(token_id):
-    url = f"https://clob.polymarket.com/midpoint?token_id={token_id}"
-    response = requests.get(url)
-    if response.status_code != 200:
-        print(f"Warning: Failed to fetch midpoint for {token_id}, status: {response.status_code}")
-        return None
-    data = response.json()
-    return data
+    return clob_api.fetch_midpoint(token_id)
+
+def fetch_midpoints(token_ids):
+    # 一次批量请求取回所有 token 的 midpoint，失败时 clob_api 会退回逐个请求
+    return clob_api.fetch_midpoints(token_ids)
 
 # === 写入文件 ===
-def write_midpoint_to_file(token_id, midpoint, output_dir):
-    timestamp = int(datetime.now(timezone.utc).timestamp())
-    os.makedirs(output_dir, exist_ok=True)
-    file_path = os.path.join(output_dir, f"{token_id}.data")
-    with open(file_path, "a") as f:
-        f.write(f"{timestamp},{midpoint}\n")
+def record_catalog(symbol, et_time, slug, output_dir):
+    # 市场数据此时已在本地缓存中，不会再请求 gamma-api
+    catalog.safe_record(lambda: catalog.record_market(
+        symbol, et_time.strftime("%Y%m%d"), et_time.hour, market_cache.get_markets(slug),
+        midpoint_dir=os.path.normpath(output_dir)))
+
+def write_midpoint_to_file(token_id, midpoint, output_dir, timestamp=None, fmt="text"):
+    # fmt: text 写 {token_id}.data；bin 写定长二进制 {token_id}.bin；both 两者都写
+    # 经 writer_pool 缓冲写入：句柄保持打开，批量落盘
+    if timestamp is None:
+        timestamp = int(datetime.now(timezone.utc).timestamp())
+    if fmt in ("text", "both"):
+        file_path = os.path.join(output_dir, f"{token_id}.data")
+        with metrics.timer("file_write_seconds", kind="midpoint_text"):
+            writer_pool.append(file_path, f"{timestamp},{midpoint}\n", timestamp)
+    if fmt in ("bin", "both"):
+        with metrics.timer("file_write_seconds", kind="midpoint_bin"):
+            writer_pool.append(midpoint_store.bin_path(output_dir, token_id),
+                               midpoint_store.RECORD.pack(int(timestamp), float(midpoint)), timestamp,
+                               record_size=midpoint_store.RECORD.size)
+
+# === asyncio 多币种采集 ===
+async def resolve_targets(loop, executor, et_time):
+    """并发解析所有币种当前小时的 token，返回 [(symbol, token_id, output_dir)]"""
+    async def resolve(symbol):
+        slug, output_dir = format_slug_and_output_dir(symbol, et_time)
+        token_ids = await loop.run_in_executor(executor, get_token_ids_from_slug, slug)
+        print(f"[INFO] {symbol}: slug={slug} token_ids={token_ids}")
+        record_catalog(symbol, et_time, slug, output_dir)
+        return [(symbol, token_id, output_dir) for token_id in token_ids]
+
+    symbols = list(symbol_slug_map.keys())
+    results = await asyncio.gather(*(resolve(s) for s in symbols), return_exceptions=True)
+    targets = []
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            print(f"[ERROR] {symbol}: failed to get token IDs: {result}")
+            continue
+        targets.extend(result)
+    return targets
+
+async def poll_tick(loop, executor, targets, timestamp, fmt="text"):
+    """一个采样点：所有 token 的 midpoint 通过一次批量请求取回，再分发写入各自的文件"""
+    try:
+        mids = await loop.run_in_executor(executor, fetch_midpoints, [token_id for _, token_id, _ in targets])
+    except Exception as e:
+        print(f"[{datetime.now().isoformat()}] midpoints request failed: {e}")
+        return
+    for symbol, token_id, output_dir in targets:
+        if token_id in mids:
+            write_midpoint_to_file(token_id, mids[token_id], output_dir, timestamp, fmt)
+        else:
+            print(f"[{datetime.now().isoformat()}] {symbol} {token_id}: midpoint unavailable")
+
+async def collect_all_symbols(interval=INTERVAL, duration=DURATION, fmt="text", profile=None):
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=http_client.POOL_SIZE)
+
+    et_time = get_et_now_rounded_to_hour()
+    targets = await resolve_targets(loop, executor, et_time)
+    if not targets:
+        print("[ERROR] No token IDs resolved, exiting")
+        return
+
+    # 以单调时钟为基准排程，采样点按 profile 预先算好，
+    # 不受请求耗时影响；上一轮未完成时下一轮照常发出
+    start_mono = time.monotonic()
+    start_wall = datetime.now(timezone.utc).timestamp()
+    offsets = schedule_offsets(start_wall, duration, profile or [(0, interval)])
+    pending = set()
+    tick = 0
+    while tick < len(offsets):
+        delay = start_mono + offsets[tick] - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        timestamp = int(start_wall + offsets[tick])
+        task = asyncio.create_task(poll_tick(loop, executor, targets, timestamp, fmt))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+        # 落后超过一个周期时直接跳到下一个未来的采样点，不补发
+        tick = max(tick + 1, bisect.bisect_left(offsets, time.monotonic() - start_mono))
+
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    executor.shutdown(wait=False)
+    writer_pool.close_all()
 
 # === 主函数 ===
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("symbol", choices=symbol_slug_map.keys(), help="Symbol to track (btc, eth, sol, xrp)")
+    parser.add_argument("symbol", nargs="?", type=str.lower, choices=symbol_slug_map.keys(), help="Symbol to track (btc, eth, sol, xrp)")
+    parser.add_argument("--all", action="store_true", help="Track every symbol concurrently in one asyncio process")
+    parser.add_argument("--format", choices=["text", "bin", "both"], default="text",
+                        help="Midpoint file format: ts,mid text (.data), fixed-width binary (.bin), or both")
+    parser.add_argument("--profile", default=f"0:{INTERVAL}",
+                        help=f"Sampling profile 'minute:seconds,...' (interval from each minute of the hour on), or 'adaptive' for {ADAPTIVE_PROFILE}")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics")
     args = parser.parse_args()
-    symbol = args.symbol.lower()
 
-    INTERVAL = 9
-    DURATION = 60 * 60
+    try:
+        profile = parse_profile(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+    metrics.start(f"midpoint_{'all' if args.all else args.symbol}", args.metrics_port)
+
+    if args.all:
+        asyncio.run(collect_all_symbols(fmt=args.format, profile=profile))
+        return
+    if not args.symbol:
+        parser.error("symbol is required unless --all is given")
+    symbol = args.symbol.lower()
 
     et_time = get_et_now_rounded_to_hour()
     try:
@@ -101,6 +247,7 @@ def main():
     try:
         token_ids = get_token_ids_from_slug(slug)
         print(f"[INFO] Found token IDs: {token_ids}")
+        record_catalog(symbol, et_time, slug, output_dir)
     except Exception as e:
         print(f"[ERROR] Failed to get token IDs: {e}")
         return
@@ -108,15 +255,19 @@ def main():
     end_time = datetime.now(timezone.utc) + timedelta(seconds=DURATION)
 
     while datetime.now(timezone.utc) < end_time:
+        try:
+            mids = fetch_midpoints(token_ids)
+        except Exception as e:
+            print(f"[{datetime.now().isoformat()}] midpoints request failed: {e}")
+            mids = {}
         for token_id in token_ids:
-            midpoint_data = fetch_midpoint(token_id)
-            if midpoint_data and 'mid' in midpoint_data:
-                midpoint = midpoint_data['mid']
-                write_midpoint_to_file(token_id, midpoint, output_dir)
+            if token_id in mids:
+                midpoint = mids[token_id]
+                write_midpoint_to_file(token_id, midpoint, output_dir, fmt=args.format)
                 print(f"[{datetime.now().isoformat()}] {token_id}: midpoint={midpoint}")
             else:
                 print(f"[{datetime.now().isoformat()}] {token_id}: midpoint unavailable")
-        time.sleep(INTERVAL)
+        time.sleep(interval_at(profile, time.time()))
 
 if __name__ == "__main__":
     main()
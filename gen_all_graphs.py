@@ -0,0 +1,68 @@
+# 日终批量出图：一次读取所有币种的数据，再把 (币种 × 6小时分组 × 图表类型) 的绘图任务分发到进程池并行渲染
+# 5 0 * * * cd /var/www/pm_stats && /usr/bin/python3 gen_all_graphs.py > /dev/null 2>&1
+#
+# 数据加载阶段在主进程内串行完成，每个 markets.json / 价格历史文件每次运行只读一次；
+# 绘图阶段每个 worker 进程只导入一次 pyplot，之后复用
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import gen_hourly_price_graph
+import gen_order_vol_graph
+import render_service
+
+CHART_TYPES = ["price", "volume"]
+
+def load_jobs(symbols, date_str, chart_types):
+    jobs = []
+    for symbol in symbols:
+        if "price" in chart_types:
+            try:
+                groups = gen_hourly_price_graph.load_groups(symbol, date_str)
+                jobs.extend(gen_hourly_price_graph.build_render_jobs(symbol, date_str, groups))
+            except FileNotFoundError as e:
+                print(f"[WARN] {e}")
+        if "volume" in chart_types:
+            volume_per_hour = gen_order_vol_graph.load_volume_per_hour(symbol, date_str)
+            if volume_per_hour is not None:
+                jobs.append(gen_order_vol_graph.build_render_job(symbol, date_str, volume_per_hour))
+    return jobs
+
+def init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot
+
+def render_all(jobs, workers):
+    if workers <= 1:
+        init_worker()
+        for kind, job_args in jobs:
+            render_service.render_job(kind, job_args)
+        return
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = {executor.submit(render_service.render_job, kind, job_args): kind for kind, job_args in jobs}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[ERROR] {futures[future]} render failed: {e}")
+    if failed:
+        print(f"[WARN] {failed}/{len(jobs)} render jobs failed")
+
+def main():
+    parser = argparse.ArgumentParser(description="Render every symbol's charts for a day in parallel")
+    parser.add_argument("--date", type=str, help="Date in YYYYMMDD format (ET). Defaults to the same day gen_hourly_price_graph.py would use.")
+    parser.add_argument("--symbols", nargs="+", default=gen_order_vol_graph.symbols, choices=gen_order_vol_graph.symbols)
+    parser.add_argument("--charts", nargs="+", default=CHART_TYPES, choices=CHART_TYPES)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Render processes (1 = render serially)")
+    args = parser.parse_args()
+
+    date_str = args.date or gen_hourly_price_graph.get_default_date_str()
+    jobs = load_jobs(args.symbols, date_str, args.charts)
+    print(f"[INFO] {len(jobs)} render jobs for {date_str}, {args.workers} workers")
+    render_all(jobs, args.workers)
+
+if __name__ == "__main__":
+    main()
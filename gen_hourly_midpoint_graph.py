@@ -1,14 +1,21 @@
 # * * * * * cd /var/www/pm_stats && /usr/bin/python3 gen_hourly_midpoint_graph.py btc > /dev/null 2>&1
+# 常驻模式（替代上面的 cron）：nohup /usr/bin/python3 gen_hourly_midpoint_graph.py btc --watch > /dev/null 2>&1 &
 import os
+import time
+import hashlib
 import datetime
-import matplotlib.pyplot as plt
 import pytz
 import json
-import requests
+import market_cache
+import catalog
+import midpoint_store
 from decimal import Decimal
-from matplotlib.colors import to_hex
+import render_service
 
 def get_distinct_colors(n):
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import to_hex
+
     cmaps = ['tab10', 'Set1', 'Set2', 'Set3', 'Dark2', 'Paired']
     colors = []
     for cmap_name in cmaps:
@@ -29,7 +36,9 @@ def hour_to_label(hour):
     else:
         return f"{hour - 12}pm"
 
-def plot_chart(data_list, start_hour, end_hour, filename, title):
+def new_chart_figure(title):
+    import matplotlib.pyplot as plt
+
     fig, ax_left = plt.subplots(figsize=(15, 8))
     ax_left.set_title(title)
     ax_left.set_xlabel("Minute (0-60)")
@@ -57,6 +66,12 @@ def plot_chart(data_list, start_hour, end_hour, filename, title):
     ax_right.set_ylim(100, 0)
     ax_right.set_yticks(range(0, 101, 5))
     ax_right.set_ylabel("Midpoint (reversed)")
+    return fig, ax_left
+
+def plot_chart(data_list, start_hour, end_hour, filename, title):
+    import matplotlib.pyplot as plt
+
+    fig, ax_left = new_chart_figure(title)
 
     colors = get_distinct_colors(len(data_list))
     for idx, (label, x, y) in enumerate(data_list):
@@ -70,6 +85,60 @@ def plot_chart(data_list, start_hour, end_hour, filename, title):
     plt.close()
     print(f"[DONE] Saved: {filename}")
 
+class LiveChart:
+    """常驻模式下复用的图表：坐标轴、辅助线和右侧反向轴只创建一次，之后每轮只更新折线数据"""
+
+    def __init__(self, title):
+        self.fig, self.ax = new_chart_figure(title)
+        self.fig.tight_layout()
+        self.lines = []
+
+    def update(self, data_list, filename):
+        # data_list 按小时排序，第 idx 条线始终对应同一小时，颜色保持不变
+        colors = get_distinct_colors(len(data_list))
+        for idx, (label, x, y) in enumerate(data_list):
+            if idx < len(self.lines):
+                self.lines[idx].set_data(x, y)
+                self.lines[idx].set_label(label)
+            else:
+                line, = self.ax.plot(x, y, label=label, color=colors[idx], linewidth=2)
+                self.lines.append(line)
+        for line in self.lines[len(data_list):]:
+            line.remove()
+        del self.lines[len(data_list):]
+
+        if data_list:
+            self.ax.legend(loc='upper left', ncol=2, fontsize='small')
+        elif self.ax.get_legend():
+            self.ax.get_legend().remove()
+
+        self.fig.savefig(filename)
+        print(f"[DONE] Saved: {filename} (live)")
+
+    def close(self):
+        import matplotlib.pyplot as plt
+
+        plt.close(self.fig)
+
+def input_fingerprint(entries):
+    """根据分组内每小时选中的 token、图例标签及数据文件的大小/修改时间计算指纹，输入不变则无需重绘"""
+    parts = []
+    for hour, label, token_id, base_dir, start_ts, end_ts in entries:
+        for ext in (".bin", ".data"):
+            try:
+                st = os.stat(os.path.join(base_dir, f"{token_id}{ext}"))
+                parts.append([hour, token_id, label, ext, st.st_size, st.st_mtime_ns])
+            except FileNotFoundError:
+                parts.append([hour, token_id, label, ext, None, None])
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+def load_render_state(state_file):
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
 def fetch_token_info(symbol, hour_et):
     symbol_slug_map = {
         "btc": "bitcoin",
@@ -84,19 +153,17 @@ def fetch_token_info(symbol, hour_et):
     slug = f"{symbol_slug}-up-or-down-{hour_et.strftime('%B').lower()}-{hour_et.day}-{hour_12}{am_pm}-et"
 
     try:
-        url = f"https://gamma-api.polymarket.com/markets?slug={slug}"
-        response = requests.get(url)
-        response.raise_for_status()
-        market = response.json()[0]
+        # 已关闭的市场直接读本地缓存，进行中的市场缓存 PRICE_TTL 秒
+        markets = market_cache.get_markets(slug)
+        market = markets[0]
 
-        # 保存 market.json 文件
+        # 保存 market.json 文件（内容不变时不重写）
         date_str = hour_et.strftime("%Y%m%d")
         hour_str = f"{hour_et.hour % 12 or 12}{'am' if hour_et.hour < 12 else 'pm'}"
         base_dir = os.path.join("midpoint", symbol, date_str, hour_str)
-        os.makedirs(base_dir, exist_ok=True)
-
-        with open(os.path.join(base_dir, "markets.json"), "w") as f:
-            json.dump(response.json(), f, indent=2)
+        markets_path = market_cache.write_markets_json(base_dir, markets)
+        catalog.safe_record(catalog.record_market, symbol, date_str, hour_et.hour, markets,
+                            markets_path=markets_path, midpoint_dir=base_dir)
 
         outcomes = json.loads(market["outcomes"])
         prices = json.loads(market["outcomePrices"])
@@ -109,6 +176,17 @@ def fetch_token_info(symbol, hour_et):
 
 def load_midpoint_data(symbol, date_str, hour_str, token_id, start_ts, end_ts):
     base_dir = os.path.join("midpoint", symbol, date_str, hour_str)
+
+    # 优先读取定长二进制文件：mmap + 二分截取时间窗口，不逐行解析
+    # .bin 比 .data 旧时（转换后文本又有追加）视为过期，改读 .data
+    bin_file = midpoint_store.bin_path(base_dir, token_id)
+    if midpoint_store.bin_is_current(base_dir, token_id):
+        try:
+            timestamps, mids = midpoint_store.load_range(bin_file, start_ts, end_ts)
+            return (timestamps - start_ts) / 60, mids * 100
+        except Exception as e:
+            print(f"[WARN] Error reading {bin_file}: {e}")
+
     file_path = os.path.join(base_dir, f"{token_id}.data")
     if not os.path.exists(file_path):
         return None
@@ -116,21 +194,24 @@ def load_midpoint_data(symbol, date_str, hour_str, token_id, start_ts, end_ts):
     try:
         with open(file_path) as f:
             lines = f.readlines()
-        x_vals, y_vals = [], []
+        points = []
         for line in lines:
             ts_str, price_str = line.strip().split(",")
             ts = int(ts_str)
             price = float(price_str)
             if start_ts <= ts < end_ts:
-                minute = (ts - start_ts) / 60
-                x_vals.append(minute)
-                y_vals.append(price * 100)
+                points.append((ts, price))
+        # --all 模式下可能乱序追加，按时间排序后再画线
+        points.sort(key=lambda p: p[0])
+        x_vals = [(ts - start_ts) / 60 for ts, _ in points]
+        y_vals = [price * 100 for _, price in points]
         return x_vals, y_vals
     except Exception as e:
         print(f"[WARN] Error reading {file_path}: {e}")
         return None
 
-def main(symbol: str):
+def main(symbol: str, live_charts=None):
+    """live_charts 不为空时（--watch 常驻模式）当前小时所在分组复用 LiveChart，只更新折线数据"""
     eastern = pytz.timezone("US/Eastern")
     now_et = datetime.datetime.now(pytz.utc).astimezone(eastern)
     today_et = now_et.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -141,7 +222,8 @@ def main(symbol: str):
 
     date_str = today_et.strftime("%Y%m%d")
 
-    grouped_data = {
+    # 每个分组先收集 (hour, label, token_id, base_dir, start_ts, end_ts)，确认需要重绘后再读数据
+    grouped_inputs = {
         (0, 5): [],
         (6, 11): [],
         (12, 17): [],
@@ -177,7 +259,6 @@ def main(symbol: str):
         if not os.path.exists(base_dir):
             continue
 
-        file_path = os.path.join(base_dir, f"{token_id}.data")
         start_ts = int(hour_dt.timestamp())
 
         # 若是当前小时，只取到当前分钟；否则取整小时
@@ -186,31 +267,77 @@ def main(symbol: str):
         else:
             end_ts = start_ts + 3600
 
-        result = load_midpoint_data(symbol, date_str, hour_str, token_id, start_ts, end_ts)
-        if result is None:
-            continue
-
-        x_vals, y_vals = result
         label = f"{hour_to_label(hour)}_{outcome_label}_{round(float(outcome_price), 3)}"
 
-        for (start_h, end_h), data_list in grouped_data.items():
-            if start_h <= hour <= end_h and len(data_list) < 6:
-                data_list.append((label, x_vals, y_vals))
+        for (start_h, end_h), entries in grouped_inputs.items():
+            if start_h <= hour <= end_h and len(entries) < 6:
+                entries.append((hour, label, token_id, base_dir, start_ts, end_ts))
                 break
 
     output_dir = os.path.join("imgs", symbol, date_str)
     os.makedirs(output_dir, exist_ok=True)
+    state_file = os.path.join(output_dir, f".{symbol}_midpoint_render_state.json")
+    render_state = load_render_state(state_file)
 
-    for (start_h, end_h), data_list in grouped_data.items():
-        if not data_list:
+    live_filename = None
+    for (start_h, end_h), entries in grouped_inputs.items():
+        if not entries:
             continue
         title = f"{date_str} {symbol.upper()} Hourly ET {start_h:02d}-{end_h:02d}(Midpoint Based)"
         filename = os.path.join(output_dir, f"{date_str}-{symbol}-hourly-et-{start_h:02d}-{end_h:02d}_midpoint.png")
-        plot_chart(data_list, start_h, end_h, filename, title)
+        is_live = live_charts is not None and start_h <= current_hour <= end_h
+        if is_live:
+            live_filename = filename
+
+        fingerprint = input_fingerprint(entries)
+        if render_state.get(filename) == fingerprint and os.path.exists(filename):
+            continue
+
+        data_list = []
+        for hour, label, token_id, base_dir, start_ts, end_ts in entries:
+            hour_str = os.path.basename(base_dir)
+            result = load_midpoint_data(symbol, date_str, hour_str, token_id, start_ts, end_ts)
+            if result is None:
+                continue
+            x_vals, y_vals = result
+            data_list.append((label, x_vals, y_vals))
+        if not data_list:
+            continue
+
+        if is_live:
+            if filename not in live_charts:
+                live_charts[filename] = LiveChart(title)
+            live_charts[filename].update(data_list, filename)
+            render_service.record_state([state_file, filename, fingerprint])
+        else:
+            # 指纹在图片实际写出后才记录：交给常驻服务时由服务绘图成功后写入 state_file
+            render_service.render("midpoint_hourly", state=[state_file, filename, fingerprint], data_list=data_list,
+                                  start_hour=start_h, end_hour=end_h, filename=filename, title=title)
+
+    # 已经不再是当前分组（跨组或跨天）的常驻图表释放掉
+    if live_charts is not None:
+        for filename in list(live_charts):
+            if filename != live_filename:
+                live_charts.pop(filename).close()
+
+def watch(symbol, interval=60):
+    # 常驻模式：进程内保留 pyplot 和当前分组的图表，每个周期只更新折线
+    live_charts = {}
+    while True:
+        try:
+            main(symbol, live_charts)
+        except Exception as e:
+            print(f"[ERROR] Render failed: {e}")
+        time.sleep(interval - time.time() % interval)
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Generate midpoint chart")
     parser.add_argument("symbol", choices=["btc", "eth", "xrp", "sol"], help="Symbol name (e.g., btc)")
+    parser.add_argument("--watch", action="store_true", help="Stay running and redraw every --interval seconds, reusing the live group's figure")
+    parser.add_argument("--interval", type=int, default=60, help="Seconds between redraws in --watch mode")
     args = parser.parse_args()
-    main(args.symbol)
+    if args.watch:
+        watch(args.symbol, args.interval)
+    else:
+        main(args.symbol)
@@ -1,13 +1,16 @@
 import os
 import json
 import datetime
-import matplotlib.pyplot as plt
 import pytz
 import argparse
 from decimal import Decimal
-from matplotlib.colors import to_hex
+import render_service
+import catalog
 
 def get_distinct_colors(n):
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import to_hex
+
     cmaps = ['tab10', 'Set1', 'Set2', 'Set3', 'Dark2', 'Paired']
     colors = []
     for cmap_name in cmaps:
@@ -29,6 +32,8 @@ def hour_to_label(hour):
         return f"{hour - 12}pm"
 
 def plot_chart(data_list, start_hour, end_hour, filename, title):
+    import matplotlib.pyplot as plt
+
     fig, ax_left = plt.subplots(figsize=(15, 8))
     ax_left.set_title(title)
     ax_left.set_xlabel("Minute (0-60)")
@@ -64,43 +69,77 @@ def plot_chart(data_list, start_hour, end_hour, filename, title):
     plt.close()
     print(f"[DONE] Saved: {filename}")
 
-def main(symbol: str):
+def get_default_date_str():
     eastern = pytz.timezone("US/Eastern")
     now = datetime.datetime.now(eastern)
     if now.hour == 0:
         now -= datetime.timedelta(days=1)
+    return now.strftime("%Y%m%d")
+
+def add_history(groups, eastern, date_str, hour, y_file):
+    """读取 hour 小时内的价格历史并加入对应的 6 小时分组"""
+    if not os.path.exists(y_file):
+        return
+
+    with open(y_file) as f:
+        history = json.load(f).get("history", [])
+
+    hour_dt = eastern.localize(datetime.datetime.strptime(f"{date_str} {hour}", "%Y%m%d %H"))
+    start_ts = int(hour_dt.timestamp())
+    end_ts = start_ts + 3600
 
-    date_str = now.strftime("%Y%m%d")
+    filtered = [d for d in history if start_ts <= d["t"] < end_ts]
+    if not filtered:
+        return
+
+    x_vals = [(d["t"] - start_ts) / 60 for d in filtered]
+    y_vals = [d["p"] * 100 for d in filtered]
+
+    group_key = (hour // 6) * 6
+    label = hour_to_label(hour)
+    groups[group_key].append((label, x_vals, y_vals))
+
+def load_groups_from_catalog(symbol, date_str, groups):
+    """按目录库中已记录的赢家 token 读取价格历史加入 groups，返回已处理的小时集合（查询失败时为空集）"""
+    try:
+        rows = [row for row in catalog.query_hours(symbol, date_str) if row["history_dir"] and row["winner_token"]]
+    except Exception as e:
+        print(f"[WARN] Catalog query failed, scanning directories: {e}")
+        return set()
+
+    eastern = pytz.timezone("US/Eastern")
+    covered = set()
+    for row in rows:
+        y_file = os.path.join(row["history_dir"], f"{row['winner_token']}.json")
+        if not os.path.exists(y_file):
+            continue
+        try:
+            add_history(groups, eastern, date_str, row["hour"], y_file)
+            covered.add(row["hour"])
+        except Exception as e:
+            print(f"[ERROR] Failed to process {row['hour_label']}: {e}")
+    return covered
+
+def load_groups(symbol, date_str):
+    """读取 {symbol}/{date}/{hour}/ 下的 markets.json 和价格历史，按 6 小时分组返回 {0: [...], 6: [...], ...}
+    目录库中有可用记录的小时直接按记录读取，其余小时扫描目录补齐"""
+    groups = {i: [] for i in range(0, 24, 6)}
+    covered = load_groups_from_catalog(symbol, date_str, groups)
+
+    eastern = pytz.timezone("US/Eastern")
 
     base_dir = os.path.join(os.getcwd(), symbol, date_str)
     if not os.path.isdir(base_dir):
+        if covered:
+            return groups
         raise FileNotFoundError(f"{base_dir} does not exist")
 
-    groups = {i: [] for i in range(0, 24, 6)}
-
     for hour_dir in sorted(os.listdir(base_dir)):
         hour_path = os.path.join(base_dir, hour_dir)
         if not os.path.isdir(hour_path):
             continue
 
         try:
-            with open(os.path.join(hour_path, "markets.json")) as f:
-                market_data = json.load(f)[0]
-
-            prices = json.loads(market_data["outcomePrices"])
-            price_list = [Decimal(x) for x in prices]
-            max_index = price_list.index(max(price_list))
-
-            token_ids = json.loads(market_data["clobTokenIds"])
-            clob_token_id = token_ids[max_index]
-
-            y_file = os.path.join(hour_path, f"{clob_token_id}.json")
-            if not os.path.exists(y_file):
-                continue
-
-            with open(y_file) as f:
-                history = json.load(f).get("history", [])
-
             hour_str = hour_dir.lower().replace("am", "").replace("pm", "")
             hour = int(hour_str)
             is_pm = "pm" in hour_dir.lower()
@@ -108,29 +147,33 @@ def main(symbol: str):
                 hour += 12
             if not is_pm and hour == 12:
                 hour = 0
+            if hour in covered:
+                continue
 
-            hour_dt = eastern.localize(datetime.datetime.strptime(f"{date_str} {hour}", "%Y%m%d %H"))
-            start_ts = int(hour_dt.timestamp())
-            end_ts = start_ts + 3600
+            with open(os.path.join(hour_path, "markets.json")) as f:
+                market_data = json.load(f)[0]
 
-            filtered = [d for d in history if start_ts <= d["t"] < end_ts]
-            if not filtered:
-                continue
+            prices = json.loads(market_data["outcomePrices"])
+            price_list = [Decimal(x) for x in prices]
+            max_index = price_list.index(max(price_list))
 
-            x_vals = [(d["t"] - start_ts) / 60 for d in filtered]
-            y_vals = [d["p"] * 100 for d in filtered]
+            token_ids = json.loads(market_data["clobTokenIds"])
+            clob_token_id = token_ids[max_index]
 
-            group_key = (hour // 6) * 6
-            label = hour_to_label(hour)
-            groups[group_key].append((label, x_vals, y_vals))
+            add_history(groups, eastern, date_str, hour, os.path.join(hour_path, f"{clob_token_id}.json"))
 
         except Exception as e:
             print(f"[ERROR] Failed to process {hour_dir}: {e}")
             continue
 
+    return groups
+
+def build_render_jobs(symbol, date_str, groups):
+    """返回每个非空分组的 ("price_hourly", 绘图参数)"""
     output_dir = os.path.join("imgs", symbol, date_str)
     os.makedirs(output_dir, exist_ok=True)
 
+    jobs = []
     for start_hour in range(0, 24, 6):
         data = groups[start_hour]
         if not data:
@@ -141,7 +184,15 @@ def main(symbol: str):
             output_dir,
             f"{date_str}-{symbol}-hourly-et-{start_hour:02d}-{end_hour:02d}.png"
         )
-        plot_chart(data, start_hour, end_hour, filename, title)
+        jobs.append(("price_hourly", dict(data_list=data, start_hour=start_hour, end_hour=end_hour,
+                                          filename=filename, title=title)))
+    return jobs
+
+def main(symbol: str):
+    date_str = get_default_date_str()
+    groups = load_groups(symbol, date_str)
+    for kind, job_args in build_render_jobs(symbol, date_str, groups):
+        render_service.render(kind, **job_args)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate hourly price chart by coin symbol")
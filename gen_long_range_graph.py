@@ -0,0 +1,89 @@
+# 长周期（多天 / 周 / 月）midpoint 图：按时间范围自动选择精度（原始点或 1m/5m/15m/1h K 线），LTTB 降采样后绘制
+# K 线由 rollup.py / bars.py 预先生成，不再逐个读取 .data 文件
+# python3 gen_long_range_graph.py btc --start 20250901 --end 20250930 [--side 1] [--book]
+# 输出：imgs/{symbol}/long/{start}-{end}-{symbol}-{side}_midpoint.png
+import os
+import time
+import datetime
+import argparse
+import pytz
+import bars
+import render_service
+
+ET = pytz.timezone("US/Eastern")
+SIDE_LABELS = ["Up", "Down"]
+SERIES_COLORS = {"mid": "tab:blue", "ask": "tab:red", "bid": "tab:green"}
+
+def plot_long_range_chart(series_list, filename, title):
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    fig, ax = plt.subplots(figsize=(18, 8))
+    ax.set_title(title)
+    ax.set_ylabel("Price (cents)")
+    ax.set_ylim(0, 100)
+    ax.set_yticks(range(0, 101, 10))
+    ax.grid(True)
+    ax.axhline(y=20, color='black', linestyle='--', linewidth=1)
+    ax.axhline(y=50, color='black', linestyle='--', linewidth=1)
+    ax.axhline(y=80, color='black', linestyle='--', linewidth=1)
+
+    to_dates = lambda timestamps: [datetime.datetime.fromtimestamp(ts, ET) for ts in timestamps]
+    for series in series_list:
+        color = SERIES_COLORS.get(series["kind"], None)
+        if len(series["band_ts"]):
+            # 所选周期内的最低/最高价带
+            ax.fill_between(to_dates(series["band_ts"]), [v * 100 for v in series["low"]],
+                            [v * 100 for v in series["high"]], color=color, alpha=0.15, linewidth=0)
+        ax.plot(to_dates(series["ts"]), [v * 100 for v in series["value"]], label=series["label"],
+                color=color, linewidth=1)
+
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d %H:%M", tz=ET))
+    fig.autofmt_xdate()
+    if series_list:
+        ax.legend(loc='upper left', fontsize='small')
+    fig.tight_layout()
+    plt.savefig(filename)
+    plt.close(fig)
+    print(f"[DONE] Saved: {filename}")
+
+def step_label(step):
+    return "raw" if step == 0 else (f"{step // 3600}h" if step >= 3600 else f"{step // 60}m")
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-day midpoint chart from pre-aggregated minute bars")
+    parser.add_argument("symbol", choices=["btc", "eth", "xrp", "sol"])
+    parser.add_argument("--start", required=True, help="YYYYMMDD (ET)")
+    parser.add_argument("--end", help="YYYYMMDD (ET, inclusive), defaults to --start")
+    parser.add_argument("--side", type=int, choices=[0, 1], default=0, help="0 = Up token, 1 = Down token")
+    parser.add_argument("--book", action="store_true", help="Also draw best ask / best bid")
+    parser.add_argument("--points", type=int, default=bars.DEFAULT_POINTS, help="Points per line after downsampling")
+    args = parser.parse_args()
+
+    end_date = args.end or args.start
+    start_ts = int(ET.localize(datetime.datetime.strptime(args.start, "%Y%m%d")).timestamp())
+    end_ts = int(ET.localize(datetime.datetime.strptime(end_date, "%Y%m%d") + datetime.timedelta(days=1)).timestamp())
+    end_ts = min(end_ts, int(time.time()))
+
+    started = time.time()
+    series_list = []
+    for kind in (["mid", "ask", "bid"] if args.book else ["mid"]):
+        series = bars.load_series(args.symbol, kind, args.side, start_ts, end_ts, args.points)
+        if not len(series["ts"]):
+            print(f"[WARN] No {kind} data for {args.symbol} {args.start}-{end_date}")
+            continue
+        series["kind"] = kind
+        series["label"] = f"{kind} ({step_label(series['step'])})"
+        series_list.append(series)
+    if not series_list:
+        return
+    print(f"[INFO] Loaded {sum(len(s['ts']) for s in series_list)} points in {time.time() - started:.2f}s")
+
+    output_dir = os.path.join("imgs", args.symbol, "long")
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, f"{args.start}-{end_date}-{args.symbol}-{args.side}_midpoint.png")
+    title = f"{args.start}-{end_date} {args.symbol.upper()} {SIDE_LABELS[args.side]} (Midpoint Based)"
+    render_service.render("long_range", series_list=series_list, filename=filename, title=title)
+
+if __name__ == "__main__":
+    main()
@@ -2,83 +2,208 @@ import os
 import json
 import csv
 import argparse
+import numpy as np
 from datetime import datetime
 import pytz
+import segment_store
+import delta_store
 
 def format_time(timestamp_ms):
     """将时间戳（毫秒）格式化为 MM:SS.mmm"""
     dt = datetime.utcfromtimestamp(int(timestamp_ms) / 1000.0)
     return dt.strftime('%M:%S.%f')[:-3]
 
-def process_json_file(filepath):
+DEFAULT_DEPTH = 9
+
+def process_json_file(filepath, depth=DEFAULT_DEPTH):
     with open(filepath, 'r') as f:
         data = json.load(f)
+    return process_book(data, depth)
+
+def process_book(data, depth=DEFAULT_DEPTH):
+    rows = rows_from_arrays(extract_depth_arrays([(int(data.get('timestamp', '0')), data)], depth))
+    if not rows:
+        raise ValueError("invalid order book")
+    return rows[0]
+
+def extract_depth_arrays(books, depth=DEFAULT_DEPTH):
+    """把一批订单簿 [(timestamp_ms, book)] 一次性转成列式 numpy 数组
+    返回 dict：timestamp (N,)、ask_price / ask_size / bid_price / bid_size (N, depth)、spread (N,)、
+    ask_levels / bid_levels (N,) 实际档数；第 0 列为最优价（ask 最低、bid 最高），不足 depth 档的位置补 0"""
+    timestamps = []
+    ask_rows, ask_cols, ask_prices, ask_sizes = [], [], [], []
+    bid_rows, bid_cols, bid_prices, bid_sizes = [], [], [], []
+    has_both = []
+
+    for timestamp, book in books:
+        try:
+            # 接口返回的 asks 价格降序、bids 价格升序，最优价在末尾，倒序截取前 depth 档
+            asks = book.get('asks', [])[:-depth - 1:-1]
+            bids = book.get('bids', [])[:-depth - 1:-1]
+            # 每个快照单独转换，某一档价格/数量无法解析（包括 None）时只丢弃这个快照
+            a_prices = [float(a.get('price', 0)) for a in asks]
+            a_sizes = [float(a.get('size', 0)) for a in asks]
+            b_prices = [float(b.get('price', 0)) for b in bids]
+            b_sizes = [float(b.get('size', 0)) for b in bids]
+            ts = int(book.get('timestamp', timestamp))
+        except Exception as e:
+            print(f"[WARN] Skipping malformed book ts={timestamp}: {e}")
+            continue
 
-    timestamp = data.get('timestamp', '0')
-    time = format_time(timestamp)
-
-    bids = data.get('bids', [])
-    asks = data.get('asks', [])
-
-    asks_reversed = list(reversed(asks))[:9]
-    ask_prices = [float(a.get('price', 0)) for a in asks_reversed]
-    ask_sizes = [float(a.get('size', 0)) for a in asks_reversed]
-    ask_prices += [0] * (9 - len(ask_prices))
-    ask_sizes += [0] * (9 - len(ask_sizes))
-
-    bid_reversed = list(reversed(bids))[:9]
-    bid_prices = [float(a.get('price', 0)) for a in bid_reversed]
-    bid_sizes = [float(a.get('size', 0)) for a in bid_reversed]
-    bid_prices += [0] * (9 - len(bid_prices))
-    bid_sizes += [0] * (9 - len(bid_sizes))
-
-    spread = round(float(asks[-1]['price']) - float(bids[-1]['price']), 2) if asks and bids else 0
-
-    row = [time, spread]
-    for p, s in zip(ask_prices, ask_sizes):
-        row.extend([p, s])
-    for p, s in zip(bid_prices, bid_sizes):
-        row.extend([p, s])
-
-    return row
-
-def process_hour(symbol, base_dir, yymmdd, hour):
+        row = len(timestamps)
+        timestamps.append(ts)
+        has_both.append(bool(asks and bids))
+        ask_rows.extend([row] * len(asks))
+        ask_cols.extend(range(len(asks)))
+        ask_prices.extend(a_prices)
+        ask_sizes.extend(a_sizes)
+        bid_rows.extend([row] * len(bids))
+        bid_cols.extend(range(len(bids)))
+        bid_prices.extend(b_prices)
+        bid_sizes.extend(b_sizes)
+
+    n = len(timestamps)
+    arrays = {'timestamp': np.array(timestamps, dtype=np.int64)}
+    # 各快照已在上面校验并转换为 float，这里一次性填入矩阵
+    for name, rows, cols, values in (
+        ('ask_price', ask_rows, ask_cols, ask_prices),
+        ('ask_size', ask_rows, ask_cols, ask_sizes),
+        ('bid_price', bid_rows, bid_cols, bid_prices),
+        ('bid_size', bid_rows, bid_cols, bid_sizes),
+    ):
+        matrix = np.zeros((n, depth), dtype=np.float64)
+        matrix[rows, cols] = np.array(values, dtype=np.float64)
+        arrays[name] = matrix
+
+    arrays['ask_levels'] = np.bincount(np.array(ask_rows, dtype=np.int64), minlength=n)
+    arrays['bid_levels'] = np.bincount(np.array(bid_rows, dtype=np.int64), minlength=n)
+    # 价差用 Python round（与逐行版本一致）：np.round 对 0.005 这类半分价差的舍入结果不同
+    if depth:
+        best_asks = arrays['ask_price'][:, 0].tolist()
+        best_bids = arrays['bid_price'][:, 0].tolist()
+        spread = [round(a - b, 2) if both else 0.0 for a, b, both in zip(best_asks, best_bids, has_both)]
+    else:
+        spread = [0.0] * n
+    arrays['spread'] = np.array(spread, dtype=np.float64)
+    return arrays
+
+def format_times(timestamps_ms):
+    """批量将毫秒时间戳格式化为 MM:SS.mmm"""
+    minutes = (timestamps_ms // 60000) % 60
+    seconds = (timestamps_ms // 1000) % 60
+    millis = timestamps_ms % 1000
+    return [f"{m:02d}:{s:02d}.{ms:03d}" for m, s, ms in zip(minutes.tolist(), seconds.tolist(), millis.tolist())]
+
+def build_output_fields(depth=DEFAULT_DEPTH):
     output_fields = ['time', 'spread']
-    for i in range(1, 10):
+    for i in range(1, depth + 1):
         output_fields.extend([f'ask{i}_price', f'ask{i}_size'])
-    for i in range(1, 10):
+    for i in range(1, depth + 1):
         output_fields.extend([f'bid{i}_price', f'bid{i}_size'])
+    return output_fields
+
+def rows_from_arrays(arrays):
+    """按 csv 列顺序（time, spread, ask1_price, ask1_size, ..., bid1_price, bid1_size, ...）拼出行"""
+    n, depth = arrays['ask_price'].shape
+    levels = np.empty((n, 4 * depth), dtype=np.float64)
+    levels[:, 0:2 * depth:2] = arrays['ask_price']
+    levels[:, 1:2 * depth:2] = arrays['ask_size']
+    levels[:, 2 * depth::2] = arrays['bid_price']
+    levels[:, 2 * depth + 1::2] = arrays['bid_size']
+    times = format_times(arrays['timestamp'])
+    rows = []
+    for t, spread, values, n_asks, n_bids in zip(times, arrays['spread'].tolist(), levels.tolist(),
+                                                 arrays['ask_levels'].tolist(), arrays['bid_levels'].tolist()):
+        # 缺失的档位和单边盘口的价差写 int 0（csv 中为 "0"），与逐行版本的输出一致
+        if n_asks < depth:
+            values[2 * n_asks:2 * depth] = [0] * (2 * (depth - n_asks))
+        if n_bids < depth:
+            values[2 * depth + 2 * n_bids:] = [0] * (2 * (depth - n_bids))
+        rows.append([t, spread if n_asks and n_bids else 0] + values)
+    return rows
+
+def process_hour(symbol, base_dir, yymmdd, hour, incremental=False, depth=DEFAULT_DEPTH):
+    output_fields = build_output_fields(depth)
 
     for side in ['0', '1']:
         side_name = 'Up' if side == '0' else 'Down'
-        input_dir = os.path.join(base_dir, symbol, yymmdd, 'row_data', hour, side)
-        if not os.path.exists(input_dir):
-            continue
+        output_dir = os.path.join(base_dir, symbol, yymmdd, 'order_book_history')
+        output_file = os.path.join(output_dir, f"{yymmdd}_{hour}_{side_name}_asks_bids_histroy.csv")
+        checkpoint_file = os.path.join(output_dir, f".{yymmdd}_{hour}_{side_name}.checkpoint")
 
-        json_files = sorted(
-            [f for f in os.listdir(input_dir) if f.endswith('.json')],
-            key=lambda x: int(x.replace('.json', ''))
-        )
+        # 增量模式：只处理 checkpoint 之后的快照并追加到 csv 末尾
+        since_ts = None
+        if incremental:
+            since_ts = restore_checkpoint(checkpoint_file, output_file)
 
-        rows = []
-        for filename in json_files:
-            filepath = os.path.join(input_dir, filename)
-            try:
-                row = process_json_file(filepath)
-                rows.append(row)
-            except Exception as e:
-                print(f"Error processing {filepath}: {e}")
+        books = iter_hour_books(base_dir, symbol, yymmdd, hour, side, since_ts)
+        last_ts = books[-1][0] if books else since_ts
+        rows = rows_from_arrays(extract_depth_arrays(books, depth))
 
         if rows:
-            output_dir = os.path.join(base_dir, symbol, yymmdd, 'order_book_history')
             os.makedirs(output_dir, exist_ok=True)
 
-            output_file = os.path.join(output_dir, f"{yymmdd}_{hour}_{side_name}_asks_bids_histroy.csv")
-            with open(output_file, 'w', newline='') as csvfile:
+            append = since_ts is not None and os.path.exists(output_file)
+            with open(output_file, 'a' if append else 'w', newline='') as csvfile:
                 writer = csv.writer(csvfile)
-                writer.writerow(output_fields)
+                if not append:
+                    writer.writerow(output_fields)
                 writer.writerows(rows)
-            print(f"Saved: {output_file}")
+            print(f"Saved: {output_file} (+{len(rows)} rows)" if append else f"Saved: {output_file}")
+
+        if last_ts is not None and last_ts != since_ts and os.path.exists(output_file):
+            save_checkpoint(checkpoint_file, output_file, last_ts)
+
+def restore_checkpoint(checkpoint_file, output_file):
+    """返回上次处理到的快照时间戳；csv 中 checkpoint 之后未提交的行会被截掉，避免中断后重复追加"""
+    try:
+        with open(checkpoint_file) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(output_file) or os.path.getsize(output_file) < checkpoint['csv_size']:
+        return None
+    if os.path.getsize(output_file) > checkpoint['csv_size']:
+        with open(output_file, 'r+b') as f:
+            f.truncate(checkpoint['csv_size'])
+    return checkpoint['last_ts']
+
+def save_checkpoint(checkpoint_file, output_file, last_ts):
+    tmp_file = f"{checkpoint_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({'last_ts': last_ts, 'csv_size': os.path.getsize(output_file)}, f)
+    os.replace(tmp_file, checkpoint_file)
+
+def iter_hour_books(base_dir, symbol, yymmdd, hour, side, since_ts=None):
+    """按时间顺序返回该小时某一 side 的 (timestamp_ms, book)，同时读取分段文件、增量分段文件和 row_data 下的 json 文件
+    since_ts 不为空时只返回时间戳大于 since_ts 的快照，已处理过的文件不再打开"""
+    books = []
+    start_ts = since_ts + 1 if since_ts is not None else None
+
+    seg_path = segment_store.segment_path(base_dir, symbol, yymmdd, hour, side)
+    if os.path.exists(seg_path):
+        books.extend(segment_store.SegmentReader(seg_path).iter_records(start_ts))
+
+    delta_seg_path = delta_store.delta_path(base_dir, symbol, yymmdd, hour, side)
+    if os.path.exists(delta_seg_path):
+        books.extend(delta_store.iter_books(delta_seg_path, start_ts))
+
+    input_dir = os.path.join(base_dir, symbol, yymmdd, 'row_data', hour, side)
+    if os.path.exists(input_dir):
+        for filename in os.listdir(input_dir):
+            if not filename.endswith('.json'):
+                continue
+            if start_ts is not None and int(filename.replace('.json', '')) < start_ts:
+                continue
+            filepath = os.path.join(input_dir, filename)
+            try:
+                with open(filepath, 'r') as f:
+                    books.append((int(filename.replace('.json', '')), json.load(f)))
+            except Exception as e:
+                print(f"Error processing {filepath}: {e}")
+
+    books.sort(key=lambda item: item[0])
+    return books
 
 def get_current_et_hour_info():
     """返回当前ET时区的日期字符串和小时字符串，如 ('20250717', '3pm')"""
@@ -91,6 +216,8 @@ def get_current_et_hour_info():
 def main():
     parser = argparse.ArgumentParser(description='Process current ET hour order book data.')
     parser.add_argument('--symbol', choices=['btc', 'eth', 'sol', 'xrp'], required=True, help='Crypto symbol (e.g. btc, eth)')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help='Number of price levels per side to write')
+    parser.add_argument('--incremental', action='store_true', help='Append only snapshots newer than the last run instead of rewriting the csv')
     args = parser.parse_args()
 
     base_dir = 'price_data'
@@ -98,7 +225,7 @@ def main():
     yymmdd, hour = get_current_et_hour_info()
 
     print(f"Processing symbol={symbol}, date={yymmdd}, hour={hour} (ET)...")
-    process_hour(symbol, base_dir, yymmdd, hour)
+    process_hour(symbol, base_dir, yymmdd, hour, args.incremental, args.depth)
 
 if __name__ == '__main__':
     main()
@@ -4,12 +4,8 @@ import argparse
 from decimal import Decimal
 from datetime import datetime
 import pytz
-import matplotlib.pyplot as plt
-
-# 解析命令行参数
-parser = argparse.ArgumentParser()
-parser.add_argument('--date', type=str, help='Date in YYYYMMDD format (ET timezone). If omitted, use current ET date.')
-args = parser.parse_args()
+import render_service
+import catalog
 
 # 获取 ET 当前日期
 def get_et_date_str():
@@ -17,9 +13,6 @@ def get_et_date_str():
     now_et = datetime.now(et)
     return now_et.strftime('%Y%m%d')
 
-# 日期设定
-date = args.date if args.date else get_et_date_str()
-
 # 币种列表与路径配置
 symbols = ['btc', 'eth', 'sol', 'xrp']
 base_path = "midpoint"
@@ -37,16 +30,29 @@ hour_index = {label: i for i, label in enumerate(hour_labels)}
 def format_k(value):
     return f"{value / 1000:.1f}K"
 
-# 遍历 symbol 绘图
-for symbol in symbols:
-    symbol_path = os.path.join(base_path, symbol, date)
-    if not os.path.isdir(symbol_path):
-        continue
+def load_volume_per_hour(symbol, date, db_path=None):
+    """汇总 symbol 当天每小时的成交量：目录库中有记录的小时直接取值，其余小时扫描日期目录补齐；都没有数据时返回 None"""
+    try:
+        rows = [row for row in catalog.query_hours(symbol, date, db_path=db_path) if row["volume"] is not None]
+    except Exception as e:
+        print(f"[WARN] Catalog query failed, scanning directories: {e}")
+        rows = []
 
     volume_per_hour = [0] * 24
+    covered = set()
+    for row in rows:
+        try:
+            volume_per_hour[row["hour"]] += int(Decimal(row["volume"]))
+            covered.add(row["hour"])
+        except ArithmeticError as e:
+            print(f"[WARN] Bad catalog volume for {row['hour_label']}: {e}")
+
+    symbol_path = os.path.join(base_path, symbol, date)
+    if not os.path.isdir(symbol_path):
+        return volume_per_hour if covered else None
 
     for hour_dir in os.listdir(symbol_path):
-        if hour_dir not in hour_index:
+        if hour_dir not in hour_index or hour_index[hour_dir] in covered:
             continue
 
         markets_path = os.path.join(symbol_path, hour_dir, "markets.json")
@@ -61,6 +67,11 @@ for symbol in symbols:
         except Exception as e:
             print(f"[ERROR] {markets_path}: {e}")
 
+    return volume_per_hour
+
+def plot_volume_chart(symbol, date, volume_per_hour, output_file):
+    import matplotlib.pyplot as plt
+
     # 绘图
     plt.figure(figsize=(12, 6))
     bars = plt.bar(hour_labels, volume_per_hour, color='cornflowerblue')
@@ -80,9 +91,33 @@ for symbol in symbols:
 
     # 保存图片
     plt.tight_layout()
-    output_dir = os.path.join(output_base, symbol, date)
-    os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, f"{date}_hourly_vol.png")
     plt.savefig(output_file)
     plt.close()
     print(f"[DONE] Saved: {output_file}")
+
+def build_render_job(symbol, date, volume_per_hour):
+    output_dir = os.path.join(output_base, symbol, date)
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f"{date}_hourly_vol.png")
+    return "order_volume", dict(symbol=symbol, date=date, volume_per_hour=volume_per_hour, output_file=output_file)
+
+def main():
+    # 解析命令行参数
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--date', type=str, help='Date in YYYYMMDD format (ET timezone). If omitted, use current ET date.')
+    args = parser.parse_args()
+
+    # 日期设定
+    date = args.date if args.date else get_et_date_str()
+
+    # 遍历 symbol 绘图
+    for symbol in symbols:
+        volume_per_hour = load_volume_per_hour(symbol, date)
+        if volume_per_hour is None:
+            continue
+
+        kind, job_args = build_render_job(symbol, date, volume_per_hour)
+        render_service.render(kind, **job_args)
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,23 @@
 #* * * * * cd /var/www/pm_stats && /usr/bin/python3 get_btc_ask1_bid1_price_data.py > /dev/null 2>&1
 # 通过biance、gamma-api.polymarket、clob.polymarket.com 获取当前在进行的market 订单薄的买1、卖1信息，并写入csv
 # 脚本每分钟执行一次，每次执行取三轮买1、卖1信息，每轮间隔10s
-import requests
 import datetime
 import pytz
 import time
 import os
 import csv
-
-BINANCE_KLINE_URL = "https://api.binance.com/api/v3/klines?symbol=BTCUSDT&interval=1h&limit=1"
-BINANCE_TICKER_URL = "https://api.binance.com/api/v3/ticker/price?symbol=BTCUSDT"
-POLYMARKET_MARKET_URL = "https://gamma-api.polymarket.com/markets"
-POLYMARKET_ORDERBOOK_URL = "https://clob.polymarket.com/book"
+import clob_api
+import market_cache
+import binance_prices
 
 ET = pytz.timezone("US/Eastern")
 UTC = pytz.utc
 
 def get_open_price():
-    res = requests.get(BINANCE_KLINE_URL).json()
-    return res[0][1]  # 开盘价
+    return binance_prices.get_open_price("BTC")
 
 def get_current_price():
-    res = requests.get(BINANCE_TICKER_URL).json()
-    return res["price"]
+    return binance_prices.get_current_price("BTC")
 
 def get_et_hour_slug():
     # 本地时间（Asia/Shanghai），换算为 ET 当前小时
@@ -34,25 +29,22 @@ def get_et_hour_slug():
     return slug, et_now
 
 def get_clob_token_ids(slug):
-    url = f"{POLYMARKET_MARKET_URL}?slug={slug}"
-    res = requests.get(url).json()
-    if not res:
-        return []
-    item = res[0]
+    # token 不会变化，命中本地缓存时不请求 gamma-api
     try:
-        return eval(item["clobTokenIds"])  # 原字段是 JSON string
-    except:
+        return market_cache.get_token_ids(slug)
+    except Exception:
         return []
 
-def get_last_ask_bid(token_id):
-    url = f"{POLYMARKET_ORDERBOOK_URL}?token_id={token_id}"
-    res = requests.get(url).json()
-    asks = res.get("asks", [])
-    bids = res.get("bids", [])
-
-    last_ask = asks[-1] if asks else None
-    last_bid = bids[-1] if bids else None
-    return last_ask, last_bid
+def get_last_ask_bids(token_ids):
+    """一次批量请求取回所有 token 的订单簿，返回与 token_ids 同序的 (last_ask, last_bid)"""
+    books = clob_api.fetch_books(token_ids)
+    results = []
+    for token_id in token_ids:
+        res = books.get(token_id, {})
+        asks = res.get("asks", [])
+        bids = res.get("bids", [])
+        results.append((asks[-1] if asks else None, bids[-1] if bids else None))
+    return results
 
 def write_to_csv(et_time, open_price, current_price, up_ask, down_ask, up_bid, down_bid):
     date_str = et_time.strftime('%Y%m%d')
@@ -90,14 +82,13 @@ def main():
     for i in range(3):
         try:
             open_price = get_open_price()
-            current_price = get_current_price()
             slug, et_time = get_et_hour_slug()
             token_ids = get_clob_token_ids(slug)
             if len(token_ids) < 2:
                 print(f"[{i}] Not enough token_ids found")
                 continue
-            up_ask, up_bid = get_last_ask_bid(token_ids[0])
-            down_ask, down_bid = get_last_ask_bid(token_ids[1])
+            (up_ask, up_bid), (down_ask, down_bid) = get_last_ask_bids(token_ids[:2])
+            current_price = get_current_price()
 
             write_to_csv(et_time, open_price, current_price, up_ask, down_ask, up_bid, down_bid)
             print(f"[{i}] Data written for {slug}")
@@ -1,14 +1,33 @@
 #* * * * * cd /var/www/pm_stats && /usr/bin/python3 get_btc_ask1_bid1_price_data.py > /dev/null 2>&1
 # 通过biance、gamma-api.polymarket、clob.polymarket.com 获取当前在进行的market 订单薄的买1、卖1信息，并写入csv
 # 脚本每分钟执行一次，每次执行取四轮买1、卖1信息，每轮间隔10s
-import requests
+#
+# 常驻模式：进程不退出，按固定节拍采样，整点自动切换到新一小时的市场和 csv 文件，收到 SIGTERM 后完成当前轮次再退出
+# nohup /usr/bin/python3 get_currect_market_ask1_bid1_price_data.py btc --daemon --interval 15 > /dev/null 2>&1 &
+#
+# 统一采集：--midpoints 时由同一份订单簿算出 midpoint（(最优买价 + 最优卖价) / 2）写入 midpoint/ 目录，
+# 文件格式与 fetch_midpoint_loop.py 相同，可替代它单独轮询 /midpoint：
+# nohup /usr/bin/python3 get_currect_market_ask1_bid1_price_data.py btc --daemon --interval 9 --midpoints > /dev/null 2>&1 &
 import datetime
 import pytz
 import time
 import os
+import io
 import csv
-import sys
+import math
 import json
+import signal
+import argparse
+import threading
+import clob_api
+import binance_prices
+import market_cache
+import segment_store
+import delta_store
+import writer_pool
+import fetch_midpoint_loop
+import catalog
+import metrics
 
 ET = pytz.timezone("US/Eastern")
 UTC = pytz.utc
@@ -20,16 +39,6 @@ symbol_map = {
     "xrp": "xrp"
 }
 
-def get_open_price(symbol_upper):
-    url = f"https://api.binance.com/api/v3/klines?symbol={symbol_upper}USDT&interval=1h&limit=1"
-    res = requests.get(url).json()
-    return res[0][1]  # 开盘价
-
-def get_current_price(symbol_upper):
-    url = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol_upper}USDT"
-    res = requests.get(url).json()
-    return res["price"]
-
 def get_et_hour_slug(slug_base):
     local_now = datetime.datetime.now(pytz.timezone("Asia/Shanghai"))
     et_now = local_now.astimezone(ET)
@@ -49,45 +58,84 @@ def get_et_hour_slug(slug_base):
 #    return slug, et_now
 
 def get_clob_token_ids(slug):
-    url = f"https://gamma-api.polymarket.com/markets?slug={slug}"
-    res = requests.get(url).json()
-    if not res:
-        return []
-    item = res[0]
+    # token 不会变化，命中本地缓存时不请求 gamma-api
     try:
-        return eval(item["clobTokenIds"])  # 原字段是 JSON string
-    except:
+        return market_cache.get_token_ids(slug)
+    except Exception:
         return []
 
-def get_last_ask_bid(token_id, et_time, symbol, token_id_index):
-    url = f"https://clob.polymarket.com/book?token_id={token_id}"
+def get_last_ask_bid(token_id, et_time, symbol, token_id_index, storage="json"):
     try:
-        res = requests.get(url)
-        res.raise_for_status()
-        data = res.json()
+        data = clob_api.fetch_book(token_id)
     except Exception as e:
         print(f"[Error] token_id={token_id} fetch failed: {e}")
         return None, None
+    return save_book_snapshot(data, token_id, et_time, symbol, token_id_index, storage)
+
+def get_last_ask_bids(token_ids, et_time, symbol, storage="json", midpoint_dir=None, midpoint_format="text"):
+    """一次批量请求取回所有 token 的订单簿，按 token 顺序分发写入各自的 row_data 目录
+    midpoint_dir 不为空时，同时把由最优买卖价算出的 midpoint 写入 midpoint_dir/{token_id}.data，时间戳取订单簿的 timestamp（缺失时取 et_time）"""
+    books = clob_api.fetch_books(token_ids)
+    results = []
+    for token_id_index, token_id in enumerate(token_ids):
+        data = books.get(token_id)
+        if data is None:
+            results.append((None, None))
+            continue
+        last_ask, last_bid = save_book_snapshot(data, token_id, et_time, symbol, token_id_index, storage)
+        results.append((last_ask, last_bid))
+        if midpoint_dir is not None:
+            midpoint = clob_api.book_midpoint(last_ask, last_bid)
+            if midpoint is None:
+                continue
+            try:
+                book_ts = int(data["timestamp"]) // 1000
+            except (KeyError, TypeError, ValueError):
+                book_ts = int(et_time.timestamp())
+            # midpoint 写入失败不影响其余 token 的订单簿写入
+            try:
+                fetch_midpoint_loop.write_midpoint_to_file(token_id, midpoint, midpoint_dir, book_ts, midpoint_format)
+            except Exception as e:
+                print(f"[WARN] token_id={token_id} midpoint write failed: {e}")
+    return results
 
+def save_book_snapshot(data, token_id, et_time, symbol, token_id_index, storage="json"):
     # 确保有 timestamp 字段
     timestamp = data.get("timestamp")
     if not timestamp:
         print(f"[Warning] token_id={token_id} has no timestamp")
         return None, None
 
+    # 服务端生成订单簿到本地收到的延迟
+    metrics.observe("book_lag_seconds", time.time() - int(timestamp) / 1000, metrics.LAG_BUCKETS, symbol=symbol)
+
     # 将 timestamp 转为 ET 时区的 hour（如 2pm）
     ts_dt = datetime.datetime.fromtimestamp(int(timestamp)/1000, pytz.utc).astimezone(ET)
     hour_str = f"{ts_dt.hour}am" if ts_dt.hour < 12 else f"{ts_dt.hour - 12 or 12}pm"
 
-    # 构建文件路径
     date_str = et_time.strftime('%Y%m%d')
+
+    # 分段存储：追加到 symbol/小时/side 对应的分段文件；delta 模式下只写关键帧和逐档增量
+    if storage in ("segment", "delta"):
+        with metrics.timer("file_write_seconds", kind=f"book_{storage}"):
+            if storage == "segment":
+                path = segment_store.segment_path("price_data", symbol, date_str, hour_str, token_id_index)
+                segment_store.append_snapshot(path, int(timestamp), data)
+            else:
+                path = delta_store.delta_path("price_data", symbol, date_str, hour_str, token_id_index)
+                delta_store.append_book(path, int(timestamp), data)
+        asks = data.get("asks", [])
+        bids = data.get("bids", [])
+        return (asks[-1] if asks else None), (bids[-1] if bids else None)
+
+    # 构建文件路径
     dir_path = f"price_data/{symbol}/{date_str}/row_data/{hour_str}/{token_id_index}/"
     os.makedirs(dir_path, exist_ok=True)
     file_path = os.path.join(dir_path, f"{timestamp}.json")
 
     # 写入压缩 JSON 数据
     if data:
-        with open(file_path, 'w') as f:
+        with metrics.timer("file_write_seconds", kind="book_json"), open(file_path, 'w') as f:
             json.dump(data, f, separators=(',', ':'))
     else:
         print(f"[Warning] token_id={token_id} returned empty JSON")
@@ -100,64 +148,125 @@ def get_last_ask_bid(token_id, et_time, symbol, token_id_index):
 
     return last_ask, last_bid
 
+CSV_HEADER = ["time", "open_price", "current_price", "diff", "up_ask_price", "up_ask_size", "down_ask_price", "down_ask_size", "up_bid_price", "up_bid_size", "down_bid_price", "down_bid_size"]
+
+def csv_line(row):
+    buf = io.StringIO()
+    csv.writer(buf).writerow(row)
+    return buf.getvalue()
+
 def write_to_csv(et_time, open_price, current_price, up_ask, down_ask, up_bid, down_bid, symbol):
     date_str = et_time.strftime('%Y%m%d')
     hour_str = et_time.strftime('%-I%p').lower()
     time_str = et_time.strftime('%Y%m%d_%H:%M:%S')
-    dir_path = f"price_data/{symbol}/{date_str}"
-    file_path = f"{dir_path}/{hour_str}.csv"
+    file_path = f"price_data/{symbol}/{date_str}/{hour_str}.csv"
 
-    os.makedirs(dir_path, exist_ok=True)
-    file_exists = os.path.exists(file_path)
-
-    with open(file_path, 'a', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        if not file_exists:
-            writer.writerow(["time", "open_price", "current_price", "diff", "up_ask_price", "up_ask_size", "down_ask_price", "down_ask_size", "up_bid_price", "up_bid_size", "down_bid_price", "down_bid_size"])
-
-        diff = round(float(current_price) - float(open_price), 2)
-        writer.writerow([
-            time_str,
-            round(float(open_price), 2),
-            round(float(current_price), 2),
-            diff,
-            up_ask.get("price") if up_ask else "",
-            up_ask.get("size") if up_ask else "",
-            down_ask.get("price") if down_ask else "",
-            down_ask.get("size") if down_ask else "",
-            up_bid.get("price") if up_bid else "",
-            up_bid.get("size") if up_bid else "",
-            down_bid.get("price") if down_bid else "",
-            down_bid.get("size") if down_bid else ""
-        ])
+    diff = round(float(current_price) - float(open_price), 2)
+    row = [
+        time_str,
+        round(float(open_price), 2),
+        round(float(current_price), 2),
+        diff,
+        up_ask.get("price") if up_ask else "",
+        up_ask.get("size") if up_ask else "",
+        down_ask.get("price") if down_ask else "",
+        down_ask.get("size") if down_ask else "",
+        up_bid.get("price") if up_bid else "",
+        up_bid.get("size") if up_bid else "",
+        down_bid.get("price") if down_bid else "",
+        down_bid.get("size") if down_bid else ""
+    ]
+    # 经 writer_pool 缓冲写入，表头只在文件为空时写一次
+    with metrics.timer("file_write_seconds", kind="csv"):
+        writer_pool.append(file_path, csv_line(row), et_time.timestamp(), header=csv_line(CSV_HEADER))
 
-def main():
-    if len(sys.argv) != 2 or sys.argv[1].lower() not in symbol_map:
-        print("Usage: python script.py [btc|eth|sol|xrp]")
+# 常驻模式下每个 (slug, 存储方式) 只登记一次目录
+cataloged = set()
+
+def record_catalog(symbol, slug, et_time, storage, midpoint_dir=None):
+    if (slug, storage) in cataloged:
         return
+    date_str = et_time.strftime('%Y%m%d')
+    sub = "row_data" if storage == "json" else "segments"
+    book_dir = os.path.join("price_data", symbol, date_str, sub, catalog.hour_to_label(et_time.hour))
+    if midpoint_dir is not None:
+        midpoint_dir = os.path.normpath(midpoint_dir)
+    catalog.safe_record(lambda: catalog.record_market(symbol, date_str, et_time.hour, market_cache.get_markets(slug),
+                                                      book_dir=book_dir, midpoint_dir=midpoint_dir))
+    cataloged.add((slug, storage))
 
-    symbol = sys.argv[1].lower()
+def collect_round(i, symbol, symbol_upper, slug_base, storage="json", midpoints=None):
+    # midpoints 为 text/bin/both 时，同一份订单簿顺带写出 midpoint 文件，不再需要单独运行 fetch_midpoint_loop.py
+    try:
+        # 开盘价每小时只请求一次；当前价格在订单簿之后取，与快照时间对齐，且所有币种共用一次批量请求
+        open_price = binance_prices.get_open_price(symbol_upper)
+        slug, et_time = get_et_hour_slug(slug_base)
+        token_ids = get_clob_token_ids(slug)
+        if len(token_ids) < 2:
+            print(f"[{i}] Not enough token_ids found for {slug}")
+            return
+
+        midpoint_dir = fetch_midpoint_loop.format_slug_and_output_dir(symbol, et_time)[1] if midpoints else None
+        (up_ask, up_bid), (down_ask, down_bid) = get_last_ask_bids(token_ids[:2], et_time, symbol, storage,
+                                                                   midpoint_dir, midpoints)
+        current_price = binance_prices.get_current_price(symbol_upper)
+        record_catalog(symbol, slug, et_time, storage, midpoint_dir)
+
+        write_to_csv(et_time, open_price, current_price, up_ask, down_ask, up_bid, down_bid, symbol)
+        print(f"[{i}] Data written for {slug}")
+    except Exception as e:
+        print(f"[{i}] Error: {e}")
+
+def run_daemon(symbol, symbol_upper, slug_base, interval, storage="json", midpoints=None):
+    # slug、csv 路径、row_data 目录每轮都按当前 ET 时间重新计算，整点后自然切换到新市场
+    stop = threading.Event()
+
+    def handle_signal(signum, frame):
+        print(f"[INFO] Received signal {signum}, shutting down")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    # 以单调时钟为基准排程，采样间隔不受请求耗时影响
+    start = time.monotonic()
+    tick = 0
+    while not stop.is_set():
+        collect_round(tick, symbol, symbol_upper, slug_base, storage, midpoints)
+        # 本轮耗时超过一个周期时跳过错过的节拍，不补采
+        tick = max(tick + 1, math.ceil((time.monotonic() - start) / interval))
+        stop.wait(max(0, start + tick * interval - time.monotonic()))
+    segment_store.close_all()
+    writer_pool.close_all()
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot order books and write ask1/bid1 csv for the current ET hour market")
+    parser.add_argument("symbol", type=str.lower, choices=symbol_map.keys(), help="Symbol to track (btc, eth, sol, xrp)")
+    parser.add_argument("--daemon", action="store_true", help="Keep running and sample on a fixed cadence instead of 4 rounds per cron run")
+    parser.add_argument("--interval", type=float, default=15, help="Seconds between samples in daemon mode")
+    parser.add_argument("--storage", choices=["json", "segment", "delta"], default="json",
+                        help="Raw book storage: one json file per snapshot, append-only segment files, "
+                             "or deduplicated keyframe + delta segments")
+    parser.add_argument("--midpoints", nargs="?", const="text", choices=["text", "bin", "both"],
+                        help="Also write midpoints derived from each book to midpoint/{symbol}/{date}/{hour}/ "
+                             "(same formats as fetch_midpoint_loop.py --format), replacing a separate midpoint poller")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+
+    symbol = args.symbol.lower()
     symbol_upper = symbol.upper()
     slug_base = symbol_map[symbol]
+    metrics.start(f"book_{symbol}", args.metrics_port)
 
-    for i in range(4):
-        try:
-            open_price = get_open_price(symbol_upper)
-            current_price = get_current_price(symbol_upper)
-            slug, et_time = get_et_hour_slug(slug_base)
-            token_ids = get_clob_token_ids(slug)
-            if len(token_ids) < 2:
-                print(f"[{i}] Not enough token_ids found for {slug}")
-                continue
-
-            up_ask, up_bid = get_last_ask_bid(token_ids[0], et_time, symbol, 0)
-            down_ask, down_bid = get_last_ask_bid(token_ids[1], et_time, symbol, 1)
+    if args.daemon:
+        run_daemon(symbol, symbol_upper, slug_base, args.interval, args.storage, args.midpoints)
+        return
 
-            write_to_csv(et_time, open_price, current_price, up_ask, down_ask, up_bid, down_bid, symbol)
-            print(f"[{i}] Data written for {slug}")
-        except Exception as e:
-            print(f"[{i}] Error: {e}")
+    for i in range(4):
+        collect_round(i, symbol, symbol_upper, slug_base, args.storage, args.midpoints)
         time.sleep(10)
+    segment_store.close_all()
+    writer_pool.close_all()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,136 @@
+# 所有脚本共用的 HTTP 客户端
+# - 按 host 复用 requests.Session（keep-alive 连接池），避免每次请求重新握手 TCP+TLS
+# - 默认带连接/读取超时，单个卡住的请求不会拖住整轮采集
+# - 429/5xx 及连接错误按指数退避 + 随机抖动重试，优先遵循 Retry-After
+# - 按 host 限制并发请求数，可选按 host 限制请求速率（令牌桶）
+# - 每次请求先从跨进程共享的请求预算（request_budget）中取令牌
+# - 每次请求的耗时、状态码和错误记入 metrics（按 host + 接口路径）
+import time
+import random
+import threading
+from urllib.parse import urlparse
+import requests
+import request_budget
+import metrics
+
+DEFAULT_TIMEOUT = (3.05, 10)  # (connect, read) 秒
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+POOL_SIZE = 16
+DEFAULT_HOST_CONCURRENCY = 8
+HOST_CONCURRENCY = {
+    "api.binance.com": 4,
+    "gamma-api.polymarket.com": 4,
+    "clob.polymarket.com": 8,
+}
+
+_lock = threading.Lock()
+_sessions = {}
+_semaphores = {}
+_rate_limiters = {}
+
+class RateLimiter:
+    """线程安全的令牌桶：平均每秒 rate 个请求，允许突发 burst 个"""
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def set_rate_limit(host, rate, burst=None):
+    """限制 host 的请求速率（次/秒），rate 为 None 时取消限制；重试也计入速率"""
+    with _lock:
+        if rate is None:
+            _rate_limiters.pop(host, None)
+        else:
+            _rate_limiters[host] = RateLimiter(rate, burst)
+
+def get_session(host):
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+def get_semaphore(host):
+    with _lock:
+        semaphore = _semaphores.get(host)
+        if semaphore is None:
+            limit = HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY)
+            semaphore = threading.BoundedSemaphore(limit)
+            _semaphores[host] = semaphore
+        return semaphore
+
+def backoff_delay(attempt, response=None):
+    # 服务端给了 Retry-After（秒）就按它来，否则 full jitter 指数退避
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def request(method, url, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES, **kwargs):
+    """发送请求并返回 Response；重试用尽后返回最后一次响应，连接类异常、请求预算耗尽（BudgetExhausted）则抛出"""
+    parsed = urlparse(url)
+    host = parsed.netloc
+    labels = {"host": host, "endpoint": parsed.path or "/", "method": method}
+    session = get_session(host)
+    semaphore = get_semaphore(host)
+    rate_limiter = _rate_limiters.get(host)
+
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            request_budget.acquire(host)
+        except request_budget.BudgetExhausted:
+            metrics.inc("http_errors_total", kind="budget", **labels)
+            raise
+        try:
+            with semaphore:
+                # 只计实际请求耗时，不含排队等待信号量的时间
+                start = time.perf_counter()
+                try:
+                    response = session.request(method, url, timeout=timeout, **kwargs)
+                finally:
+                    metrics.observe("http_request_seconds", time.perf_counter() - start, **labels)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            metrics.inc("http_errors_total", kind=type(e).__name__, **labels)
+            if attempt == retries:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        metrics.inc("http_requests_total", status=str(response.status_code), **labels)
+        if response.status_code >= 400:
+            metrics.inc("http_errors_total", kind=f"http_{response.status_code}", **labels)
+        if response.status_code in RETRY_STATUS and attempt < retries:
+            time.sleep(backoff_delay(attempt, response))
+            continue
+        return response
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
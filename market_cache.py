@@ -0,0 +1,82 @@
+# gamma-api 市场元数据的本地缓存，按 slug 存放在 cache/markets/{slug}.json
+# - clobTokenIds 在市场创建后不会再变，只要缓存里有就直接使用，不再请求 gamma-api
+# - outcomePrices / volume 在市场进行中会变化，缓存 PRICE_TTL 秒后重新拉取
+# - 市场 closed 之后数据不再变化，缓存永久有效
+# 多个 cron 进程会同时读写同一份缓存，写入采用临时文件 + os.replace 保证原子性
+import os
+import json
+import time
+import http_client
+from clob_api import GAMMA_HOST
+
+CACHE_DIR = os.environ.get("PM_MARKET_CACHE_DIR", os.path.join("cache", "markets"))
+PRICE_TTL = 60
+
+def cache_path(slug):
+    return os.path.join(CACHE_DIR, f"{slug}.json")
+
+def atomic_write_json(file_path, data, **dump_kwargs):
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, **dump_kwargs)
+    os.replace(tmp_path, file_path)
+
+def load_entry(slug):
+    try:
+        with open(cache_path(slug)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_entry(slug, data):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    atomic_write_json(cache_path(slug), {"fetched_at": time.time(), "data": data})
+
+def is_frozen(entry):
+    return bool(entry["data"]) and entry["data"][0].get("closed") is True
+
+def fetch_markets(slug):
+    response = http_client.get(f"{GAMMA_HOST}/markets?slug={slug}")
+    response.raise_for_status()
+    return response.json()
+
+def get_markets(slug, max_age=PRICE_TTL):
+    """返回 gamma-api /markets?slug= 的原始列表，缓存未过期或市场已关闭时不发请求"""
+    entry = load_entry(slug)
+    if entry and (is_frozen(entry) or time.time() - entry["fetched_at"] < max_age):
+        return entry["data"]
+
+    try:
+        data = fetch_markets(slug)
+    except Exception as e:
+        # 拉取失败时宁可用旧数据，也不让调用方整轮失败
+        if entry:
+            print(f"[WARN] gamma-api failed for {slug}, using cached data: {e}")
+            return entry["data"]
+        raise
+
+    # 市场尚未创建时返回空列表，不缓存
+    if data:
+        save_entry(slug, data)
+    return data
+
+def get_token_ids(slug):
+    """返回 slug 对应的 clobTokenIds 列表；token 不会变化，缓存命中即返回"""
+    entry = load_entry(slug)
+    data = entry["data"] if entry else get_markets(slug)
+    if not data:
+        raise ValueError(f"No market found for slug: {slug}")
+    return json.loads(data[0].get("clobTokenIds", "[]"))
+
+def write_markets_json(dir_path, data):
+    """保存 markets.json，内容没变时不重写文件"""
+    os.makedirs(dir_path, exist_ok=True)
+    file_path = os.path.join(dir_path, "markets.json")
+    try:
+        with open(file_path) as f:
+            if json.load(f) == data:
+                return file_path
+    except (OSError, ValueError):
+        pass
+    atomic_write_json(file_path, data, indent=2)
+    return file_path
@@ -0,0 +1,175 @@
+# 采集脚本的进程内指标：计数器 + 直方图，按标签区分
+# - http_client 记录每个 host/接口 的请求耗时、状态码和错误
+# - 订单簿采集记录服务端 timestamp 到本地收到的延迟
+# - 各写文件函数记录写入耗时
+#
+# 输出方式（采集脚本启动时调用 metrics.start(job)）：
+# - 定期把快照追加到 metrics/{job}.jsonl，超过 MAX_FILE_BYTES 时轮转为 .1、.2 ...，保留 BACKUP_COUNT 个
+# - 指定端口（--metrics-port 或环境变量 PM_METRICS_PORT）时在 127.0.0.1 上提供 Prometheus 文本格式：
+#     curl http://127.0.0.1:9108/metrics
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_DIR = os.environ.get("PM_METRICS_DIR", "metrics")
+FLUSH_INTERVAL = 60
+MAX_FILE_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "http_request_seconds": "HTTP request latency by host and endpoint",
+    "http_requests_total": "HTTP responses by host, endpoint and status code",
+    "http_errors_total": "HTTP requests that raised or returned a non-2xx status",
+    "book_lag_seconds": "Delay between the order book server timestamp and local receipt",
+    "file_write_seconds": "Time spent writing collected data to disk",
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_buckets = {}
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+# === 记录 ===
+def inc(name, amount=1, **labels):
+    key = (name, label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = (name, label_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            _buckets.setdefault(name, tuple(buckets))
+            hist = _histograms[key] = {"counts": [0] * (len(_buckets[name]) + 1), "sum": 0.0, "count": 0}
+        hist["counts"][bisect.bisect_left(_buckets[name], value)] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+class timer:
+    """with metrics.timer("file_write_seconds", kind="csv"): ... 记录代码块耗时"""
+    def __init__(self, name, buckets=LATENCY_BUCKETS, **labels):
+        self.name = name
+        self.buckets = buckets
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start, self.buckets, **self.labels)
+
+# === 导出 ===
+def snapshot():
+    with _lock:
+        return {
+            "ts": time.time(),
+            "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in _counters.items()],
+            "histograms": [
+                {"name": n, "labels": dict(l), "buckets": list(_buckets[n]), "counts": list(h["counts"]),
+                 "sum": h["sum"], "count": h["count"]}
+                for (n, l), h in _histograms.items()
+            ],
+        }
+
+def format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+def render_prometheus():
+    snap = snapshot()
+    lines = []
+    typed = set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for c in sorted(snap["counters"], key=lambda c: c["name"]):
+        header(c["name"], "counter")
+        lines.append(f"{c['name']}{format_labels(c['labels'])} {c['value']}")
+    for h in sorted(snap["histograms"], key=lambda h: h["name"]):
+        header(h["name"], "histogram")
+        cumulative = 0
+        for bound, count in zip(h["buckets"] + ["+Inf"], h["counts"]):
+            cumulative += count
+            lines.append(f"{h['name']}_bucket{format_labels(h['labels'], {'le': bound})} {cumulative}")
+        lines.append(f"{h['name']}_sum{format_labels(h['labels'])} {h['sum']}")
+        lines.append(f"{h['name']}_count{format_labels(h['labels'])} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(port):
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def rotate(path):
+    for i in range(BACKUP_COUNT - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+
+def write_snapshot(job):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{job}.jsonl")
+    if os.path.exists(path) and os.path.getsize(path) >= MAX_FILE_BYTES:
+        rotate(path)
+    entry = snapshot()
+    entry["job"] = job
+    entry["pid"] = os.getpid()
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+def start(job, port=None, flush_interval=FLUSH_INTERVAL):
+    """启动指标输出：后台线程定期写 jsonl 快照，进程退出时再写一次；port 不为空时提供 /metrics"""
+    if port is None and os.environ.get("PM_METRICS_PORT"):
+        port = int(os.environ["PM_METRICS_PORT"])
+    if port:
+        try:
+            start_http_server(port)
+            print(f"[INFO] Metrics endpoint: http://127.0.0.1:{port}/metrics")
+        except OSError as e:
+            print(f"[WARN] Metrics endpoint on port {port} unavailable: {e}")
+
+    def flush_loop():
+        while True:
+            time.sleep(flush_interval)
+            try:
+                write_snapshot(job)
+            except OSError as e:
+                print(f"[WARN] Failed to write metrics: {e}")
+
+    threading.Thread(target=flush_loop, daemon=True).start()
+    atexit.register(lambda: write_snapshot(job))
@@ -0,0 +1,129 @@
+# midpoint 定长二进制存储：每条记录 16 字节（小端 int64 时间戳秒 + float64 midpoint）
+# 与 .data 文本文件放在同一目录：midpoint/{symbol}/{date}/{hour}/{token_id}.bin
+# 读取时 mmap 整个文件得到 numpy 结构化数组，用二分查找截取时间窗口，不解析文本
+# --all 模式下重叠的采样任务可能乱序追加，读取时发现时间戳不递增则先排序再截取
+# .data 比 .bin 新（转换后文本又有追加、或 .bin 写入停止）时 .bin 视为过期，改读 .data
+#
+# 转换已有的 .data 文件：
+#   python3 midpoint_store.py midpoint/btc/20250717
+import os
+import sys
+import struct
+import argparse
+import numpy as np
+
+RECORD = struct.Struct("<qd")
+RECORD_DTYPE = np.dtype([("ts", "<i8"), ("mid", "<f8")])
+
+def bin_path(output_dir, token_id):
+    return os.path.join(output_dir, f"{token_id}.bin")
+
+def append_midpoint(file_path, timestamp, midpoint):
+    # 单次 write 写入完整记录；崩溃留下的不足 16 字节的尾巴在读取时忽略
+    with open(file_path, "ab") as f:
+        f.write(RECORD.pack(int(timestamp), float(midpoint)))
+
+def open_series(file_path):
+    """以只读 mmap 打开文件，返回结构化数组（字段 ts、mid）"""
+    count = os.path.getsize(file_path) // RECORD.size
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(file_path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+
+def bin_is_current(base_dir, token_id):
+    """.bin 存在且不比同名 .data 旧时才可用（writer_pool 先写 .data 再写 .bin，双写时 .bin 的 mtime 不会更早）"""
+    bin_file = bin_path(base_dir, token_id)
+    if not os.path.exists(bin_file):
+        return False
+    data_file = os.path.join(base_dir, f"{token_id}.data")
+    return not os.path.exists(data_file) or os.path.getmtime(bin_file) >= os.path.getmtime(data_file)
+
+def load_range(file_path, start_ts, end_ts):
+    """返回 [start_ts, end_ts) 内的 (timestamps, midpoints)；时间戳有序时为 mmap 上的视图，乱序时为排序后的副本"""
+    series = open_series(file_path)
+    timestamps = series["ts"]
+    if len(timestamps) > 1 and np.any(timestamps[1:] < timestamps[:-1]):
+        series = np.sort(np.array(series), kind="stable", order="ts")
+        timestamps = series["ts"]
+    lo = np.searchsorted(timestamps, start_ts, side="left")
+    hi = np.searchsorted(timestamps, end_ts, side="left")
+    return timestamps[lo:hi], series["mid"][lo:hi]
+
+def load_token_range(base_dir, token_id, start_ts, end_ts):
+    """返回 [start_ts, end_ts) 内的 (timestamps, mids) numpy 数组，.bin 可用时优先读取，否则解析 .data 文本"""
+    if bin_is_current(base_dir, token_id):
+        timestamps, mids = load_range(bin_path(base_dir, token_id), start_ts, end_ts)
+        return np.asarray(timestamps, dtype=np.int64), np.asarray(mids, dtype=np.float64)
+
+    timestamps, mids = [], []
+    try:
+        with open(os.path.join(base_dir, f"{token_id}.data")) as f:
+            for line in f:
+                try:
+                    ts_str, price_str = line.strip().split(",")
+                    ts = int(ts_str)
+                    if start_ts <= ts < end_ts:
+                        timestamps.append(ts)
+                        mids.append(float(price_str))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    order = np.argsort(timestamps, kind="stable")
+    return np.array(timestamps, dtype=np.int64)[order], np.array(mids, dtype=np.float64)[order]
+
+def convert_data_file(src_path, dst_path=None):
+    """把 ts,mid 文本文件转换为二进制文件，返回写入的记录数"""
+    if dst_path is None:
+        dst_path = os.path.splitext(src_path)[0] + ".bin"
+    records = []
+    with open(src_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ts_str, price_str = line.split(",")
+                records.append((int(ts_str), float(price_str)))
+            except ValueError:
+                print(f"[WARN] Skipping malformed line in {src_path}: {line!r}")
+    records.sort(key=lambda r: r[0])
+
+    tmp_path = f"{dst_path}.tmp"
+    np.array(records, dtype=RECORD_DTYPE).tofile(tmp_path)
+    os.replace(tmp_path, dst_path)
+    return len(records)
+
+def convert_tree(root, overwrite=False):
+    converted = 0
+    for dir_path, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not filename.endswith(".data"):
+                continue
+            src_path = os.path.join(dir_path, filename)
+            dst_path = os.path.splitext(src_path)[0] + ".bin"
+            token_id = os.path.splitext(filename)[0]
+            if not overwrite and bin_is_current(dir_path, token_id):
+                continue
+            count = convert_data_file(src_path, dst_path)
+            converted += 1
+            print(f"[DONE] {src_path} -> {dst_path} ({count} records)")
+    return converted
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert midpoint .data text files to fixed-width .bin files")
+    parser.add_argument("paths", nargs="+", help=".data files or directories to convert recursively")
+    parser.add_argument("--overwrite", action="store_true", help="Rebuild .bin files even if they are newer than the .data file")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if os.path.isdir(path):
+            convert_tree(path, args.overwrite)
+        elif path.endswith(".data"):
+            count = convert_data_file(path)
+            print(f"[DONE] {path} ({count} records)")
+        else:
+            print(f"[ERROR] Not a .data file or directory: {path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
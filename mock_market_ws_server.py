@@ -0,0 +1,143 @@
+# 本地替身服务：模拟 clob 市场 WebSocket（/ws/market），用于离线测试 ws_collector.py
+# 用法：
+#   python3 mock_market_ws_server.py --port 8766                         # 合成事件：先推 book 快照，再持续推 price_change
+#   python3 mock_market_ws_server.py --port 8766 --replay events.jsonl   # 回放 ws_collector.py --record 录制的消息
+#   PM_WS_HOST=ws://127.0.0.1:8766 python3 ws_collector.py --symbols btc
+#
+# 回放时按录制中首次出现的顺序把原 asset_id 映射为客户端订阅的 token，事件中的 timestamp 改写为当前时间，
+# 消息间隔按录制时的间隔除以 --speed；--loop 时回放完从头再来
+import json
+import time
+import random
+import asyncio
+import argparse
+import websockets
+
+def now_ms():
+    return str(int(time.time() * 1000))
+
+# === 合成事件 ===
+def make_book_event(token_id, mid, rnd):
+    return {
+        "event_type": "book",
+        "asset_id": token_id,
+        "market": "0xmock",
+        "timestamp": now_ms(),
+        "hash": f"{rnd.getrandbits(64):016x}",
+        "bids": [{"price": f"{mid - 0.01 * i:.2f}", "size": f"{rnd.uniform(5, 500):.2f}"} for i in range(12, 0, -1)],
+        "asks": [{"price": f"{mid + 0.01 * i:.2f}", "size": f"{rnd.uniform(5, 500):.2f}"} for i in range(12, 0, -1)],
+    }
+
+def make_price_change(token_id, mid, rnd):
+    side = rnd.choice(["BUY", "SELL"])
+    offset = 0.01 * rnd.randint(1, 12)
+    price = mid - offset if side == "BUY" else mid + offset
+    size = "0" if rnd.random() < 0.2 else f"{rnd.uniform(5, 500):.2f}"
+    return {
+        "event_type": "price_change",
+        "market": "0xmock",
+        "timestamp": now_ms(),
+        "price_changes": [{"asset_id": token_id, "price": f"{price:.2f}", "size": size, "side": side,
+                           "hash": f"{rnd.getrandbits(64):016x}"}],
+    }
+
+async def synthesize(ws, token_ids, tick):
+    rnd = random.Random()
+    mids = {t: round(rnd.uniform(0.2, 0.8), 2) for t in token_ids}
+    await ws.send(json.dumps([make_book_event(t, mids[t], rnd) for t in token_ids]))
+    while True:
+        await asyncio.sleep(tick)
+        token_id = rnd.choice(token_ids)
+        await ws.send(json.dumps(make_price_change(token_id, mids[token_id], rnd)))
+
+# === 回放 ===
+def load_recording(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def collect_asset_ids(event, found):
+    if event.get("asset_id") and event["asset_id"] not in found:
+        found.append(event["asset_id"])
+    for change in event.get("price_changes", []):
+        if change.get("asset_id") and change["asset_id"] not in found:
+            found.append(change["asset_id"])
+
+def remap(event, mapping):
+    event = dict(event)
+    if "asset_id" in event:
+        event["asset_id"] = mapping.get(event["asset_id"], event["asset_id"])
+    if "price_changes" in event:
+        event["price_changes"] = [dict(c, asset_id=mapping.get(c.get("asset_id"), c.get("asset_id"))) for c in event["price_changes"]]
+    if "timestamp" in event:
+        event["timestamp"] = now_ms()
+    return event
+
+async def replay(ws, token_ids, records, speed, loop_forever):
+    recorded_ids = []
+    parsed = []
+    for record in records:
+        if record["msg"] in ("PING", "PONG"):
+            continue
+        payload = json.loads(record["msg"])
+        events = payload if isinstance(payload, list) else [payload]
+        for event in events:
+            collect_asset_ids(event, recorded_ids)
+        parsed.append((record["t"], events, isinstance(payload, list)))
+    mapping = dict(zip(recorded_ids, token_ids))
+
+    while True:
+        previous = None
+        for t, events, as_list in parsed:
+            if previous is not None:
+                await asyncio.sleep(max(0, (t - previous) / speed))
+            previous = t
+            events = [remap(e, mapping) for e in events]
+            await ws.send(json.dumps(events if as_list else events[0]))
+        if not loop_forever:
+            return
+
+# === 连接处理 ===
+def make_handler(args, records):
+    async def handler(ws):
+        subscription = json.loads(await ws.recv())
+        token_ids = subscription.get("assets_ids", [])
+        print(f"[INFO] Client subscribed to {len(token_ids)} tokens")
+
+        async def pong():
+            async for message in ws:
+                if message == "PING":
+                    await ws.send("PONG")
+
+        pong_task = asyncio.create_task(pong())
+        try:
+            if records is not None:
+                await replay(ws, token_ids, records, args.speed, args.loop)
+                # 回放结束后保持连接，直到客户端断开
+                await pong_task
+            else:
+                await synthesize(ws, token_ids, args.tick)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            pong_task.cancel()
+    return handler
+
+async def serve(args):
+    records = load_recording(args.replay) if args.replay else None
+    async with websockets.serve(make_handler(args, records), args.host, args.port, ping_interval=None):
+        print(f"[INFO] Mock market WebSocket on ws://{args.host}:{args.port}/ws/market")
+        await asyncio.Future()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the CLOB market WebSocket channel")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--replay", help="JSONL recording written by ws_collector.py --record")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier")
+    parser.add_argument("--loop", action="store_true", help="Restart the recording when it ends")
+    parser.add_argument("--tick", type=float, default=0.2, help="Seconds between synthetic price_change events")
+    args = parser.parse_args()
+    asyncio.run(serve(args))
+
+if __name__ == "__main__":
+    main()
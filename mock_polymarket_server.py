@@ -0,0 +1,144 @@
+# 本地替身服务：模拟 gamma-api / clob / binance 的只读接口，用于离线测试批量请求及按 token 分发写文件
+# 用法：
+#   python3 mock_polymarket_server.py --port 8765
+#   export PM_CLOB_HOST=http://127.0.0.1:8765 PM_GAMMA_HOST=http://127.0.0.1:8765 BINANCE_HOST=http://127.0.0.1:8765
+#   python3 fetch_midpoint_loop.py --all
+#   python3 get_currect_market_ask1_bid1_price_data.py btc
+# 加 --fail-batch 时 POST /midpoints、/books 返回 500，用于验证退回逐个请求的逻辑
+# 每个接口的调用次数可通过 GET /stats 查看
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+request_counts = Counter()
+counts_lock = threading.Lock()
+
+def token_ids_for_slug(slug):
+    digest = hashlib.sha256(slug.encode()).hexdigest()
+    return [str(int(digest[:16], 16)), str(int(digest[16:32], 16))]
+
+def token_mid(token_id):
+    # 以 token 和当前 10s 窗口为种子，生成可复现但随时间变化的中间价
+    rnd = random.Random(f"{token_id}:{int(time.time()) // 10}")
+    return round(rnd.uniform(0.05, 0.95), 2)
+
+def make_book(token_id):
+    mid = token_mid(token_id)
+    rnd = random.Random(f"{token_id}:{time.time()}")
+    # asks 价格降序、bids 价格升序，最优价在列表末尾，与线上一致
+    asks = [{"price": f"{min(mid + 0.01 * i, 0.99):.2f}", "size": f"{rnd.uniform(5, 500):.2f}"} for i in range(12, 0, -1)]
+    bids = [{"price": f"{max(mid - 0.01 * i, 0.01):.2f}", "size": f"{rnd.uniform(5, 500):.2f}"} for i in range(12, 0, -1)]
+    book = {
+        "market": "0x" + hashlib.sha256(token_id.encode()).hexdigest()[:64],
+        "asset_id": token_id,
+        "timestamp": str(int(time.time() * 1000)),
+        "bids": bids,
+        "asks": asks,
+        "min_order_size": "5",
+        "tick_size": "0.01",
+    }
+    book["hash"] = hashlib.sha1(json.dumps(book, sort_keys=True).encode()).hexdigest()
+    return book
+
+def make_market(slug):
+    token_ids = token_ids_for_slug(slug)
+    up = token_mid(token_ids[0])
+    return {
+        "slug": slug,
+        "question": slug.replace("-", " "),
+        "outcomes": json.dumps(["Up", "Down"]),
+        "outcomePrices": json.dumps([f"{up:.3f}", f"{1 - up:.3f}"]),
+        "clobTokenIds": json.dumps(token_ids),
+        "volume": f"{random.Random(slug).uniform(2000, 80000):.4f}",
+        "closed": False,
+    }
+
+class Handler(BaseHTTPRequestHandler):
+    fail_batch = False
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def count(self, endpoint):
+        with counts_lock:
+            request_counts[endpoint] += 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        qs = parse_qs(url.query)
+        self.count(f"GET {url.path}")
+
+        if url.path == "/stats":
+            self.send_json(dict(request_counts))
+        elif url.path == "/markets":
+            slug = qs.get("slug", [""])[0]
+            self.send_json([make_market(slug)] if slug else [])
+        elif url.path == "/midpoint":
+            token_id = qs.get("token_id", [""])[0]
+            self.send_json({"mid": str(token_mid(token_id))})
+        elif url.path == "/book":
+            self.send_json(make_book(qs.get("token_id", [""])[0]))
+        elif url.path == "/prices-history":
+            token_id = qs.get("market", [""])[0]
+            end_ts = int(qs.get("endTs", [int(time.time())])[0])
+            start_ts = int(qs.get("startTs", [end_ts - 3600])[0])
+            history = [{"t": t, "p": token_mid(f"{token_id}{t}")} for t in range(start_ts, end_ts, 60)]
+            self.send_json({"history": history})
+        elif url.path == "/api/v3/klines":
+            self.send_json([[int(time.time()) // 3600 * 3600000, "100000.00", "0", "0", "0"]])
+        elif url.path == "/api/v3/ticker/price":
+            if "symbols" in qs:
+                symbols = json.loads(qs["symbols"][0])
+                self.send_json([{"symbol": s, "price": "100010.00"} for s in symbols])
+            else:
+                self.send_json({"symbol": qs.get("symbol", [""])[0], "price": "100010.00"})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        self.count(f"POST {url.path}")
+        length = int(self.headers.get("Content-Length", 0))
+        params = json.loads(self.rfile.read(length) or b"[]")
+        token_ids = [p["token_id"] for p in params]
+
+        if self.fail_batch:
+            self.send_json({"error": "batch disabled"}, 500)
+        elif url.path == "/midpoints":
+            self.send_json({t: str(token_mid(t)) for t in token_ids})
+        elif url.path == "/books":
+            self.send_json([make_book(t) for t in token_ids])
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for gamma-api, clob and binance endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-batch", action="store_true", help="Return 500 for POST /midpoints and /books")
+    args = parser.parse_args()
+
+    Handler.fail_batch = args.fail_batch
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"[INFO] Listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
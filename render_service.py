@@ -0,0 +1,182 @@
+# 常驻绘图服务：进程内常驻 matplotlib（Agg 后端、字体缓存、get_distinct_colors 用到的色板），
+# cron 脚本只把绘图任务（数据序列 + 图表参数）写进 spool 目录，不再每次冷启动导入 pyplot
+#
+# 启动服务（在 /var/www/pm_stats 下）：
+#   nohup /usr/bin/python3 render_service.py > /dev/null 2>&1 &
+# 服务每轮刷新心跳文件；脚本检测到心跳新鲜时提交任务，否则退回本进程内直接绘图
+#
+# spool 目录结构：
+#   spool/render/*.job      待处理任务（先写 .tmp 再 rename，保证服务只会读到完整文件）
+#   spool/render/*.working  服务正在处理的任务
+#   spool/render/*.failed   处理失败的任务，保留以便排查
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import importlib
+import threading
+
+SPOOL_DIR = os.environ.get("PM_RENDER_SPOOL", os.path.join("spool", "render"))
+HEARTBEAT_FILE = "service.heartbeat"
+HEARTBEAT_TTL = 30
+
+# 任务类型 -> (模块, 绘图函数)，在服务进程中按需导入，避免与各脚本循环导入
+RENDERERS = {
+    "midpoint_hourly": ("gen_hourly_midpoint_graph", "plot_chart"),
+    "price_hourly": ("gen_hourly_price_graph", "plot_chart"),
+    "btc_price_hourly": ("gen_btc_hourly_price_graph", "plot_chart"),
+    "order_volume": ("gen_order_vol_graph", "plot_volume_chart"),
+    "long_range": ("gen_long_range_graph", "plot_long_range_chart"),
+}
+
+# 输出文件参数名，提交时转为绝对路径，服务与脚本的工作目录不同也能写到正确位置
+PATH_ARGS = ("filename", "output_file")
+
+def heartbeat_path():
+    return os.path.join(SPOOL_DIR, HEARTBEAT_FILE)
+
+def service_alive():
+    try:
+        return time.time() - os.path.getmtime(heartbeat_path()) < HEARTBEAT_TTL
+    except OSError:
+        return False
+
+def to_jsonable(value):
+    # numpy 数组（如 midpoint_store.load_range 的结果）转成 list
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def record_state(state):
+    """绘图成功后记录状态：state 为 [state_file, key, value]，把 key -> value 合并写入 state_file（JSON 对象）"""
+    state_file, key, value = state
+    try:
+        with open(state_file) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[key] = value
+    tmp_path = f"{state_file}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, state_file)
+
+def submit(kind, state=None, **kwargs):
+    """把绘图任务写入 spool 目录，服务不在线时返回 False；state 见 record_state，由服务在绘图成功后写入"""
+    if kind not in RENDERERS:
+        raise ValueError(f"Unknown render job kind: {kind}")
+    if not service_alive():
+        return False
+
+    for name in PATH_ARGS:
+        if name in kwargs:
+            kwargs[name] = os.path.abspath(kwargs[name])
+    if state is not None:
+        state = [os.path.abspath(state[0])] + list(state[1:])
+    job_name = f"{time.time_ns()}-{os.getpid()}-{kind}"
+    tmp_path = os.path.join(SPOOL_DIR, f"{job_name}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"kind": kind, "args": kwargs, "state": state}, f, default=to_jsonable)
+    os.replace(tmp_path, os.path.join(SPOOL_DIR, f"{job_name}.job"))
+    return True
+
+def render_job(kind, args):
+    module_name, func_name = RENDERERS[kind]
+    func = getattr(importlib.import_module(module_name), func_name)
+    func(**args)
+
+def render(kind, state=None, **kwargs):
+    """优先交给常驻服务绘图，服务不在线时在当前进程内直接绘图；给出 state 时只在图片实际写出后记录"""
+    if submit(kind, state, **kwargs):
+        target = next((kwargs[name] for name in PATH_ARGS if name in kwargs), kind)
+        print(f"[QUEUED] {target}")
+        return
+    render_job(kind, kwargs)
+    if state is not None:
+        record_state(state)
+
+def warm_up():
+    # 预先导入 pyplot 和全部绘图模块，并画一张空图加载字体缓存
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    for module_name, _ in RENDERERS.values():
+        module = importlib.import_module(module_name)
+        if hasattr(module, "get_distinct_colors"):
+            module.get_distinct_colors(64)
+    fig = plt.figure()
+    fig.text(0.5, 0.5, "warm up")
+    fig.canvas.draw()
+    plt.close(fig)
+
+def process_pending():
+    processed = 0
+    for name in sorted(os.listdir(SPOOL_DIR)):
+        if not name.endswith(".job"):
+            continue
+        job_path = os.path.join(SPOOL_DIR, name)
+        working_path = job_path[:-len(".job")] + ".working"
+        try:
+            os.replace(job_path, working_path)
+        except FileNotFoundError:
+            continue
+
+        try:
+            with open(working_path) as f:
+                job = json.load(f)
+            render_job(job["kind"], job["args"])
+            if job.get("state"):
+                record_state(job["state"])
+            os.remove(working_path)
+        except Exception as e:
+            print(f"[ERROR] Render job {name} failed: {e}")
+            os.replace(working_path, working_path[:-len(".working")] + ".failed")
+        processed += 1
+    return processed
+
+def touch_heartbeat():
+    with open(heartbeat_path(), "a"):
+        pass
+    os.utime(heartbeat_path())
+
+def serve(poll_interval=0.2):
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    warm_up()
+
+    stop = threading.Event()
+
+    def handle_signal(signum, frame):
+        print(f"[INFO] Received signal {signum}, shutting down")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    # 上次异常退出时遗留的 .working 任务重新排队
+    for name in os.listdir(SPOOL_DIR):
+        if name.endswith(".working"):
+            working_path = os.path.join(SPOOL_DIR, name)
+            os.replace(working_path, working_path[:-len(".working")] + ".job")
+
+    print(f"[INFO] Render service watching {os.path.abspath(SPOOL_DIR)}")
+    while not stop.is_set():
+        touch_heartbeat()
+        if not process_pending():
+            stop.wait(poll_interval)
+
+    try:
+        os.remove(heartbeat_path())
+    except OSError:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived chart render service fed through a spool directory")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="Seconds between spool scans when idle")
+    args = parser.parse_args()
+    serve(args.poll_interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# 跨进程共享的请求预算（令牌桶），所有采集脚本对同一 host 的请求共用一个桶
+# 状态保存在 cache/request_budget/{host}.json，读写时 flock 加排它锁，多个 cron / 常驻进程之间互相可见
+# http_client 每次发请求（包括重试）前调用 acquire(host)；等待超过 MAX_WAIT 秒仍拿不到令牌时抛 BudgetExhausted，
+# 调用方放弃这次请求，避免请求在线程池里越积越多
+#
+# 每个 host 的速率（次/秒）和突发量见 BUDGETS；环境变量 PM_REQUEST_BUDGET="rate" 或 "rate/burst" 对所有 host 生效
+# 查看各桶当前剩余令牌：python3 request_budget.py
+import os
+import json
+import time
+import fcntl
+
+BUDGET_DIR = os.environ.get("PM_REQUEST_BUDGET_DIR", os.path.join("cache", "request_budget"))
+MAX_WAIT = 5.0
+
+# host -> (每秒令牌数, 桶容量)
+BUDGETS = {
+    "clob.polymarket.com": (50, 100),
+    "gamma-api.polymarket.com": (10, 20),
+    "api.binance.com": (20, 40),
+}
+
+class BudgetExhausted(Exception):
+    pass
+
+def budget_for(host):
+    override = os.environ.get("PM_REQUEST_BUDGET")
+    if override:
+        rate, _, burst = override.partition("/")
+        return float(rate), float(burst or rate)
+    return BUDGETS.get(host)
+
+def state_path(host):
+    return os.path.join(BUDGET_DIR, host.replace(":", "_") + ".json")
+
+def take(host, cost, rate, burst):
+    """在文件锁内补充并尝试扣减令牌，返回还需等待的秒数（0 表示已扣减）"""
+    os.makedirs(BUDGET_DIR, exist_ok=True)
+    with open(state_path(host), "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        try:
+            state = json.loads(f.read())
+        except ValueError:
+            state = {"tokens": burst, "updated": time.time()}
+
+        now = time.time()
+        tokens = min(burst, state["tokens"] + max(0.0, now - state["updated"]) * rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps({"tokens": tokens, "updated": now}))
+        return wait
+
+def acquire(host, cost=1, max_wait=MAX_WAIT):
+    budget = budget_for(host)
+    if budget is None:
+        return
+    rate, burst = budget
+    deadline = time.monotonic() + max_wait
+    while True:
+        wait = take(host, cost, rate, burst)
+        if wait == 0:
+            return
+        if time.monotonic() + wait > deadline:
+            raise BudgetExhausted(f"Request budget for {host} exhausted ({rate:g}/s, burst {burst:g})")
+        time.sleep(wait)
+
+def main():
+    if not os.path.isdir(BUDGET_DIR):
+        print("[INFO] No request budget state yet")
+        return
+    for filename in sorted(os.listdir(BUDGET_DIR)):
+        with open(os.path.join(BUDGET_DIR, filename)) as f:
+            state = json.load(f)
+        print(f"{filename[:-len('.json')]}: {state['tokens']:.1f} tokens, updated {time.time() - state['updated']:.1f}s ago")
+
+if __name__ == "__main__":
+    main()
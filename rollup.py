@@ -0,0 +1,340 @@
+# 每小时汇总（rollup）：市场结算后把一小时的 midpoint / 买卖价数据压缩成每个 token 一行，存入 catalog 数据库的 rollups 表
+# 跨月份的统计直接查这张表，不再逐个读取 .data / .bin / csv / markets.json
+#
+# cron：每小时第 5 分钟汇总最近已结束的小时（已汇总且已有结算结果的小时跳过）
+# 5 * * * * cd /var/www/pm_stats && /usr/bin/python3 rollup.py run > /dev/null 2>&1
+# 汇总的同时生成该小时的 1 分钟 K 线（bars.py）
+# 补算历史：python3 rollup.py run --start 20250901 --end 20251130
+# 查询示例：
+#   python3 rollup.py leading btc --start 20250901 --end 20251130 --minute 46 --above 80   # 第 46 分钟领先一侧 >= 80¢ 的频率及胜率
+#   python3 rollup.py crossings btc --start 20250901 --end 20251130 --threshold 50         # 首次穿越 50¢ 的时间分布
+#   python3 rollup.py show btc --start 20251001
+#
+# 表结构（rollups），主键 (symbol, date, hour, side)，side 为 token 在 clobTokenIds 中的下标（0=Up，1=Down）：
+#   samples：midpoint 采样点数；open_mid / close_mid / min_mid / max_mid：小时内第一个、最后一个、最低、最高 midpoint
+#   mid_m46 / mid_m50 / mid_m52 / mid_m58：图中竖线对应分钟时刻（含）之前的最后一个 midpoint
+#   cross_20 / cross_50 / cross_80：midpoint 首次穿越阈值的时间，距整点的秒数，未穿越为 NULL；
+#     起始一侧取小时内第一个严格偏离阈值的采样点（恰好等于阈值的点不算任何一侧），
+#     穿越指之后第一个严格落在另一侧的采样点，只在阈值上停留不算穿越
+#   spread_twa：csv 中买1/卖1 价差按时间加权的平均值；won：结算后该 token 是否获胜；volume：gamma-api 成交量
+# midpoint 均为 0-1 的价格（与 .data 文件一致）
+import os
+import csv
+import json
+import time
+import argparse
+import datetime
+import numpy as np
+import pytz
+import catalog
+import market_cache
+import midpoint_store
+import fetch_midpoint_loop
+import bars
+
+ET = pytz.timezone("US/Eastern")
+MARK_MINUTES = (46, 50, 52, 58)
+THRESHOLDS = (20, 50, 80)
+CROSS_EPSILON = 1e-9
+RECHECK_HOURS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    side INTEGER NOT NULL,
+    token_id TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    open_mid REAL,
+    close_mid REAL,
+    min_mid REAL,
+    max_mid REAL,
+    %s,
+    %s,
+    spread_twa REAL,
+    won INTEGER,
+    volume REAL,
+    computed_at REAL NOT NULL,
+    PRIMARY KEY (symbol, date, hour, side)
+);
+CREATE INDEX IF NOT EXISTS rollups_symbol_date ON rollups (symbol, date, hour);
+""" % (
+    ",\n    ".join(f"mid_m{m} REAL" for m in MARK_MINUTES),
+    ",\n    ".join(f"cross_{t} INTEGER" for t in THRESHOLDS),
+)
+
+_initialized = set()
+
+def connect(db_path=None):
+    conn = catalog.connect(db_path)
+    if id(conn) not in _initialized:
+        conn.executescript(SCHEMA)
+        _initialized.add(id(conn))
+    return conn
+
+def hour_start_ts(date_str, hour):
+    day = datetime.datetime.strptime(date_str, "%Y%m%d")
+    return int(ET.localize(day.replace(hour=hour)).timestamp())
+
+# === 读取原始数据 ===
+def load_spreads(symbol, date_str, hour, start_ts, end_ts):
+    """读取小时 csv，返回 (timestamps, [up 价差, down 价差])；买1 或卖1 缺失的行价差为 nan"""
+    file_path = os.path.join("price_data", symbol, date_str, f"{catalog.hour_to_label(hour)}.csv")
+    timestamps, spreads = [], []
+    try:
+        with open(file_path, newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    et_time = ET.localize(datetime.datetime.strptime(row["time"], "%Y%m%d_%H:%M:%S"))
+                except (KeyError, ValueError):
+                    continue
+                ts = int(et_time.timestamp())
+                if not start_ts <= ts < end_ts:
+                    continue
+                pair = []
+                for side in ("up", "down"):
+                    try:
+                        pair.append(float(row[f"{side}_ask_price"]) - float(row[f"{side}_bid_price"]))
+                    except (KeyError, ValueError):
+                        pair.append(np.nan)
+                timestamps.append(ts)
+                spreads.append(pair)
+    except FileNotFoundError:
+        pass
+    if not timestamps:
+        return None, None
+    order = np.argsort(timestamps, kind="stable")
+    return np.array(timestamps, dtype=np.int64)[order], np.array(spreads, dtype=np.float64)[order]
+
+# === 计算 ===
+def mid_at(timestamps, mids, ts):
+    pos = np.searchsorted(timestamps, ts, side="right")
+    return float(mids[pos - 1]) if pos else None
+
+def first_crossing(timestamps, mids, start_ts, threshold):
+    # 定义见文件头 cross_* 的说明；CROSS_EPSILON 内视为恰好在阈值上（避免 0.1 + 0.4 之类的浮点误差）
+    level = threshold / 100
+    off = np.nonzero(np.abs(mids - level) > CROSS_EPSILON)[0]
+    if not len(off):
+        return None
+    if mids[off[0]] < level:
+        hits = np.nonzero(mids > level + CROSS_EPSILON)[0]
+    else:
+        hits = np.nonzero(mids < level - CROSS_EPSILON)[0]
+    return int(timestamps[hits[0]] - start_ts) if len(hits) else None
+
+def time_weighted(timestamps, values, end_ts):
+    # 每个值一直持续到下一行（最后一行持续到整点结束），跳过 nan
+    durations = np.diff(np.append(timestamps, end_ts)).astype(np.float64)
+    valid = ~np.isnan(values) & (durations > 0)
+    if not valid.any():
+        return None
+    return float(np.average(values[valid], weights=durations[valid]))
+
+def summarize(timestamps, mids, start_ts):
+    if len(mids) == 0:
+        return {"samples": 0}
+    row = {
+        "samples": int(len(mids)),
+        "open_mid": float(mids[0]),
+        "close_mid": float(mids[-1]),
+        "min_mid": float(mids.min()),
+        "max_mid": float(mids.max()),
+    }
+    for minute in MARK_MINUTES:
+        row[f"mid_m{minute}"] = mid_at(timestamps, mids, start_ts + minute * 60)
+    for threshold in THRESHOLDS:
+        row[f"cross_{threshold}"] = first_crossing(timestamps, mids, start_ts, threshold)
+    return row
+
+def resolve_market(symbol, date_str, hour, db_path=None):
+    """返回 catalog 中该小时的行；没有记录或记录时市场尚未结算时，从 gamma-api（经本地缓存）刷新"""
+    rows = [r for r in catalog.query_hours(symbol, date_str, db_path=db_path) if r["hour"] == hour]
+    row = rows[0] if rows else None
+    if row is None or not row["closed"] or not row["token_ids"]:
+        et_time = ET.localize(datetime.datetime.strptime(date_str, "%Y%m%d").replace(hour=hour))
+        slug, _ = fetch_midpoint_loop.format_slug_and_output_dir(symbol, et_time)
+        try:
+            markets = market_cache.get_markets(slug)
+        except Exception as e:
+            print(f"[WARN] {symbol} {date_str} {hour}: market lookup failed: {e}")
+            markets = None
+        if markets:
+            catalog.record_market(symbol, date_str, hour, markets, db_path)
+            rows = [r for r in catalog.query_hours(symbol, date_str, db_path=db_path) if r["hour"] == hour]
+            row = rows[0] if rows else None
+    return row
+
+def rollup_hour(symbol, date_str, hour, db_path=None):
+    """汇总一个小时，写入 rollups 表，返回写入的行数"""
+    market = resolve_market(symbol, date_str, hour, db_path)
+    if market is None or not market["token_ids"]:
+        print(f"[WARN] {symbol} {date_str} {catalog.hour_to_label(hour)}: no market found, skipped")
+        return 0
+
+    token_ids = json.loads(market["token_ids"])
+    start_ts = hour_start_ts(date_str, hour)
+    end_ts = start_ts + 3600
+    midpoint_dir = market["midpoint_dir"] or os.path.join("midpoint", symbol, date_str, catalog.hour_to_label(hour))
+    spread_ts, spreads = load_spreads(symbol, date_str, hour, start_ts, end_ts)
+    volume = float(market["volume"]) if market["volume"] else None
+
+    records = []
+    for side, token_id in enumerate(token_ids):
+        timestamps, mids = midpoint_store.load_token_range(midpoint_dir, token_id, start_ts, end_ts)
+        row = summarize(timestamps, mids, start_ts)
+        if row["samples"] == 0 and spread_ts is None:
+            continue
+        row.update({
+            "symbol": symbol, "date": date_str, "hour": hour, "side": side, "token_id": token_id,
+            "spread_twa": time_weighted(spread_ts, spreads[:, side], end_ts) if spread_ts is not None and side < 2 else None,
+            "won": int(market["winner_index"] == side) if market["closed"] and market["winner_index"] is not None else None,
+            "volume": volume,
+            "computed_at": time.time(),
+        })
+        records.append(row)
+
+    if not records:
+        print(f"[WARN] {symbol} {date_str} {catalog.hour_to_label(hour)}: no midpoint or csv data, skipped")
+        return 0
+
+    conn = connect(db_path)
+    with conn:
+        for row in records:
+            columns = list(row)
+            conn.execute(
+                f"INSERT OR REPLACE INTO rollups ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [row[c] for c in columns],
+            )
+    # 同一小时的 1 分钟 K 线一并生成，供长周期图表使用
+    bars.build_hour(symbol, date_str, hour, token_ids, midpoint_dir, db_path)
+    return len(records)
+
+def closed_hours(start_date, end_date, now=None):
+    """[start_date, end_date] 内已经结束的 (date, hour)"""
+    now = now or time.time()
+    day = datetime.datetime.strptime(start_date, "%Y%m%d")
+    last = datetime.datetime.strptime(end_date, "%Y%m%d")
+    while day <= last:
+        date_str = day.strftime("%Y%m%d")
+        for hour in range(24):
+            if hour_start_ts(date_str, hour) + 3600 <= now:
+                yield date_str, hour
+        day += datetime.timedelta(days=1)
+
+def done_hours(symbol, start_date, end_date, db_path=None):
+    conn = connect(db_path)
+    return {(r["date"], r["hour"]) for r in conn.execute(
+        "SELECT DISTINCT date, hour FROM rollups WHERE symbol = ? AND date BETWEEN ? AND ? AND won IS NOT NULL",
+        (symbol, start_date, end_date))}
+
+def run(symbols, start_date=None, end_date=None, force=False, db_path=None):
+    if start_date is None:
+        # 缺省：最近 RECHECK_HOURS 个已结束的小时，整点后尚未结算的小时在之后的运行中补上结果
+        # 在 UTC 上减小时再转回 ET：直接对带时区的 ET 时间做减法不会切换 EST/EDT，夏令时切换日会算错日期/小时
+        now = datetime.datetime.now(pytz.utc)
+        hours = []
+        for back in range(RECHECK_HOURS, 0, -1):
+            et_time = (now - datetime.timedelta(hours=back)).astimezone(ET)
+            key = (et_time.strftime("%Y%m%d"), et_time.hour)
+            # 冬令时切换当天 1 点出现两次，对应同一个 (date, hour)
+            if key not in hours:
+                hours.append(key)
+    else:
+        hours = list(closed_hours(start_date, end_date or start_date))
+
+    count = 0
+    for symbol in symbols:
+        skip = set() if force or not hours else done_hours(symbol, hours[0][0], hours[-1][0], db_path)
+        for date_str, hour in hours:
+            if (date_str, hour) not in skip:
+                count += rollup_hour(symbol, date_str, hour, db_path)
+    return count
+
+# === 查询 ===
+def query_rows(symbol, start_date, end_date=None, db_path=None):
+    conn = connect(db_path)
+    return conn.execute(
+        "SELECT * FROM rollups WHERE symbol = ? AND date BETWEEN ? AND ? ORDER BY date, hour, side",
+        (symbol, start_date, end_date or start_date),
+    ).fetchall()
+
+def leading_stats(symbol, start_date, end_date, minute, above, db_path=None):
+    """第 minute 分钟时 midpoint 较高的一侧 >= above¢ 的小时数，以及这些小时里该侧最终获胜的次数"""
+    column = f"mid_m{minute}"
+    conn = connect(db_path)
+    row = conn.execute(
+        f"""
+        WITH leading AS (
+            SELECT date, hour, MAX({column}) AS mid, won
+            FROM rollups WHERE symbol = ? AND date BETWEEN ? AND ? AND {column} IS NOT NULL
+            GROUP BY date, hour
+        )
+        SELECT COUNT(*) AS hours,
+               SUM(mid >= ?) AS above,
+               SUM(CASE WHEN mid >= ? THEN won END) AS won,
+               SUM(CASE WHEN mid >= ? AND won IS NOT NULL THEN 1 END) AS settled
+        FROM leading
+        """,
+        (symbol, start_date, end_date, above / 100, above / 100, above / 100),
+    ).fetchone()
+    return dict(row)
+
+def crossing_stats(symbol, start_date, end_date, threshold, db_path=None):
+    """Up 一侧（side 0）首次穿越 threshold¢ 的小时数及穿越时间（分钟）分布"""
+    column = f"cross_{threshold}"
+    conn = connect(db_path)
+    rows = conn.execute(
+        f"SELECT {column} AS cross FROM rollups WHERE symbol = ? AND date BETWEEN ? AND ? AND side = 0",
+        (symbol, start_date, end_date),
+    ).fetchall()
+    crossed = np.array([r["cross"] for r in rows if r["cross"] is not None], dtype=np.float64) / 60
+    result = {"hours": len(rows), "crossed": int(len(crossed))}
+    if len(crossed):
+        p25, p50, p75 = np.percentile(crossed, [25, 50, 75])
+        result.update({"p25_minute": round(p25, 1), "median_minute": round(p50, 1), "p75_minute": round(p75, 1)})
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-hour midpoint/spread rollups stored in the catalog database")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Compute rollups for closed hours (default: the last few closed hours)")
+    p_run.add_argument("--symbols", nargs="+", default=catalog.SYMBOLS, choices=catalog.SYMBOLS)
+    p_run.add_argument("--start", help="YYYYMMDD (ET)")
+    p_run.add_argument("--end", help="YYYYMMDD (ET), defaults to --start")
+    p_run.add_argument("--force", action="store_true", help="Recompute hours that already have rollups")
+
+    for name, help_text in (("show", "Print rollup rows"),
+                            ("leading", "How often the leading side was above a price at a given minute, and its win rate"),
+                            ("crossings", "Distribution of first threshold-crossing times for the Up side")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("symbol", choices=catalog.SYMBOLS)
+        p.add_argument("--start", required=True, help="YYYYMMDD (ET)")
+        p.add_argument("--end", help="YYYYMMDD (ET), defaults to --start")
+        if name == "leading":
+            p.add_argument("--minute", type=int, choices=MARK_MINUTES, default=46)
+            p.add_argument("--above", type=float, default=80, help="Price in cents")
+        elif name == "crossings":
+            p.add_argument("--threshold", type=int, choices=THRESHOLDS, default=50)
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.command == "run":
+        count = run(args.symbols, args.start, args.end, args.force)
+        print(f"[DONE] Wrote {count} rollup rows in {time.time() - start:.2f}s: {catalog.CATALOG_DB}")
+        return
+
+    end_date = args.end or args.start
+    if args.command == "show":
+        for row in query_rows(args.symbol, args.start, end_date):
+            print(json.dumps(dict(row)))
+    elif args.command == "leading":
+        print(json.dumps(leading_stats(args.symbol, args.start, end_date, args.minute, args.above)))
+    else:
+        print(json.dumps(crossing_stats(args.symbol, args.start, end_date, args.threshold)))
+    print(f"[INFO] Query took {(time.time() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# 订单簿原始快照的追加写分段存储，替代每个快照一个 json 文件的 row_data 目录
+# 每个 symbol/小时/side 一个分段文件及其时间戳索引：
+#   price_data/{symbol}/{date}/segments/{hour}/{side}.seg
+#   price_data/{symbol}/{date}/segments/{hour}/{side}.idx
+#
+# .seg 记录格式（小端）：length:u32 | crc32:u32 | timestamp_ms:i64 | flags:u8 | payload[length]
+#   payload 为紧凑 json，flags & FLAG_ZLIB 时经过 zlib 压缩，crc32 针对 payload 计算
+# .idx 记录格式（小端）：timestamp_ms:i64 | offset:u64 | flags:u8，每条记录一项，用于按时间二分定位
+#
+# 同一个分段文件同一时间只有一个写入进程：SegmentWriter 在整个生命周期内持有 .seg 的 flock 排他锁，
+# 重叠运行的 cron 进程会等前一个写入进程关闭后再修复尾部、开始追加（索引偏移才与文件内容一致）
+# 写入进程崩溃留下的半条记录在下次打开时截掉
+import os
+import json
+import fcntl
+import zlib
+import struct
+import bisect
+from collections import OrderedDict
+
+RECORD_HEADER = struct.Struct("<IIqB")
+INDEX_ENTRY = struct.Struct("<qQB")
+FLAG_ZLIB = 0x01
+
+def segment_path(base_dir, symbol, date_str, hour_str, side):
+    return os.path.join(base_dir, symbol, date_str, "segments", hour_str, f"{side}.seg")
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".idx"
+
+def encode_payload(data, compress):
+    payload = json.dumps(data, separators=(',', ':')).encode()
+    if compress:
+        return zlib.compress(payload), FLAG_ZLIB
+    return payload, 0
+
+def decode_payload(payload, flags):
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+def read_record(f):
+    """读取当前位置的一条记录，返回 (timestamp, flags, payload)；文件结束或记录不完整/损坏时返回 None"""
+    header = f.read(RECORD_HEADER.size)
+    if len(header) < RECORD_HEADER.size:
+        return None
+    length, crc, timestamp, flags = RECORD_HEADER.unpack(header)
+    payload = f.read(length)
+    if len(payload) < length or zlib.crc32(payload) != crc:
+        return None
+    return timestamp, flags, payload
+
+def load_index(path):
+    try:
+        with open(index_path(path), "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return []
+    usable = len(raw) - len(raw) % INDEX_ENTRY.size
+    return list(INDEX_ENTRY.iter_unpack(raw[:usable]))
+
+class SegmentWriter:
+    def __init__(self, path, compress=True):
+        self.path = path
+        self.compress = compress
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.data_file = open(path, "ab")
+        fcntl.flock(self.data_file, fcntl.LOCK_EX)
+        self.recover()
+        # recover 可能截短了文件，追加模式下的 tell() 需要重新定位到文件末尾
+        self.data_file.seek(0, os.SEEK_END)
+        self.index_file = open(index_path(path), "ab")
+
+    def recover(self):
+        # 从最后一条索引记录开始向后校验，截掉不完整的尾部记录并补齐缺失的索引项
+        entries = load_index(self.path)
+        data_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        while entries and entries[-1][1] >= data_size:
+            entries.pop()
+
+        offset = entries[-1][1] if entries else 0
+        valid = entries[:-1] if entries else []
+        with open(self.path, "ab+") as f:
+            f.seek(offset)
+            while True:
+                record = read_record(f)
+                if record is None:
+                    break
+                timestamp, flags, payload = record
+                valid.append((timestamp, offset, flags))
+                offset += RECORD_HEADER.size + len(payload)
+            if offset < data_size:
+                print(f"[WARN] Truncating torn tail of {self.path} at offset {offset}")
+                f.truncate(offset)
+
+        with open(index_path(self.path), "wb") as f:
+            f.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in valid))
+
+    def append(self, timestamp, data, flags=0):
+        payload, payload_flags = encode_payload(data, self.compress)
+        flags |= payload_flags
+        offset = self.data_file.tell()
+        header = RECORD_HEADER.pack(len(payload), zlib.crc32(payload), int(timestamp), flags)
+        self.data_file.write(header + payload)
+        self.data_file.flush()
+        # 先落数据再写索引，崩溃时最多丢失一条索引项，可由 recover 补齐
+        self.index_file.write(INDEX_ENTRY.pack(int(timestamp), offset, flags))
+        self.index_file.flush()
+
+    def close(self):
+        self.index_file.close()
+        # 关闭文件即释放 flock
+        self.data_file.close()
+
+class SegmentReader:
+    def __init__(self, path):
+        self.path = path
+        self.index = load_index(path)
+        self.timestamps = [entry[0] for entry in self.index]
+
+    def seek_offset(self, start_ts):
+        # 索引按追加顺序排列，时间戳单调递增，二分找到第一条 >= start_ts 的记录
+        pos = bisect.bisect_left(self.timestamps, start_ts)
+        if pos < len(self.index):
+            return self.index[pos][1]
+        # 索引之后可能还有尚未补写索引的记录，从最后一条索引处往后扫描
+        return self.index[-1][1] if self.index else 0
+
+    def iter_raw(self, start_ts=None, end_ts=None):
+        """按时间顺序返回 (timestamp, flags, payload)，时间窗口为 [start_ts, end_ts)"""
+        offset = self.seek_offset(start_ts) if start_ts is not None else 0
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while True:
+                record = read_record(f)
+                if record is None:
+                    return
+                timestamp, flags, payload = record
+                if start_ts is not None and timestamp < start_ts:
+                    continue
+                if end_ts is not None and timestamp >= end_ts:
+                    return
+                yield record
+
+    def iter_records(self, start_ts=None, end_ts=None):
+        """按时间顺序返回 (timestamp, data)，时间窗口为 [start_ts, end_ts)"""
+        for timestamp, flags, payload in self.iter_raw(start_ts, end_ts):
+            yield timestamp, decode_payload(payload, flags)
+
+    def __iter__(self):
+        return self.iter_records()
+
+# 常驻进程里保持少量写入句柄打开，跨小时后旧句柄自然被淘汰
+MAX_OPEN_WRITERS = 8
+_writers = OrderedDict()
+
+def get_writer(path, compress=True, writer_class=None):
+    writer = _writers.pop(path, None)
+    if writer is None:
+        writer = (writer_class or SegmentWriter)(path, compress)
+    _writers[path] = writer
+    while len(_writers) > MAX_OPEN_WRITERS:
+        _, oldest = _writers.popitem(last=False)
+        oldest.close()
+    return writer
+
+def append_snapshot(path, timestamp, data, compress=True):
+    get_writer(path, compress).append(timestamp, data)
+
+def close_all():
+    while _writers:
+        _, writer = _writers.popitem()
+        writer.close()
@@ -0,0 +1,189 @@
+# 采集数据的缓冲写入池，替代每个采样点 makedirs + open/append/close 一次的写法
+# - 每个文件（按路径，对应 symbol/小时/token）打开一次后保持句柄，目录只在首次打开时创建
+# - 追加的内容先进缓冲区，满 FLUSH_BYTES 或距上次落盘超过 FLUSH_INTERVAL 秒时，所有文件一起写出（group commit）；
+#   后台线程按 FLUSH_INTERVAL 兜底落盘，每 FSYNC_INTERVAL 秒对写过的文件统一 fsync 一次
+# - 出现更晚的小时后，旧小时的句柄落盘后关闭
+# - 每条记录整条进入缓冲区，落盘是一次 write；崩溃留下的半行（文本）或不足一条记录的尾巴（定长二进制）在下次打开时截掉
+# - 同一文件可能有多个进程同时追加（如 fetch_midpoint_loop 与订单簿采集的 --midpoints、cron 重叠），
+#   打开时的修复/写表头和每次落盘都在 flock 排他锁内进行，截断只会截掉本进程这次写入的部分
+# 进程正常退出（含 SIGTERM 后走完退出流程）时 atexit 落盘；被强杀时最多丢失最近 FLUSH_INTERVAL 秒的数据
+import os
+import time
+import fcntl
+import atexit
+import threading
+import contextlib
+
+FLUSH_INTERVAL = 1.0
+FLUSH_BYTES = 64 * 1024
+FSYNC_INTERVAL = 10.0
+
+@contextlib.contextmanager
+def file_lock(fd):
+    """文件级排他锁（flock），与其它进程中同一文件的修复、落盘互斥"""
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+class BufferedFile:
+    def __init__(self, path, hour, record_size=None, header=None):
+        self.path = path
+        self.hour = hour
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.buffer = []
+        self.dirty = False
+        with file_lock(self.fd):
+            self.size = self.repair(record_size)
+            if header and self.size == 0:
+                # 表头在打开时、锁内立即写入，不进缓冲区：否则其它进程看到空文件会再写一次表头
+                self.write_all(header.encode() if isinstance(header, str) else header)
+
+    def repair(self, record_size):
+        """截掉上次崩溃留下的不完整尾部，返回修复后的文件大小"""
+        size = os.fstat(self.fd).st_size
+        if record_size:
+            valid = size - size % record_size
+        else:
+            valid = size
+            if size:
+                with open(self.path, "rb") as f:
+                    f.seek(max(0, size - 4096))
+                    tail = f.read()
+                if not tail.endswith(b"\n"):
+                    cut = tail.rfind(b"\n")
+                    valid = size - len(tail) + cut + 1 if cut >= 0 else (0 if size <= 4096 else size)
+        if valid < size:
+            print(f"[WARN] Truncating torn tail of {self.path} at offset {valid}")
+            os.truncate(self.path, valid)
+        return valid
+
+    def write_all(self, data):
+        """写出全部字节（os.write 可能只写入一部分）；出错时截回写之前的大小，避免留下半条记录
+        调用方需持有 file_lock，保证 start 之后的内容都是本次写入的"""
+        start = os.fstat(self.fd).st_size
+        view = memoryview(data)
+        try:
+            while view:
+                written = os.write(self.fd, view)
+                view = view[written:]
+        except OSError:
+            os.truncate(self.path, start)
+            raise
+        self.size = start + len(data)
+        self.dirty = True
+
+    def write_pending(self):
+        if not self.buffer:
+            return
+        data = b"".join(self.buffer)
+        self.buffer = []
+        try:
+            with file_lock(self.fd):
+                self.write_all(data)
+        except OSError:
+            # 数据放回缓冲区，下次落盘重试
+            self.buffer.insert(0, data)
+            raise
+
+    def fsync(self):
+        if self.dirty:
+            os.fsync(self.fd)
+            self.dirty = False
+
+    def close(self):
+        self.write_pending()
+        self.fsync()
+        os.close(self.fd)
+
+class WriterPool:
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_bytes=FLUSH_BYTES, fsync_interval=FSYNC_INTERVAL):
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.fsync_interval = fsync_interval
+        self.files = {}
+        self.pending_bytes = 0
+        self.latest_hour = None
+        self.last_flush = time.monotonic()
+        self.last_fsync = time.monotonic()
+        self.lock = threading.RLock()
+        self.flusher = None
+
+    def append(self, path, data, timestamp=None, record_size=None, header=None):
+        """追加一条完整记录（str 或 bytes）；header 仅在打开时文件为空才写入（如 csv 表头）"""
+        if isinstance(data, str):
+            data = data.encode()
+        hour = int(timestamp if timestamp is not None else time.time()) // 3600
+        with self.lock:
+            handle = self.files.get(path)
+            if handle is None:
+                handle = self.files[path] = BufferedFile(path, hour, record_size, header)
+            handle.buffer.append(data)
+            self.pending_bytes += len(data)
+
+            if self.latest_hour is None or hour > self.latest_hour:
+                self.latest_hour = hour
+                self.rotate(hour)
+            if self.pending_bytes >= self.flush_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+        self.start_flusher()
+
+    def rotate(self, hour):
+        # 整点后关闭上一小时的句柄
+        for path in [p for p, h in self.files.items() if h.hour < hour]:
+            self.files.pop(path).close()
+
+    def flush(self, fsync=False):
+        """所有缓冲一起写出；距上次 fsync 超过 fsync_interval 或 fsync=True 时统一 fsync"""
+        with self.lock:
+            # 某个文件写失败（如磁盘满）时其余文件照常落盘，失败的数据留在缓冲区，最后再抛出
+            error = None
+            for handle in self.files.values():
+                try:
+                    handle.write_pending()
+                except OSError as e:
+                    error = error or e
+            self.pending_bytes = sum(len(b) for handle in self.files.values() for b in handle.buffer)
+            self.last_flush = time.monotonic()
+            if error is not None:
+                raise error
+            if fsync or time.monotonic() - self.last_fsync >= self.fsync_interval:
+                for handle in self.files.values():
+                    handle.fsync()
+                self.last_fsync = time.monotonic()
+
+    def start_flusher(self):
+        if self.flusher is not None:
+            return
+        def flush_loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except OSError as e:
+                    print(f"[WARN] Failed to flush buffered writes: {e}")
+        self.flusher = threading.Thread(target=flush_loop, daemon=True)
+        self.flusher.start()
+
+    def close_all(self):
+        with self.lock:
+            while self.files:
+                _, handle = self.files.popitem()
+                handle.close()
+            self.pending_bytes = 0
+
+# 进程内共用一个写入池
+_pool = WriterPool()
+
+def append(path, data, timestamp=None, record_size=None, header=None):
+    _pool.append(path, data, timestamp, record_size, header)
+
+def flush(fsync=False):
+    _pool.flush(fsync)
+
+def close_all():
+    _pool.close_all()
+
+atexit.register(close_all)
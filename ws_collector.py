@@ -0,0 +1,325 @@
+# 流式采集：订阅 clob 市场 WebSocket（market 频道），在内存中维护每个 token 的订单簿，
+# 按固定节拍写出与轮询脚本相同的文件，不再每个采样点发一次请求：
+#   midpoint/{symbol}/{date}/{hour}/{token_id}.data       （同 fetch_midpoint_loop.py，最优买卖价中间值）
+#   price_data/{symbol}/{date}/{hour}.csv                （同 get_currect_market_ask1_bid1_price_data.py 的买1/卖1）
+#   price_data/{symbol}/{date}/row_data/...               （订单簿快照，仅在订单簿变化后写入；也可 --storage segment/delta）
+#
+# 常驻运行，整点自动解析新一小时的 token 并重新订阅，断线按指数退避重连：
+#   nohup /usr/bin/python3 ws_collector.py --symbols btc eth sol xrp > /dev/null 2>&1 &
+# 离线测试（本地替身服务回放录制的事件）：
+#   python3 mock_market_ws_server.py --port 8766 [--replay events.jsonl]
+#   PM_WS_HOST=ws://127.0.0.1:8766 python3 ws_collector.py --symbols btc
+# --record events.jsonl 把收到的原始消息连同接收时间追加写入文件，可交给替身服务回放
+import os
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import datetime
+from decimal import Decimal
+import websockets
+import metrics
+import clob_api
+import binance_prices
+import segment_store
+import writer_pool
+import fetch_midpoint_loop
+import get_currect_market_ask1_bid1_price_data as book_collector
+
+WS_HOST = os.environ.get("PM_WS_HOST", "wss://ws-subscriptions-clob.polymarket.com")
+MARKET_CHANNEL = "/ws/market"
+PING_INTERVAL = 10
+RECONNECT_MAX = 30
+
+# === 内存订单簿 ===
+class OrderBook:
+    def __init__(self, token_id):
+        self.token_id = token_id
+        self.market = None
+        self.bids = {}
+        self.asks = {}
+        self.timestamp = None
+        self.hash = None
+        self.version = 0
+        self.has_snapshot = False
+
+    def apply_snapshot(self, event):
+        self.market = event.get("market", self.market)
+        bids = {level["price"]: level["size"] for level in event.get("bids", event.get("buys", []))}
+        asks = {level["price"]: level["size"] for level in event.get("asks", event.get("sells", []))}
+        # 先校验全部价格/数量，快照有问题时保留原订单簿
+        for price, size in list(bids.items()) + list(asks.items()):
+            Decimal(price), Decimal(size)
+        self.bids, self.asks = bids, asks
+        self.timestamp = event.get("timestamp", self.timestamp)
+        self.hash = event.get("hash")
+        self.has_snapshot = True
+        self.version += 1
+
+    def apply_change(self, side, price, size, timestamp=None, book_hash=None):
+        levels = self.bids if side.upper() == "BUY" else self.asks
+        Decimal(price)
+        if Decimal(size) == 0:
+            levels.pop(price, None)
+        else:
+            levels[price] = size
+        if timestamp:
+            self.timestamp = timestamp
+        if book_hash:
+            self.hash = book_hash
+        self.version += 1
+
+    def best_bid(self):
+        if not self.bids:
+            return None
+        price = max(self.bids, key=Decimal)
+        return {"price": price, "size": self.bids[price]}
+
+    def best_ask(self):
+        if not self.asks:
+            return None
+        price = min(self.asks, key=Decimal)
+        return {"price": price, "size": self.asks[price]}
+
+    def midpoint(self):
+        return clob_api.book_midpoint(self.best_ask(), self.best_bid())
+
+    def to_api_book(self):
+        """转成 GET /book 的结构：asks 价格降序、bids 价格升序，最优价在末尾"""
+        return {
+            "market": self.market,
+            "asset_id": self.token_id,
+            "timestamp": str(self.timestamp or int(time.time() * 1000)),
+            "hash": self.hash,
+            "bids": [{"price": p, "size": self.bids[p]} for p in sorted(self.bids, key=Decimal)],
+            "asks": [{"price": p, "size": self.asks[p]} for p in sorted(self.asks, key=Decimal, reverse=True)],
+        }
+
+def handle_message(raw, books):
+    """把一条 WebSocket 消息应用到 books，返回有变化的 token 集合"""
+    if raw in ("PONG", "PING"):
+        return set()
+    payload = json.loads(raw)
+    events = payload if isinstance(payload, list) else [payload]
+    changed = set()
+    for event in events:
+        # 单个事件格式不对（非 dict、side 为空、价格/数量无法解析等）只丢弃该事件，同一批中的其它事件照常应用
+        try:
+            changed |= apply_event(event, books)
+        except (ValueError, KeyError, TypeError, AttributeError, ArithmeticError) as e:
+            metrics.inc("ws_bad_messages_total")
+            print(f"[WARN] Bad event: {type(e).__name__}: {e}: {str(event)[:200]!r}")
+    return changed
+
+def apply_event(event, books):
+    changed = set()
+    event_type = event.get("event_type")
+    if event_type == "book":
+        book = books.get(event.get("asset_id"))
+        if book is not None:
+            book.apply_snapshot(event)
+            changed.add(book.token_id)
+    elif event_type == "price_change":
+        # 新格式：price_changes 中每条带 asset_id；旧格式：asset_id 在外层，变化在 changes 中
+        if "price_changes" in event:
+            changes = event["price_changes"]
+        else:
+            changes = [dict(change, asset_id=event.get("asset_id")) for change in event.get("changes", [])]
+        for change in changes:
+            book = books.get(change.get("asset_id"))
+            if book is None or not book.has_snapshot:
+                continue
+            book.apply_change(change["side"], change["price"], change["size"], event.get("timestamp"), change.get("hash"))
+            changed.add(book.token_id)
+    return changed
+
+# === 目标解析 ===
+def resolve_targets(symbols, et_time):
+    """返回 {symbol: (token_ids, midpoint 输出目录)}"""
+    targets = {}
+    for symbol in symbols:
+        try:
+            slug, output_dir = fetch_midpoint_loop.format_slug_and_output_dir(symbol, et_time)
+            token_ids = fetch_midpoint_loop.get_token_ids_from_slug(slug)
+            fetch_midpoint_loop.record_catalog(symbol, et_time, slug, output_dir)
+        except Exception as e:
+            print(f"[ERROR] {symbol}: failed to resolve tokens: {e}")
+            continue
+        print(f"[INFO] {symbol}: slug={slug} token_ids={token_ids}")
+        targets[symbol] = (token_ids, output_dir)
+    return targets
+
+# === 写出 ===
+class Writer:
+    def __init__(self, targets, books, fmt, storage):
+        self.targets = targets
+        self.books = books
+        self.fmt = fmt
+        self.storage = storage
+        self.saved_versions = {}
+
+    def write_samples(self, timestamp):
+        et_now = datetime.datetime.now(book_collector.ET)
+        for symbol, (token_ids, output_dir) in self.targets.items():
+            for side, token_id in enumerate(token_ids):
+                book = self.books[token_id]
+                if not book.has_snapshot:
+                    continue
+                mid = book.midpoint()
+                if mid is not None:
+                    fetch_midpoint_loop.write_midpoint_to_file(token_id, mid, output_dir, timestamp, self.fmt)
+                if self.saved_versions.get(token_id) != book.version:
+                    book_collector.save_book_snapshot(book.to_api_book(), token_id, et_now, symbol, side, self.storage)
+                    self.saved_versions[token_id] = book.version
+
+    def csv_jobs(self, loop):
+        return [self.write_symbol_csv(loop, symbol, token_ids) for symbol, (token_ids, _) in self.targets.items()]
+
+    async def write_symbol_csv(self, loop, symbol, token_ids):
+        up, down = (self.books[t] for t in token_ids[:2])
+        if not (up.has_snapshot and down.has_snapshot):
+            return
+        symbol_upper = symbol.upper()
+        try:
+            open_price = await loop.run_in_executor(None, binance_prices.get_open_price, symbol_upper)
+            current_price = await loop.run_in_executor(None, binance_prices.get_current_price, symbol_upper)
+        except Exception as e:
+            print(f"[ERROR] {symbol}: Binance price request failed: {e}")
+            return
+        et_now = datetime.datetime.now(book_collector.ET)
+        book_collector.write_to_csv(et_now, open_price, current_price, up.best_ask(), down.best_ask(),
+                                    up.best_bid(), down.best_bid(), symbol)
+
+# === 采集主循环 ===
+async def receive(ws, books, record_file):
+    async for raw in ws:
+        if record_file is not None:
+            record_file.write(json.dumps({"t": time.time(), "msg": raw}) + "\n")
+        try:
+            changed = handle_message(raw, books)
+        except (ValueError, KeyError) as e:
+            metrics.inc("ws_bad_messages_total")
+            print(f"[WARN] Bad message: {e}: {raw[:200]!r}")
+            continue
+        metrics.inc("ws_messages_total")
+        if changed:
+            metrics.inc("ws_book_updates_total", len(changed))
+
+async def keepalive(ws):
+    while True:
+        await asyncio.sleep(PING_INTERVAL)
+        await ws.send("PING")
+
+async def sample(writer, interval, csv_interval, until):
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    tick = 0
+    next_csv = 0.0
+    pending = set()
+    while time.time() < until:
+        writer.write_samples(int(time.time()))
+        elapsed = time.monotonic() - start
+        if elapsed >= next_csv:
+            # csv 需要先请求 Binance 价格，放到后台任务中，不阻塞采样节拍
+            for coro in writer.csv_jobs(loop):
+                task = asyncio.create_task(coro)
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            next_csv = elapsed + csv_interval
+        tick += 1
+        await asyncio.sleep(max(0, start + tick * interval - time.monotonic()))
+
+async def stream_hour(symbols, et_time, args, stop, record_file):
+    targets = resolve_targets(symbols, et_time)
+    if not targets:
+        return False
+    token_ids = [t for ids, _ in targets.values() for t in ids]
+    books = {t: OrderBook(t) for t in token_ids}
+    writer = Writer(targets, books, args.format, args.storage)
+    hour_end = et_time.timestamp() + 3600
+    url = f"{WS_HOST}{MARKET_CHANNEL}"
+
+    attempt = 0
+    while not stop.is_set() and time.time() < hour_end:
+        try:
+            async with websockets.connect(url, ping_interval=None, max_size=None) as ws:
+                await ws.send(json.dumps({"assets_ids": token_ids, "type": "market"}))
+                print(f"[INFO] Subscribed to {len(token_ids)} tokens on {url}")
+                attempt = 0
+                tasks = [
+                    asyncio.create_task(receive(ws, books, record_file)),
+                    asyncio.create_task(keepalive(ws)),
+                    asyncio.create_task(sample(writer, args.interval, args.csv_interval, hour_end)),
+                    asyncio.create_task(stop.wait()),
+                ]
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in pending:
+                    task.cancel()
+                for task in done:
+                    if task.exception() is not None:
+                        raise task.exception()
+                if tasks[0] in done:
+                    raise ConnectionError("server closed the stream")
+        except (OSError, websockets.exceptions.WebSocketException, ConnectionError) as e:
+            metrics.inc("ws_reconnects_total")
+            delay = random.uniform(0, min(RECONNECT_MAX, 2 ** attempt))
+            attempt += 1
+            print(f"[WARN] WebSocket error: {e}, reconnecting in {delay:.1f}s")
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        except Exception as e:
+            # 兜底：任何未预料的异常都只断开重连，不让常驻进程退出
+            metrics.inc("ws_errors_total", kind=type(e).__name__)
+            delay = random.uniform(0, min(RECONNECT_MAX, 2 ** attempt))
+            attempt += 1
+            print(f"[ERROR] Unexpected error in stream: {type(e).__name__}: {e}, reconnecting in {delay:.1f}s")
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    return True
+
+async def run(args):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    record_file = open(args.record, "a", buffering=1) if args.record else None
+    try:
+        while not stop.is_set():
+            et_time = fetch_midpoint_loop.get_et_now_rounded_to_hour()
+            if not await stream_hour(args.symbols, et_time, args, stop, record_file):
+                # 新一小时的市场可能还没创建，稍后重试
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=10)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        if record_file is not None:
+            record_file.close()
+        segment_store.close_all()
+        writer_pool.close_all()
+    print("[INFO] Stopped")
+
+def main():
+    symbols = list(fetch_midpoint_loop.symbol_slug_map)
+    parser = argparse.ArgumentParser(description="Stream the CLOB market WebSocket and write midpoint, csv and book files")
+    parser.add_argument("--symbols", nargs="+", default=symbols, choices=symbols)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between midpoint / book snapshot samples")
+    parser.add_argument("--csv-interval", type=float, default=15.0, help="Seconds between top-of-book csv rows (each row also fetches Binance prices)")
+    parser.add_argument("--format", choices=["text", "bin", "both"], default="text", help="Midpoint file format")
+    parser.add_argument("--storage", choices=["json", "segment", "delta"], default="json", help="Raw book snapshot storage")
+    parser.add_argument("--record", help="Append every raw message to this JSONL file for later replay")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+
+    metrics.start("ws_collector", args.metrics_port)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()